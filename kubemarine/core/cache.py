@@ -0,0 +1,123 @@
+# Copyright 2021-2023 NetCracker Technology Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import json
+import os
+import tempfile
+from typing import Any, Optional
+
+from kubemarine.core import utils
+
+
+def make_key(*parts: Any) -> str:
+    """
+    Calculates stable hash of the specified JSON-serializable parts.
+    Objects that are not JSON-serializable are represented by their string representation.
+    """
+    data = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+class DiskCache:
+    """
+    Simple file cache of text or binary entries keyed by hash.
+    Each entry is stored in a separate file. The least recently used entries are removed if there are too many entries.
+    """
+
+    def __init__(self, directory: str, max_entries: int) -> None:
+        self.directory = directory
+        self.max_entries = max_entries
+
+    def _get_path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def get(self, key: str) -> Optional[str]:
+        path = self._get_path(key)
+        try:
+            with utils.open_utf8(path, 'r') as file:
+                data = file.read()
+        except OSError:
+            return None
+
+        # Mark the entry as recently used.
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        return data
+
+    def get_file(self, key: str) -> Optional[str]:
+        """
+        :return: path to the cached file entry, or None if there is no such entry.
+        """
+        path = self._get_path(key)
+        if not os.path.isfile(path):
+            return None
+
+        # Mark the entry as recently used.
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        return path
+
+    def put_file(self, key: str, tmp_path: str) -> str:
+        """
+        Moves the specified file to the cache.
+        The file should be previously created in the cache directory using `mkstemp`.
+
+        :return: path to the cached file entry
+        """
+        path = self._get_path(key)
+        os.replace(tmp_path, path)
+        self._evict()
+        return path
+
+    def mkstemp(self) -> str:
+        """
+        :return: path to the new temporary file in the cache directory, that is not treated as cache entry.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp')
+        os.close(fd)
+        return tmp_path
+
+    def put(self, key: str, data: str) -> None:
+        # Write to the temporary file first to not leave partially written entry.
+        tmp_path = self.mkstemp()
+        try:
+            with utils.open_utf8(tmp_path, 'w') as file:
+                file.write(data)
+            os.replace(tmp_path, self._get_path(key))
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+        self._evict()
+
+    def _evict(self) -> None:
+        entries = [os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                   if not name.startswith('.')]
+        if len(entries) <= self.max_entries:
+            return
+
+        entries.sort(key=os.path.getmtime)
+        for path in entries[:len(entries) - self.max_entries]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
@@ -0,0 +1,192 @@
+# Copyright 2021-2023 NetCracker Technology Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import json
+import os
+import tempfile
+import zlib
+from typing import BinaryIO, Iterator, List, Dict
+
+from kubemarine.core import utils
+
+# Random, but stable mapping of each byte to one bit.
+_MARKS = bytes(hashlib.sha256(bytes([i])).digest()[0] & 1 for i in range(256))
+
+
+class Chunker:
+    """
+    Splits the data into content-defined chunks.
+    Each byte is mapped to one pseudo-random bit, and the chunk ends after the run of N consecutive set bits,
+    so the boundaries depend only on the last N bytes of the chunk.
+    The insertion or removal of data changes only the chunks around the change.
+
+    The mapping and the search of the run are performed by `bytes.translate` and `bytes.find`,
+    that are implemented in C and process hundreds of megabytes per second.
+    """
+
+    def __init__(self, min_size: int, avg_size: int, max_size: int) -> None:
+        if not 0 < min_size <= avg_size <= max_size:
+            raise ValueError("Chunk sizes should satisfy 0 < min_size <= avg_size <= max_size")
+
+        self.min_size = min_size
+        self.max_size = max_size
+        # Expected distance between the runs of N set random bits is 2^(N+1) - 2.
+        self._run = b'\x01' * max(1, avg_size.bit_length() - 2)
+
+    def split(self, stream: BinaryIO) -> Iterator[bytes]:
+        buffer = bytearray()
+        marks = bytearray()
+        eof = False
+        while True:
+            while not eof and len(buffer) < self.max_size:
+                data = stream.read(self.max_size)
+                if not data:
+                    eof = True
+                buffer.extend(data)
+                marks.extend(data.translate(_MARKS))
+
+            if not buffer:
+                return
+
+            boundary = self._find_boundary(marks)
+            yield bytes(buffer[:boundary])
+            del buffer[:boundary]
+            del marks[:boundary]
+
+    def _find_boundary(self, marks: bytearray) -> int:
+        length = min(len(marks), self.max_size)
+        if length <= self.min_size:
+            return length
+
+        # The run should end after the minimal size of the chunk.
+        start = max(0, self.min_size + 1 - len(self._run))
+        found = marks.find(self._run, start, length)
+        if found < 0:
+            return length
+
+        return found + len(self._run)
+
+
+class ChunkStore:
+    """
+    Repository of snapshots of directories.
+    Files are split into content-defined chunks. Each chunk is compressed and stored only once by its SHA256.
+    Each snapshot is the index of its files with lists of chunks, that is stored in `snapshots/<name>.json`.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.chunks_path = os.path.join(path, 'chunks')
+        self.snapshots_path = os.path.join(path, 'snapshots')
+        self.written_chunks = 0
+        self.written_bytes = 0
+        self.total_chunks = 0
+
+    def _get_chunk_path(self, chunk_id: str) -> str:
+        return os.path.join(self.chunks_path, chunk_id[:2], chunk_id)
+
+    def put_snapshot(self, name: str, source_directory: str, chunker: Chunker) -> str:
+        """
+        Writes all files from the specified directory to the repository, and writes the snapshot index.
+        Only the chunks that are not yet present in the repository are written.
+
+        :return: path to the snapshot index
+        """
+        files: Dict[str, Dict[str, object]] = {}
+        for root, _, filenames in os.walk(source_directory):
+            for filename in sorted(filenames):
+                filepath = os.path.join(root, filename)
+                relpath = os.path.relpath(filepath, source_directory).replace(os.sep, '/')
+                chunks: List[str] = []
+                with open(filepath, 'rb') as file:
+                    for chunk in chunker.split(file):
+                        chunks.append(self._put_chunk(chunk))
+                files[relpath] = {'size': os.path.getsize(filepath), 'chunks': chunks}
+
+        os.makedirs(self.snapshots_path, exist_ok=True)
+        snapshot_path = os.path.join(self.snapshots_path, name + '.json')
+        self._write_atomically(snapshot_path, json.dumps({'files': files}, indent=2).encode('utf-8'))
+        return snapshot_path
+
+    def _put_chunk(self, chunk: bytes) -> str:
+        chunk_id = hashlib.sha256(chunk).hexdigest()
+        self.total_chunks += 1
+        chunk_path = self._get_chunk_path(chunk_id)
+        if not os.path.exists(chunk_path):
+            os.makedirs(os.path.dirname(chunk_path), exist_ok=True)
+            data = zlib.compress(chunk)
+            self._write_atomically(chunk_path, data)
+            self.written_chunks += 1
+            self.written_bytes += len(data)
+
+        return chunk_id
+
+    def _read_chunk(self, chunk_id: str) -> bytes:
+        with open(self._get_chunk_path(chunk_id), 'rb') as file:
+            chunk = zlib.decompress(file.read())
+        if hashlib.sha256(chunk).hexdigest() != chunk_id:
+            raise Exception(f"Chunk {chunk_id} in repository {self.path} is corrupted")
+        return chunk
+
+    def _write_atomically(self, path: str, data: bytes) -> None:
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(data)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+    def _load_index(self, snapshot_path: str) -> Dict[str, dict]:
+        with utils.open_utf8(snapshot_path, 'r') as file:
+            files: Dict[str, dict] = json.load(file)['files']
+        return files
+
+    def restore_snapshot(self, snapshot_path: str, target_directory: str) -> None:
+        """
+        Reassembles all files of the snapshot in the specified directory.
+        """
+        for relpath, entry in self._load_index(snapshot_path).items():
+            filepath = os.path.join(target_directory, *relpath.split('/'))
+            os.makedirs(os.path.dirname(filepath), exist_ok=True)
+            with open(filepath, 'wb') as file:
+                for chunk_id in entry['chunks']:
+                    file.write(self._read_chunk(chunk_id))
+
+            if os.path.getsize(filepath) != entry['size']:
+                raise Exception(f"File {relpath} of snapshot {snapshot_path} is restored with unexpected size")
+
+    def read_file(self, snapshot_path: str, relpath: str) -> bytes:
+        entry = self._load_index(snapshot_path).get(relpath)
+        if entry is None:
+            raise KeyError(f"File {relpath} is not found in snapshot {snapshot_path}")
+        return b''.join(self._read_chunk(chunk_id) for chunk_id in entry['chunks'])
+
+
+def is_snapshot(path: str) -> bool:
+    """
+    Checks if the path points to the snapshot index of the repository.
+    """
+    snapshots_path = os.path.dirname(os.path.abspath(path))
+    return (os.path.isfile(path) and os.path.basename(snapshots_path) == 'snapshots'
+            and os.path.isdir(os.path.join(os.path.dirname(snapshots_path), 'chunks')))
+
+
+def open_for_snapshot(snapshot_path: str) -> ChunkStore:
+    """
+    Opens the repository, to which the snapshot belongs.
+    """
+    return ChunkStore(os.path.dirname(os.path.dirname(os.path.abspath(snapshot_path))))
@@ -11,6 +11,7 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
 from typing import Dict, List, Union, Iterable, Tuple, Optional, Any, Callable
 
@@ -40,6 +41,7 @@ class KubernetesCluster(Environment):
         self.procedure_inventory = {} if procedure_inventory is None else deepcopy(procedure_inventory)
 
         self._connection_pool: Optional[ConnectionPool] = None
+        self._worker_pool: Optional[ThreadPoolExecutor] = None
 
         self._logger = logger if logger is not None \
             else log.init_log_from_context_args(self.globals, self.context, self.raw_inventory).logger
@@ -66,6 +68,16 @@ class KubernetesCluster(Environment):
 
         return self._connection_pool
 
+    @property
+    def worker_pool(self) -> ThreadPoolExecutor:
+        if self._worker_pool is None:
+            # Threads are created on demand and are reused by all subsequent flushes of any executor.
+            # The pool size limits the number of simultaneously active SSH sessions.
+            max_workers = self.globals['connection']['max_parallel_sessions']
+            self._worker_pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='ssh-worker')
+
+        return self._worker_pool
+
     @property
     def log(self) -> log.EnhancedLogger:
         return self._logger
@@ -161,17 +173,25 @@ class KubernetesCluster(Environment):
         self.log.debug('Start detecting nodes context...')
 
         from kubemarine import system
-        system.whoami(self)
+        group = self.nodes['all']
+        facts_cache = system.get_nodes_facts_cache(self)
+        if facts_cache is not None:
+            group = group.exclude_group(system.load_cached_nodes_facts(self, facts_cache))
+
+        system.whoami(self, group)
         self.log.verbose('Whoami check finished')
 
         self._check_online_nodes()
         self._check_accessible_nodes()
 
-        system.detect_active_interface(self)
+        system.detect_active_interface(self, group)
         self.log.verbose('Interface check finished')
-        system.detect_os_family(self)
+        system.detect_os_family(self, group)
         self.log.verbose('OS family check finished')
 
+        if facts_cache is not None:
+            system.store_nodes_facts(self, facts_cache, group)
+
         self.log.debug('Detecting nodes context finished!')
         return deepcopy(self.context['nodes'])
 
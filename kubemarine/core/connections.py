@@ -12,54 +12,216 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import os
-from typing import Dict
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, List, Any, Iterable, Callable
 
 import fabric  # type: ignore[import]
+import fabric.runners  # type: ignore[import]
 
 from kubemarine.core import static
 
 Connections = Dict[str, fabric.connection.Connection]
 
 
+class OutputConsumer(ABC):
+    """
+    Special watcher that consumes the output of the remote command chunk by chunk as soon as it arrives.
+    The output that is passed to the consumer is not accumulated in the result of the command.
+
+    Note that the class intentionally does not inherit invoke.StreamWatcher,
+    because the latter is thread local, while the consumer is shared between stdout and stderr reader threads.
+    """
+
+    owns_stdout = True
+    """
+    If the consumer owns the stdout, the stdout is neither buffered by the runner, nor accumulated in the result.
+    The consumers that only observe the output should set it to False.
+    """
+
+    def submit(self, stream: str) -> Iterable[str]:
+        # The consumer never responds to the remote process.
+        return []
+
+    @property
+    def stopped(self) -> bool:
+        """
+        If the consumer is stopped, the runner does not wait for the remote command to exit,
+        but closes the channel as soon as possible. The exit code of the command is then -1.
+        """
+        return False
+
+    @abstractmethod
+    def consume(self, data: str, stderr: bool) -> None:
+        """
+        The method is called from the reader threads of stdout and stderr.
+
+        :param data: next chunk of output
+        :param stderr: True if the chunk is read from stderr
+        """
+        pass
+
+    def restart(self) -> None:
+        """
+        The method is called before the command is performed again after the retriable failure.
+        The consumer should discard everything that it consumed from the failed attempt.
+        """
+        pass
+
+
+class BinaryOutputConsumer(OutputConsumer):
+    """
+    Consumer of the raw stdout of the remote command, for example, of the archive that is streamed to the deployer.
+    The stdout is passed to the binary consumers without decoding,
+    and is neither echoed, nor passed to the other consumers, nor accumulated in the result of the command.
+    The stderr is still decoded and passed to `consume`.
+
+    The command with the binary consumer should not be merged with other commands.
+    """
+
+    @abstractmethod
+    def consume_bytes(self, data: bytes) -> None:
+        """
+        The method is called from the reader thread of stdout.
+
+        :param data: next chunk of the raw stdout
+        """
+        pass
+
+    def consume(self, data: str, stderr: bool) -> None:
+        pass
+
+
+class StreamingRemote(fabric.runners.Remote):  # type: ignore[misc]
+    """
+    Runner that passes the output of the command to the OutputConsumer watchers instead of buffering it.
+    If no consumer is specified, the behaviour is the same as of the default fabric runner.
+    """
+
+    # Raw output is not decoded, and is read by larger chunks than the text output.
+    binary_read_chunk_size = 64 * 1024
+
+    def _handle_output(self, buffer_: List[str], hide: bool, output: Any, reader: Callable) -> None:
+        consumers = [watcher for watcher in self.watchers if isinstance(watcher, OutputConsumer)]
+        if not consumers:
+            super()._handle_output(buffer_, hide, output, reader)
+            return
+
+        stderr = reader == self.read_proc_stderr
+        binary_consumers = [consumer for consumer in consumers if isinstance(consumer, BinaryOutputConsumer)]
+        if binary_consumers and not stderr:
+            self._handle_binary_output(binary_consumers, reader)
+            return
+
+        # Other watchers, e.g. sudo password responder, need the whole output.
+        # The sudo password prompt is printed to stderr, so the owned stdout is not buffered even for them.
+        buffer_required = len(consumers) != len(self.watchers) \
+            and (stderr or not any(consumer.owns_stdout for consumer in consumers))
+        for data in self.read_proc_output(reader):
+            if not hide:
+                self.write_our_output(stream=output, string=data)
+            for consumer in consumers:
+                consumer.consume(data, stderr)
+            if buffer_required:
+                buffer_.append(data)
+                self.respond(buffer_)
+            if any(consumer.stopped for consumer in consumers):
+                self.channel.close()
+                break
+
+    def _handle_binary_output(self, consumers: List[BinaryOutputConsumer], reader: Callable) -> None:
+        while True:
+            data = reader(self.binary_read_chunk_size)
+            if not data:
+                break
+            for consumer in consumers:
+                consumer.consume_bytes(data)
+            if any(consumer.stopped for consumer in consumers):
+                self.channel.close()
+                break
+
+
+class GatewayConnection(fabric.connection.Connection):  # type: ignore[misc]
+    """
+    Connection to the gateway node that is shared between connections to all nodes behind the gateway.
+    The connections to the nodes are tunneled through `direct-tcpip` channels of the same gateway transport.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self._open_lock = threading.Lock()
+        self.tunnels = 0
+
+    def __setattr__(self, key: str, value: Any) -> None:
+        # fabric Connection has special handling of this method. Call default behaviour for custom attributes.
+        if key in ('_open_lock', 'tunnels'):
+            return object.__setattr__(self, key, value)
+        super().__setattr__(key, value)
+
+    def open(self) -> Any:
+        # The method is called by each connection tunneled through the gateway, probably from different threads.
+        # Do not allow to concurrently open the same transport.
+        with self._open_lock:
+            return super().open()
+
+
 class ConnectionPool:
     def __init__(self, inventory: dict):
         self.inventory = inventory
         self._connections: Connections = {}
+        self._gateway_connections: Dict[str, List[GatewayConnection]] = {}
+        self._lock = threading.Lock()
 
     def get_connection(self, ip: str) -> fabric.connection.Connection:
-        conn = self._connections.get(ip)
-        if conn is None:
-            for node in self.inventory['nodes']:
-                if node.get('connect_to') == ip:
-                    conn = self._create_connection(ip, node)
-
+        # The connection is cached and then reused for all the channels (commands and SFTP session) to the node.
+        # The lock guarantees that the only connection instance is created even if requested from different threads.
+        with self._lock:
+            conn = self._connections.get(ip)
             if conn is None:
-                raise Exception("Failed to find suitable node to connect to by address %s" % ip)
+                for node in self.inventory['nodes']:
+                    if node.get('connect_to') == ip:
+                        conn = self._create_connection(ip, node)
 
-            self._connections[ip] = conn
+                if conn is None:
+                    raise Exception("Failed to find suitable node to connect to by address %s" % ip)
 
-        return conn
+                self._connections[ip] = conn
 
-    def _create_connection_from_details(self, ip: str, conn_details: dict,
-                                        gateway: fabric.connection.Connection = None,
-                                        inline_ssh_env: bool = True) -> fabric.connection.Connection:
+        return conn
 
+    def _get_connection_kwargs(self, ip: str, conn_details: dict) -> dict:
         creds={}
         if conn_details.get('keyfile'):
             creds['key_filename'] = os.path.expanduser(conn_details['keyfile'])
         elif conn_details.get('password'):
             creds['password'] = conn_details.get('password')
-        cfg = fabric.Config(overrides={'run': {'encoding': "utf-8"}})
-        return fabric.connection.Connection(
+        cfg = fabric.Config(overrides={'run': {'encoding': "utf-8"}, 'runners': {'remote': StreamingRemote}})
+        return dict(
             host=ip,
             user=conn_details.get('username', static.GLOBALS['connection']['defaults']['username']),
-            gateway=gateway,
             port=conn_details.get('connection_port', static.GLOBALS['connection']['defaults']['port']),
             config=cfg,
             connect_timeout=conn_details.get('connection_timeout',
                                              static.GLOBALS['connection']['defaults']['timeout']),
             connect_kwargs=creds,
-            inline_ssh_env=inline_ssh_env
+        )
+
+    def _create_connection_from_details(self, ip: str, conn_details: dict,
+                                        gateway: fabric.connection.Connection = None,
+                                        inline_ssh_env: bool = True) -> fabric.connection.Connection:
+
+        return fabric.connection.Connection(
+            gateway=gateway,
+            inline_ssh_env=inline_ssh_env,
+            **self._get_connection_kwargs(ip, conn_details)
+        )
+
+    def _create_gateway_connection(self, gateway: dict) -> GatewayConnection:
+        # todo since we have no workaround for gateway connections currently,
+        #  probably we need different default connection timeout
+        return GatewayConnection(
+            inline_ssh_env=False,
+            **self._get_connection_kwargs(gateway["address"], gateway)
         )
 
     def _create_connection(self, ip: str, node: dict) -> fabric.connection.Connection:
@@ -72,10 +234,11 @@ class ConnectionPool:
 
         return self._create_connection_from_details(ip, node, gateway=gateway)
 
-    def _get_gateway_node_connection(self, name: str) -> fabric.connection.Connection:
-        # Create new connection instance each time even if it is the same gateway node.
-        # This is necessary to not share the same gateway connection instance in multiple threads
-        gateway_conn = None
+    def _get_gateway_node_connection(self, name: str) -> GatewayConnection:
+        # Connections to the same gateway node are shared between nodes behind the gateway.
+        # Each gateway connection multiplexes up to the limited number of tunnels to the nodes,
+        # after that new connection to the gateway is created.
+        gateway_details = None
 
         for gateway in self.inventory.get('gateway_nodes', []):
             if gateway.get('name') == name:
@@ -84,12 +247,19 @@ class ConnectionPool:
                 if gateway.get('keyfile') is None:
                     raise Exception('There is no keyfile specified in configfile for gateway \'%s\'' % name)
 
-                # todo since we have no workaround for gateway connections currently,
-                #  probably we need different default connection timeout
-                gateway_conn = self._create_connection_from_details(
-                    gateway["address"], gateway, inline_ssh_env=False)
+                gateway_details = gateway
 
-        if gateway_conn is None:
+        if gateway_details is None:
             raise Exception('Requested gateway \'%s\' is not found in configfile' % name)
 
+        max_tunnels = gateway_details.get('max_tunnels_per_connection',
+                                          static.GLOBALS['connection']['gateway']['max_tunnels_per_connection'])
+
+        gateway_connections = self._gateway_connections.setdefault(name, [])
+        gateway_conn = next((conn for conn in gateway_connections if conn.tunnels < max_tunnels), None)
+        if gateway_conn is None:
+            gateway_conn = self._create_gateway_connection(gateway_details)
+            gateway_connections.append(gateway_conn)
+
+        gateway_conn.tunnels += 1
         return gateway_conn
@@ -11,17 +11,20 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import json
 import re
 from importlib import import_module
 from copy import deepcopy
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple, Union, Iterable, Set
 
+import jinja2
+import jinja2.nodes
 import yaml
 
 from kubemarine.core.cluster import KubernetesCluster
 from kubemarine.core.errors import KME
 from kubemarine import jinja
-from kubemarine.core import utils, static, log, os
+from kubemarine.core import utils, static, log, os, tracing, cache
 from kubemarine.core.yaml_merger import default_merger
 
 # All enrichment procedures should not connect to any node.
@@ -400,7 +403,8 @@ def enrich_inventory(cluster: KubernetesCluster, inventory: dict, make_dumps=Tru
         fn_package_name, fn_method_name = enrichment_fn.rsplit('.', 1)
         mod = import_module(fn_package_name)
         cluster.log.verbose('Calling fn "%s"' % enrichment_fn)
-        inventory = getattr(mod, fn_method_name)(inventory, cluster)
+        with tracing.span(tracing.ENRICHMENT, enrichment_fn):
+            inventory = getattr(mod, fn_method_name)(inventory, cluster)
 
     cluster.log.verbose('Enrichment finished!')
 
@@ -413,73 +417,370 @@ def enrich_inventory(cluster: KubernetesCluster, inventory: dict, make_dumps=Tru
 
 
 def compile_inventory(inventory: dict, cluster: KubernetesCluster):
+    enrichment_cache = _get_enrichment_cache(cluster)
+    cache_key = None
+    compiled_inventory = None
+    if enrichment_cache is not None:
+        cache_key = _get_compilation_cache_key(inventory)
+        cached = enrichment_cache.get(cache_key)
+        if cached is not None:
+            cluster.log.verbose('Compiled inventory is loaded from cache')
+            # The compilation changes the inventory in-place, and the previous enrichment functions can rely on it.
+            compiled_inventory = _update_in_place(inventory, json.loads(cached))
+
+    if compiled_inventory is None:
+        compiled_inventory = _compile_inventory(inventory, cluster)
+        if enrichment_cache is not None and cache_key is not None:
+            _store_compiled_inventory(cluster, enrichment_cache, cache_key, compiled_inventory)
+
+    inventory = compiled_inventory
 
-    # convert references in yaml to normal values
-    iterations = 100
-    root = deepcopy(inventory)
-    root['globals'] = static.GLOBALS
-    root['env'] = os.Environ()
+    from kubemarine import controlplane
+    inventory_for_dump = controlplane.controlplane_finalize_inventory(cluster, prepare_for_dump(inventory))
+    merged_inventory = yaml.dump(inventory_for_dump)
+    utils.dump_file(cluster, merged_inventory, "cluster_precompiled.yaml")
 
-    while iterations > 0:
+    return inventory
 
-        cluster.log.verbose('Inventory is not rendered yet...')
-        inventory = compile_object(cluster.log, inventory, root)
 
-        temp_dump = yaml.dump(inventory)
+def _compile_inventory(inventory: dict, cluster: KubernetesCluster) -> dict:
+    # convert references in yaml to normal values
+    compiler = InventoryCompiler(cluster.log, inventory)
+    compiler.compile()
+
+    return compile_object(cluster.log, inventory, compiler.root, ignore_jinja_escapes=False,
+                          templates=compiler.templates)
+
+
+_Path = Tuple[Union[str, int], ...]
+
+
+class InventoryCompiler:
+    """
+    Compiles templated string values of the inventory in order of dependencies between them.
+
+    Each templated value is rendered only after all the values it references are rendered,
+    so that it is enough to render each value exactly once.
+    The references are collected from the syntax tree of the template.
+    Cyclic references are detected and reported.
+    """
+
+    _IN_PROGRESS = 1
+    _DONE = 2
+
+    def __init__(self, logger: log.EnhancedLogger, inventory: dict) -> None:
+        self.logger = logger
+        self.inventory = inventory
+        # Root shares the objects with the inventory, and thus sees already compiled values.
+        self.root = dict(inventory)
+        self.root['globals'] = static.GLOBALS
+        self.root['env'] = os.Environ()
+        self.templates = TemplatesCache(logger, self.root)
+
+        self._leaves: Dict[_Path, str] = {}
+        self._subtree_leaves: Dict[_Path, List[_Path]] = {}
+        self._collect_leaves(inventory, ())
+
+        self._state: Dict[_Path, int] = {}
+        self._stack: List[_Path] = []
+
+    def _collect_leaves(self, struct: Any, path: _Path) -> None:
+        if isinstance(struct, dict):
+            for k, v in struct.items():
+                self._collect_leaves(v, path + (k,))
+        elif isinstance(struct, list):
+            for i, v in enumerate(struct):
+                self._collect_leaves(v, path + (i,))
+        elif isinstance(struct, str) and ('{{' in struct or '{%' in struct):
+            self._leaves[path] = struct
+            for i in range(len(path) + 1):
+                self._subtree_leaves.setdefault(path[:i], []).append(path)
+
+    def compile(self) -> None:
+        for path in list(self._leaves):
+            self._compile_leaf(path, True)
+
+    def _compile_leaf(self, path: _Path, strict: bool) -> None:
+        state = self._state.get(path)
+        if state == self._DONE:
+            return
+        if state == self._IN_PROGRESS:
+            if not strict:
+                # The value is referenced only as a part of some parent object, for example,
+                # if the value of the node is calculated from the list of all nodes.
+                # The raw value is seen in this case, that is the same as without dependency tracking.
+                return
+            cycle = self._stack[self._stack.index(path):] + [path]
+            raise Exception("Cyclic reference in the inventory: %s" % ' -> '.join(map(_format_path, cycle)))
+
+        self._state[path] = self._IN_PROGRESS
+        self._stack.append(path)
+
+        struct = self._leaves[path]
+        # The rendered value can still contain templates, for example, if it is taken from environment variables.
+        for _ in range(100):
+            for dependency, strict in self._get_dependencies(struct):
+                self._compile_leaf(dependency, strict)
+
+            struct = compile_string(self.logger, struct, self.root, templates=self.templates)
+            if not _has_unescaped_templates(struct):
+                break
+
+        self._set_value(path, struct)
+
+        self._stack.pop()
+        self._state[path] = self._DONE
+
+    def _get_dependencies(self, struct: str) -> List[Tuple[_Path, bool]]:
+        """
+        Returns paths of templated values that are referenced from the specified template.
+        The dependency is strict if the templated value is referenced directly, and not as a part of some parent object.
+        """
+        dependencies = []
+        for reference in self.templates.get_references(re.sub(escaped_expression_regex, '', struct)):
+            path = self._resolve(reference)
+            if path is None:
+                continue
+            # The referenced value itself can be templated string, or can contain templated strings.
+            for i in range(len(path) + 1):
+                if path[:i] in self._leaves:
+                    dependencies.append((path[:i], True))
+            if path not in self._leaves:
+                dependencies.extend((leaf, False) for leaf in self._subtree_leaves.get(path, []))
+
+        return dependencies
+
+    def _resolve(self, reference: List[Union[str, int]]) -> Optional[_Path]:
+        """
+        Finds the longest existing path of the inventory for the reference.
+        If the reference points to a method or to the missing key, the path of the parent object is returned.
+        """
+        if reference[0] not in self.inventory:
+            return None
+
+        struct: Any = self.inventory
+        path: _Path = ()
+        for key in reference:
+            if isinstance(struct, dict) and key in struct:
+                struct = struct[key]
+            elif isinstance(struct, list) and isinstance(key, int) and -len(struct) <= key < len(struct):
+                key = key % len(struct)
+                struct = struct[key]
+            else:
+                break
+            path += (key,)
+
+        return path
+
+    def _set_value(self, path: _Path, value: str) -> None:
+        struct: Any = self.inventory
+        for key in path[:-1]:
+            struct = struct[key]
+        struct[path[-1]] = value
+        if len(path) == 1:
+            self.root[path[0]] = value
+
+
+class TemplatesCache:
+    """
+    Jinja environment with cache of compiled templates by their source text.
+    """
+
+    def __init__(self, logger: log.EnhancedLogger, root: dict) -> None:
+        self.env = jinja.new(logger, True, root)
+        self._templates: Dict[str, jinja2.Template] = {}
+        self._references: Dict[str, List[List[Union[str, int]]]] = {}
+
+    def get(self, source: str) -> jinja2.Template:
+        template = self._templates.get(source)
+        if template is None:
+            template = self._templates[source] = self.env.from_string(source)
+        return template
+
+    def get_references(self, source: str) -> List[List[Union[str, int]]]:
+        """
+        Collects paths of variables that are referenced from the template, for example, ['services', 'kubeadm'].
+        If the variable is accessed using dynamic key, only the static prefix of the path is returned.
+        """
+        references = self._references.get(source)
+        if references is None:
+            references = []
+            _collect_references(self.env.parse(source), references)
+            self._references[source] = references
+        return references
+
+
+def _collect_references(node: jinja2.nodes.Node, references: List[List[Union[str, int]]]) -> None:
+    path: List[Union[str, int]] = []
+    dynamic_keys = []
+    current = node
+    while True:
+        if isinstance(current, jinja2.nodes.Getattr):
+            path.append(current.attr)
+            current = current.node
+        elif isinstance(current, jinja2.nodes.Getitem):
+            if isinstance(current.arg, jinja2.nodes.Const) and isinstance(current.arg.value, (str, int)):
+                path.append(current.arg.value)
+            else:
+                path.clear()
+                dynamic_keys.append(current.arg)
+            current = current.node
+        else:
+            break
 
-        # remove golang specific
-        temp_dump = re.sub(escaped_expression_regex, '', temp_dump.replace('\n', ''))
+    if isinstance(current, jinja2.nodes.Name) and current.ctx == 'load':
+        path.append(current.name)
+        path.reverse()
+        references.append(path)
+        for key in dynamic_keys:
+            _collect_references(key, references)
+        return
 
-        # it is necessary to carry out several iterations,
-        # in case we have dynamic variables that reference each other
-        if '{{' in temp_dump or '{%' in temp_dump:
-            iterations -= 1
-        else:
-            iterations = 0
+    for child in node.iter_child_nodes():
+        _collect_references(child, references)
 
-    inventory = compile_object(cluster.log, inventory, root, ignore_jinja_escapes=False)
 
-    from kubemarine import controlplane
-    inventory_for_dump = controlplane.controlplane_finalize_inventory(cluster, prepare_for_dump(inventory))
-    merged_inventory = yaml.dump(inventory_for_dump)
-    utils.dump_file(cluster, merged_inventory, "cluster_precompiled.yaml")
+def _has_unescaped_templates(struct: str) -> bool:
+    struct = re.sub(escaped_expression_regex, '', struct.replace('\n', ''))
+    return '{{' in struct or '{%' in struct
 
-    return inventory
 
+def _format_path(path: _Path) -> str:
+    formatted = ''
+    for key in path:
+        if isinstance(key, int):
+            formatted += '[%d]' % key
+        else:
+            formatted += ('.' if formatted else '') + key
+    return formatted
+
+
+def _get_enrichment_cache(cluster: KubernetesCluster) -> Optional[cache.DiskCache]:
+    args: dict = cluster.context['execution_arguments']
+    # The cache is stored near the dump directory, and is not used if the dump is disabled.
+    if args.get('disable_dump', True) or args.get('disable_enrichment_cache', False):
+        return None
+
+    cache_config = static.GLOBALS['enrichment']['cache']
+    return cache.DiskCache(utils.get_cache_dirpath(cluster.context, 'enrichment'), cache_config['max_entries'])
+
+
+def _get_compilation_cache_key(inventory: dict) -> str:
+    """
+    The compiled inventory depends only on the inventory before the compilation,
+    on the globals, on the referenced environment variables, and on the Kubemarine version.
+    The inventory before the compilation already reflects the raw inventory, procedure inventory, and nodes context.
+    """
+    environ = {name: os.Environ().get(name) for name in _get_referenced_environ(inventory)}
+    return cache.make_key(utils.get_version(), inventory, static.GLOBALS, environ)
+
+
+def _get_referenced_environ(inventory: dict) -> Iterable[str]:
+    """
+    Returns names of the environment variables, that are referenced from the templates of the inventory.
+    If a template accesses the environment variables other than by static name, all the variables are returned.
+    """
+    env = jinja2.Environment()
+    names: Set[str] = set()
+    stack: List[Any] = [inventory]
+    while stack:
+        struct = stack.pop()
+        if isinstance(struct, dict):
+            stack.extend(struct.values())
+        elif isinstance(struct, list):
+            stack.extend(struct)
+        elif isinstance(struct, str) and ('{{' in struct or '{%' in struct):
+            references: List[List[Union[str, int]]] = []
+            try:
+                _collect_references(env.parse(struct), references)
+            except jinja2.TemplateSyntaxError:
+                return os.Environ()
+
+            for reference in references:
+                if reference[0] != 'env':
+                    continue
+                # Dynamic keys, and methods like env.get('NAME') or env.items() are not resolved to the names.
+                if len(reference) == 1 or not isinstance(reference[1], str) \
+                        or reference[1] in ('get', 'keys', 'items', 'values'):
+                    return os.Environ()
+                names.add(reference[1])
+
+    return names
+
+
+def _update_in_place(struct: Any, compiled: Any) -> Any:
+    if isinstance(struct, dict) and isinstance(compiled, dict):
+        for k in list(struct.keys()):
+            if k not in compiled:
+                del struct[k]
+        for k, v in compiled.items():
+            struct[k] = _update_in_place(struct.get(k), v)
+        return struct
+    elif isinstance(struct, list) and isinstance(compiled, list) and len(struct) == len(compiled):
+        return [_update_in_place(struct[i], v) for i, v in enumerate(compiled)]
+
+    return compiled
+
+
+def _store_compiled_inventory(cluster: KubernetesCluster, enrichment_cache: cache.DiskCache,
+                              cache_key: str, compiled_inventory: dict) -> None:
+    try:
+        data = json.dumps(compiled_inventory)
+    except (TypeError, ValueError):
+        cluster.log.verbose('Compiled inventory is not serializable and will not be cached')
+        return
+
+    # Types that are not preserved by JSON (for example, non-string keys) make the inventory not cacheable.
+    if json.loads(data) != compiled_inventory:
+        cluster.log.verbose('Compiled inventory cannot be restored from cache and will not be cached')
+        return
+
+    try:
+        enrichment_cache.put(cache_key, data)
+    except OSError as e:
+        cluster.log.verbose('Failed to cache compiled inventory: %s' % e)
+
+
+def compile_object(logger: log.EnhancedLogger, struct: Any, root: dict, ignore_jinja_escapes=True,
+                   templates: 'TemplatesCache' = None) -> Any:
+    if templates is None:
+        templates = TemplatesCache(logger, root)
 
-def compile_object(logger: log.EnhancedLogger, struct: Any, root: dict, ignore_jinja_escapes=True) -> Any:
     if isinstance(struct, list):
         new_struct = []
         for i, v in enumerate(struct):
-            struct[i] = compile_object(logger, v, root, ignore_jinja_escapes=ignore_jinja_escapes)
+            struct[i] = compile_object(logger, v, root, ignore_jinja_escapes=ignore_jinja_escapes, templates=templates)
             # delete empty list entries, which can appear after jinja compilation
             if struct[i] != '':
                 new_struct.append(struct[i])
         struct = new_struct
     elif isinstance(struct, dict):
         for k, v in struct.items():
-            struct[k] = compile_object(logger, v, root, ignore_jinja_escapes=ignore_jinja_escapes)
+            struct[k] = compile_object(logger, v, root, ignore_jinja_escapes=ignore_jinja_escapes, templates=templates)
     elif isinstance(struct, str) and ('{{' in struct or '{%' in struct):
-        struct = compile_string(logger, struct, root, ignore_jinja_escapes=ignore_jinja_escapes)
+        struct = compile_string(logger, struct, root, ignore_jinja_escapes=ignore_jinja_escapes, templates=templates)
 
     return struct
 
 
 def compile_string(logger: log.EnhancedLogger, struct: str, root: dict,
-                   ignore_jinja_escapes=True) -> str:
+                   ignore_jinja_escapes=True, templates: 'TemplatesCache' = None) -> str:
     logger.verbose("Rendering \"%s\"" % struct)
 
+    if templates is None:
+        templates = TemplatesCache(logger, root)
+
     if ignore_jinja_escapes:
         iterator = escaped_expression_regex.finditer(struct)
         struct = re.sub(escaped_expression_regex, '', struct)
-        struct = jinja.new(logger, True, root).from_string(struct).render(**root)
+        struct = templates.get(struct).render(**root)
 
         # TODO this does not work for {raw}{jinja}{raw}{jinja}
         for match in iterator:
             span = match.span()
             struct = struct[:span[0]] + match.group() + struct[span[0]:]
     else:
-        struct = jinja.new(logger, True, root).from_string(struct).render(**root)
+        struct = templates.get(struct).render(**root)
 
     logger.verbose("\tRendered as \"%s\"" % struct)
     return struct
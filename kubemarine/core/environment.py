@@ -14,6 +14,7 @@
 
 import os
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 
 from kubemarine.core import log
 from kubemarine.core.connections import ConnectionPool
@@ -30,6 +31,14 @@ class Environment(ABC):
     def connection_pool(self) -> ConnectionPool:
         pass
 
+    @property
+    @abstractmethod
+    def worker_pool(self) -> ThreadPoolExecutor:
+        """
+        Pool of threads that is shared by all executors to perform actions on remote nodes.
+        """
+        pass
+
     @property
     @abstractmethod
     def log(self) -> log.EnhancedLogger:
@@ -14,8 +14,10 @@
 import collections
 import concurrent
 import io
+import os
 import random
 import re
+import threading
 import time
 from abc import ABC, abstractmethod
 from datetime import datetime
@@ -25,11 +27,10 @@ from typing import Tuple, List, Dict, Callable, Any, Optional, Union, OrderedDic
 import fabric  # type: ignore[import]
 import fabric.transfer  # type: ignore[import]
 
-from concurrent.futures.thread import ThreadPoolExecutor
-
 import invoke
 
-from kubemarine.core import log, static
+from kubemarine.core import log, static, tracing
+from kubemarine.core.connections import OutputConsumer
 from kubemarine.core.environment import Environment
 
 
@@ -170,9 +171,11 @@ class Callback(ABC):
     def accept(self, host: str, token: Token, result: RunnersResult) -> None:
         """
         The method is called after the run / sudo command is exited.
-        Calling of the method happens sequentially in one thread after some batch of commands is executed on all nodes.
+        The method is called as soon as the command is exited, even if other commands merged in the same batch
+        are still running. Thus, it can be called from different threads for different hosts.
 
-        For the particular host, the order of results with which the method is called
+        For the particular host, calling of the method happens sequentially,
+        and the order of results with which the method is called
         corresponds to the order of queued commands, for which the given callback was requested.
 
         :param host: host on which the command was executed
@@ -182,7 +185,8 @@ class Callback(ABC):
         pass
 
 
-_RawHostToResult = Dict[str, Union[Exception, fabric.runners.Result, fabric.transfer.Result]]
+_RawHostToResult = Dict[str, Union[Exception, fabric.runners.Result, fabric.transfer.Result,
+                                   List[Union[Exception, fabric.transfer.Result]]]]
 
 _Action = Tuple[str, tuple, dict]
 _PayloadItem = Tuple[_Action, Optional[Callback], Token]
@@ -190,20 +194,231 @@ _PayloadItem = Tuple[_Action, Optional[Callback], Token]
 _T = TypeVar('_T', bound='RawExecutor')
 
 
+class _FrameSplitter:
+    """
+    Incrementally splits the stream by the specified marker.
+    The data that can be the beginning of the marker is held until the next chunk arrives.
+    """
+
+    def __init__(self, marker: str, discard: bool = False) -> None:
+        """
+        :param marker: marker that separates the frames
+        :param discard: if True, the content of the frames is not kept, and the frames are always empty
+        """
+        self._marker = marker
+        self._discard = discard
+        self._chunks: List[str] = []
+        self._pending = ''
+
+    def feed(self, data: str) -> List[str]:
+        """
+        :param data: next chunk of the stream
+        :return: list of frames that are completed by the given chunk
+        """
+        frames = []
+        pending = self._pending + data
+        while True:
+            idx = pending.find(self._marker)
+            if idx == -1:
+                break
+
+            if not self._discard:
+                self._chunks.append(pending[:idx])
+            frames.append(''.join(self._chunks))
+            self._chunks = []
+            pending = pending[idx + len(self._marker):]
+
+        keep = len(self._marker) - 1
+        if len(pending) > keep:
+            if not self._discard:
+                self._chunks.append(pending[:len(pending) - keep])
+            pending = pending[len(pending) - keep:]
+
+        self._pending = pending
+        return frames
+
+    def remainder(self) -> str:
+        if self._discard:
+            return ''
+        return ''.join(self._chunks) + self._pending
+
+
+class _BatchOutputParser(OutputConsumer):
+    """
+    Parses merged output of the batch of commands as it arrives,
+    and calls callbacks as soon as each command in the batch is exited.
+    If the stdout is owned by other consumers of the commands, it is not kept in the results.
+    """
+
+    owns_stdout = False
+
+    def __init__(self, separator: str, host: str, payloads: List[_PayloadItem]) -> None:
+        self._host = host
+        self._payloads = payloads
+        # unpack last action in list of payloads
+        _, _, kwargs = payloads[-1][0]
+        self._hide = kwargs.get('hide', False)
+        stdout_owned = any(isinstance(watcher, OutputConsumer) and watcher.owns_stdout
+                           for watcher in kwargs.get('watchers') or [])
+
+        self._lock = threading.Lock()
+        self._stdout_splitter = _FrameSplitter(separator + '\n', discard=stdout_owned)
+        self._stderr_splitter = _FrameSplitter(separator + '\n')
+        self._stdouts: List[str] = []
+        self._stderrs: List[str] = []
+        self._exit_codes: List[int] = []
+        self.streamed = False
+        self.results: List[RunnersResult] = []
+        """Results of the exited commands in the order of payloads."""
+        self.accepted = 0
+        """Number of results, for which the callbacks are already called."""
+        self.received = 0
+        """Number of characters of the output consumed by the parser."""
+
+    def consume(self, data: str, stderr: bool) -> None:
+        with self._lock:
+            self.streamed = True
+            self.received += len(data)
+            if stderr:
+                self._stderrs.extend(self._stderr_splitter.feed(data))
+            else:
+                for frame in self._stdout_splitter.feed(data):
+                    # Frames of stdout are alternated: output of the command, exit code of the command, and so on.
+                    if len(self._stdouts) > len(self._exit_codes):
+                        self._exit_codes.append(int(frame.strip()))
+                    else:
+                        self._stdouts.append(frame)
+
+            self._collect_results()
+            # Calling of callbacks under lock guarantees their sequential order for the host.
+            while self.accepted < len(self.results):
+                _, callback, token = self._payloads[self.accepted]
+                if callback is not None:
+                    callback.accept(self._host, token, self.results[self.accepted])
+                self.accepted += 1
+
+    def finish(self, exited: int) -> List[RunnersResult]:
+        """
+        Completes the result of the last executed command.
+
+        :param exited: exit code of the whole batch, that is also an exit code of the last executed command.
+        :return: results of all executed commands.
+        """
+        with self._lock:
+            self._stdouts.append(self._stdout_splitter.remainder())
+            self._stderrs.append(self._stderr_splitter.remainder())
+            self._exit_codes.append(exited)
+            self._collect_results()
+            return self.results
+
+    def _collect_results(self) -> None:
+        while len(self.results) < min(len(self._exit_codes), len(self._stderrs)):
+            i = len(self.results)
+            action, _, _ = self._payloads[i]
+            command: str = action[1][0]
+            self.results.append(RunnersResult(
+                [command], [self._exit_codes[i]], self._stdouts[i], self._stderrs[i], hide=self._hide))
+
+
+class _HostPipeline:
+    """
+    State of the merged actions of one host in the pipelined flush,
+    that is shared between the flushing thread and the worker thread.
+    """
+
+    POLL_INTERVAL = 1.0
+    """Interval to check the deadlines of the actions, that are started by the workers after the last check."""
+
+    def __init__(self, host: str, actions: List[List[_PayloadItem]]) -> None:
+        self.host = host
+        self.actions = actions
+        self.next_action = 0
+        self.stopped = threading.Event()
+        """Set if the host should not start any more commands."""
+        self._lock = threading.Lock()
+        self._deadline: Optional[float] = None
+        self._in_flight: Optional[Tuple[List[_PayloadItem], _BatchOutputParser]] = None
+        """Payloads and the parser of the currently performed attempt of the merged action."""
+
+    def queue(self) -> None:
+        """
+        Marks the next action as waiting for a free worker. The waiting time is not limited by the timeout.
+        """
+        with self._lock:
+            self._deadline = None
+            self._in_flight = None
+
+    def start(self, timeout: int) -> bool:
+        """
+        Starts the timeout of the next action in the worker thread.
+
+        :return: False if the host is already stopped, and the action should not be performed.
+        """
+        with self._lock:
+            if self.stopped.is_set():
+                return False
+            self._deadline = time.time() + timeout
+            return True
+
+    def set_in_flight(self, payloads: List[_PayloadItem], parser: _BatchOutputParser) -> bool:
+        """
+        Publishes the attempt of the action, that is going to be performed by the worker thread.
+
+        :return: False if the host is already stopped, and the attempt should not be performed.
+        """
+        with self._lock:
+            if self.stopped.is_set():
+                return False
+            self._in_flight = (payloads, parser)
+            return True
+
+    def get_deadline(self) -> Optional[float]:
+        with self._lock:
+            return self._deadline
+
+    def stop_if_timed_out(self, executor: 'RawExecutor', now: float) -> Optional[TokenizedResult]:
+        """
+        Stops the host if the action is timed out.
+
+        :return: results of the timed out action, or None if the action is not timed out.
+        """
+        with self._lock:
+            if self._deadline is None or self._deadline > now:
+                return None
+
+            self.stopped.set()
+            exception = concurrent.futures.TimeoutError()
+            if self._in_flight is None:
+                # The attempt is not yet started by the worker.
+                results: TokenizedResult = collections.OrderedDict()
+                results[self.actions[self.next_action][0][2]] = exception
+                return results
+
+            payloads, parser = self._in_flight
+            # Commands that are already exited keep their results, the exception is assigned to the hung command.
+            return executor._reparse_results({self.host: exception}, {self.host: payloads},
+                                             {self.host: parser})[self.host]
+
+
 class RawExecutor:
 
-    def __init__(self, cluster: Environment, timeout: int = None) -> None:
+    def __init__(self, cluster: Environment, timeout: int = None, pipelined: bool = None) -> None:
         self.logger = cluster.log
         self.connection_pool = cluster.connection_pool
+        self.worker_pool = cluster.worker_pool
         self.inventory = cluster.inventory
-        self.timeout = timeout
         if timeout is None:
-            self.timeout = static.GLOBALS['nodes']['command_execution']['timeout']
+            timeout = static.GLOBALS['nodes']['command_execution']['timeout']
+        self.timeout: int = timeout
+        if pipelined is None:
+            pipelined = static.GLOBALS['nodes']['command_execution']['pipelined']
+        self.pipelined: bool = pipelined
+        self._inline = threading.local()
         self._connections_queue: Dict[str, List[_PayloadItem]] = {}
         self._last_token = -1
         self._last_results: Dict[str, TokenizedResult] = {}
         self._command_separator = ''.join(random.choice('=-_') for _ in range(32))
-        self._supported_args = {'hide', 'warn', 'timeout', 'env', 'out_stream', 'err_stream'}
+        self._supported_args = {'hide', 'warn', 'timeout', 'env', 'out_stream', 'err_stream', 'watchers'}
         self._closed = False
 
     def __enter__(self: _T) -> _T:
@@ -224,11 +439,15 @@ class RawExecutor:
     def _actions_mergeable(self, action1: _Action, action2: _Action) -> bool:
         do_type1, _, kwargs1 = action1
         do_type2, _, kwargs2 = action2
+        if do_type1 == do_type2 == "put":
+            # Consecutive uploads are performed one by one in the same worker over the already opened SFTP session.
+            return True
+
         if do_type1 not in ["sudo", "run"] or do_type1 != do_type2:
             return False
 
         for arg in self._supported_args:
-            if arg in ('out_stream', 'err_stream') and kwargs1.get(arg) is kwargs2.get(arg):
+            if arg in ('out_stream', 'err_stream', 'watchers') and kwargs1.get(arg) is kwargs2.get(arg):
                 continue
 
             if arg in ('hide', 'warn') and kwargs1.get(arg) == kwargs2.get(arg):
@@ -243,10 +462,12 @@ class RawExecutor:
         return True
 
     def _reparse_results(self, raw_results: _RawHostToResult,
-                         batch: Dict[str, List[_PayloadItem]]) -> Dict[str, TokenizedResult]:
+                         batch: Dict[str, List[_PayloadItem]],
+                         parsers: Dict[str, _BatchOutputParser]) -> Dict[str, TokenizedResult]:
         reparsed_results: Dict[str, TokenizedResult] = {}
         for host, raw_result in raw_results.items():
             payloads = batch[host]
+            parser = parsers[host]
             conn_results: TokenizedResult = collections.OrderedDict()
             reparsed_results[host] = conn_results
 
@@ -258,12 +479,24 @@ class RawExecutor:
                 runner_exception = raw_result
                 raw_result = raw_result.result
 
+            if isinstance(raw_result, list):
+                # Results of merged uploads. The exception may be only the last in the list.
+                for i, transfer_result in enumerate(raw_result):
+                    token = payloads[i][2]
+                    conn_results[token] = transfer_result
+                continue
+
             if not isinstance(raw_result, fabric.runners.Result):
-                token = payloads[0][2]
+                # Commands that are exited before the connection is broken are not executed again.
+                for i in range(parser.accepted):
+                    token = payloads[i][2]
+                    conn_results[token] = parser.results[i]
+
+                token = payloads[parser.accepted][2]
                 conn_results[token] = raw_result
                 continue
 
-            results = self._reparse_fabric_result(payloads, raw_result)
+            results = self._reparse_fabric_result(parser, raw_result)
 
             for i, result in enumerate(results):
                 reparsed_result: GenericResult = result
@@ -277,36 +510,19 @@ class RawExecutor:
                         reparsed_result = CommandTimedOut(result, runner_exception.timeout)
 
                 conn_results[token] = reparsed_result
-                if callback is not None and isinstance(reparsed_result, RunnersResult):
+                if i >= parser.accepted and callback is not None and isinstance(reparsed_result, RunnersResult):
                     callback.accept(host, token, reparsed_result)
 
         return reparsed_results
 
-    def _reparse_fabric_result(self, payloads: List[_PayloadItem],
+    def _reparse_fabric_result(self, parser: _BatchOutputParser,
                                result: fabric.runners.Result) -> List[RunnersResult]:
-        # unpack last action in list of payloads
-        _, _, kwargs = payloads[-1][0]
+        if not parser.streamed:
+            # The output was not passed to the parser by the runner, and is fully accumulated in the result.
+            parser.consume(result.stdout, False)
+            parser.consume(result.stderr, True)
 
-        stderrs = result.stderr.split(self._command_separator + '\n')
-        raw_stdouts = result.stdout.split(self._command_separator + '\n')
-        stdouts = []
-        exit_codes = []
-        i = 0
-        while i < len(raw_stdouts):
-            stdouts.append(raw_stdouts[i])
-            if i + 1 < len(raw_stdouts):
-                exit_codes.append(int(raw_stdouts[i + 1].strip()))
-            i += 2
-        exit_codes.append(result.exited)
-
-        results = []
-        for i, code in enumerate(exit_codes):
-            action, _, _ = payloads[i]
-            command: str = action[1][0]
-            results.append(RunnersResult(
-                    [command], [code], stdouts[i], stderrs[i], hide=kwargs.get('hide', False)))
-
-        return results
+        return parser.finish(result.exited)
 
     def _get_separator(self, warn: bool) -> str:
         if warn:
@@ -337,12 +553,17 @@ class RawExecutor:
 
         return merged_payloads
 
-    def _get_callables(self) -> List[Dict[str, List[_PayloadItem]]]:
+    def _get_host_callables(self) -> Dict[str, List[List[_PayloadItem]]]:
         callables: Dict[str, List[List[_PayloadItem]]] = {}
 
         for host, payload_items in self._connections_queue.items():
             callables[host] = self._merge_actions(payload_items)
 
+        return callables
+
+    def _get_callables(self) -> List[Dict[str, List[_PayloadItem]]]:
+        callables = self._get_host_callables()
+
         i = 0
         batches: List[Dict[str, List[_PayloadItem]]] = []
 
@@ -398,58 +619,172 @@ class RawExecutor:
             self.logger.verbose('Queue is empty, nothing to perform')
             return
 
+        with tracing.span(tracing.FLUSH, 'flush', hosts=len(self._connections_queue), pipelined=self.pipelined):
+            if self.pipelined:
+                self._flush_pipelined()
+            else:
+                self._flush_waves()
+
+        self._connections_queue = {}
+
+    def _flush_waves(self) -> None:
+        """
+        Performs merged actions in waves. Each wave starts only after the previous wave is finished on all hosts.
+        """
         callable_batches: List[Dict[str, List[_PayloadItem]]] = self._get_callables()
 
-        max_workers = len(self._connections_queue)
+        for batch in callable_batches:
+            # filter out hosts with failed commands
+            batch = {host: payloads for host, payloads in batch.items()
+                     # failed command is always last if present
+                     if host not in self._last_results
+                     or not isinstance(list(self._last_results[host].values())[-1], Exception)}
 
-        with ThreadPoolExecutor(max_workers=max_workers) as TPE:
-            for batch in callable_batches:
-                # filter out hosts with failed commands
-                batch = {host: payloads for host, payloads in batch.items()
-                         # failed command is always last if present
-                         if host not in self._last_results
-                         or not isinstance(list(self._last_results[host].values())[-1], Exception)}
+            batch_results = self._do_batch_with_retries(batch)
 
-                retry = 0
-                batch_results: Dict[str, TokenizedResult] = {}
-                while True:
-                    retry += 1
+            for host, tokenized_results in batch_results.items():
+                self._last_results.setdefault(host, collections.OrderedDict()).update(tokenized_results)
 
-                    parsed_results = self._do_batch(batch, TPE)
-                    for host, tokenized_results in parsed_results.items():
-                        batch_results.setdefault(host, collections.OrderedDict()).update(tokenized_results)
+    def _flush_pipelined(self) -> None:
+        """
+        Performs merged actions on each host independently of other hosts.
+        The next action on the host starts as soon as the previous action on the same host is finished.
+        The only barrier for all hosts is at the end of the flush.
+        """
+        pipelines = [_HostPipeline(host, actions) for host, actions in self._get_host_callables().items()]
+        in_flight: Dict[concurrent.futures.Future, _HostPipeline] = {}
+
+        def submit(pipeline: _HostPipeline) -> None:
+            pipeline.queue()
+            in_flight[self.worker_pool.submit(self._do_host_action, pipeline)] = pipeline
+
+        try:
+            for pipeline in pipelines:
+                submit(pipeline)
+
+            while in_flight:
+                deadlines = [pipeline.get_deadline() for pipeline in in_flight.values()]
+                started_deadlines = [deadline for deadline in deadlines if deadline is not None]
+                wait_timeout = None
+                if started_deadlines:
+                    wait_timeout = max(0.0, min(started_deadlines) - time.time())
+                if len(started_deadlines) < len(deadlines):
+                    # Actions waiting for a free worker are not limited by the timeout until they are started.
+                    wait_timeout = min(wait_timeout, _HostPipeline.POLL_INTERVAL) \
+                        if wait_timeout is not None else _HostPipeline.POLL_INTERVAL
+
+                done, _ = concurrent.futures.wait(list(in_flight), timeout=wait_timeout,
+                                                  return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    pipeline = in_flight.pop(future)
+                    try:
+                        action_results = future.result()
+                    except Exception as e:
+                        action_results = collections.OrderedDict()
+                        action_results[pipeline.actions[pipeline.next_action][0][2]] = e
+
+                    host_results = self._last_results.setdefault(pipeline.host, collections.OrderedDict())
+                    host_results.update(action_results)
+                    pipeline.next_action += 1
+                    # failed command is always last if present
+                    if (pipeline.next_action < len(pipeline.actions)
+                            and not isinstance(list(host_results.values())[-1], Exception)):
+                        submit(pipeline)
+
+                now = time.time()
+                for future, pipeline in list(in_flight.items()):
+                    if future.done():
+                        continue
+                    # Each merged action is limited by the timeout since it is started by the worker.
+                    # The timeout is assigned to the command that is currently performed on the host.
+                    timed_out_results = pipeline.stop_if_timed_out(self, now)
+                    if timed_out_results is not None:
+                        del in_flight[future]
+                        self._last_results.setdefault(pipeline.host, collections.OrderedDict()).update(
+                            timed_out_results)
+        finally:
+            # Worker threads that are still busy with the timed out actions should not start anything else
+            # after the flush is finished.
+            for pipeline in pipelines:
+                pipeline.stopped.set()
+
+    def _do_host_action(self, pipeline: _HostPipeline) -> TokenizedResult:
+        # The action is performed right in the current worker thread.
+        # Submitting to the same pool of workers and waiting for the result might lead to deadlock.
+        self._inline.pipeline = pipeline
+        try:
+            if not pipeline.start(self.timeout):
+                return collections.OrderedDict()
+
+            payloads = pipeline.actions[pipeline.next_action]
+            return self._do_batch_with_retries({pipeline.host: payloads})[pipeline.host]
+        finally:
+            self._inline.pipeline = None
+
+    def _do_batch_with_retries(self, batch: Dict[str, List[_PayloadItem]]) -> Dict[str, TokenizedResult]:
+        retry = 0
+        batch_results: Dict[str, TokenizedResult] = {}
+        while True:
+            retry += 1
 
-                    batch = self._get_remained_batch(batch, batch_results)
+            parsed_results = self._do_batch(batch)
+            for host, tokenized_results in parsed_results.items():
+                batch_results.setdefault(host, collections.OrderedDict()).update(tokenized_results)
 
-                    if (not batch or retry >= static.GLOBALS['workaround']['retries']
-                            or not self._try_workaround(batch, batch_results, TPE)):
-                        break
+            batch = self._get_remained_batch(batch, batch_results)
 
-                    self.logger.verbose('Retrying #%s...' % retry)
-                    time.sleep(static.GLOBALS['workaround']['delay_period'])
+            if (not batch or retry >= static.GLOBALS['workaround']['retries']
+                    or not self._try_workaround(batch, batch_results)):
+                break
 
-                for host, tokenized_results in batch_results.items():
-                    self._last_results.setdefault(host, collections.OrderedDict()).update(tokenized_results)
+            self.logger.verbose('Retrying #%s...' % retry)
+            time.sleep(static.GLOBALS['workaround']['delay_period'])
+            self._restart_consumers(batch)
 
-        self._connections_queue = {}
+            pipeline: Optional[_HostPipeline] = getattr(self._inline, 'pipeline', None)
+            if pipeline is not None and pipeline.stopped.is_set():
+                # The action is already timed out by the pipelined flush, and should not be retried.
+                break
+
+        return batch_results
+
+    def _restart_consumers(self, batch: Dict[str, List[_PayloadItem]]) -> None:
+        consumers: Dict[int, OutputConsumer] = {}
+        for payloads in batch.values():
+            for action, _, _ in payloads:
+                for watcher in action[2].get('watchers') or []:
+                    if isinstance(watcher, OutputConsumer):
+                        consumers[id(watcher)] = watcher
 
-    def _prepare_merged_action(self, host: str, payloads: List[_PayloadItem]) -> _Action:
+        for consumer in consumers.values():
+            consumer.restart()
+
+    def _prepare_merged_action(self, host: str, payloads: List[_PayloadItem],
+                               parser: _BatchOutputParser) -> Callable[[], Any]:
+        cxn = self.connection_pool.get_connection(host)
         # unpack last action in list of payloads
         do_type, args, kwargs = payloads[-1][0]
 
         if do_type == 'get':
             self.logger.verbose('Executing get %s on host %s with options: %s' % (args, host, kwargs))
         if do_type == 'put':
-            local_stream, remote_file = args
-            if isinstance(local_stream, io.BytesIO):
-                # Each thread should use its own instance of BytesIO.
-                local_stream = io.BytesIO(local_stream.getvalue())
-                self.logger.verbose(
-                    'Executing put %s on host %s with options: %s' % (('<text>', remote_file), host, kwargs))
-            else:
-                self.logger.verbose('Executing put %s on host %s with options: %s' % (args, host, kwargs))
-
-            args = (local_stream, remote_file)
+            transfers: List[Tuple[Union[io.BytesIO, str], str]] = []
+            for action, _, _ in payloads:
+                local_stream, remote_file = action[1]
+                if isinstance(local_stream, io.BytesIO):
+                    # Each thread should use its own instance of BytesIO.
+                    local_stream = io.BytesIO(local_stream.getvalue())
+                    self.logger.verbose(
+                        'Executing put %s on host %s with options: %s' % (('<text>', remote_file), host, kwargs))
+                else:
+                    self.logger.verbose('Executing put %s on host %s with options: %s'
+                                        % ((local_stream, remote_file), host, kwargs))
+
+                transfers.append((local_stream, remote_file))
+
+            bytes_out = sum(stream.getbuffer().nbytes if isinstance(stream, io.BytesIO) else os.path.getsize(stream)
+                            for stream, _ in transfers) if tracing.enabled() else 0
+            return self._traced(host, do_type, cxn, lambda: self._do_put(cxn, transfers), bytes_out, parser)
 
         if do_type in ('run', 'sudo'):
             # Do not add 'timeout=self.timeout'.
@@ -469,7 +804,55 @@ class RawExecutor:
             merged_command = (separator + precommand).join(commands)
             args = (merged_command,)
 
-        return do_type, args, kwargs
+            # Output of the commands is parsed by the runner chunk by chunk as soon as it arrives.
+            kwargs = dict(kwargs)
+            kwargs['watchers'] = list(kwargs.get('watchers') or []) + [parser]
+
+        return self._traced(host, do_type, cxn, lambda: getattr(cxn, do_type)(*args, **kwargs),
+                            len(args[0]) if do_type in ('run', 'sudo') else 0, parser)
+
+    def _traced(self, host: str, do_type: str, cxn: fabric.connection.Connection, call: Callable[[], Any],
+                bytes_out: int, parser: _BatchOutputParser) -> Callable[[], Any]:
+        """
+        Wraps the merged action to record its span if tracing is enabled.
+        The span separates time of waiting for the free worker, time of connecting, and time of the execution itself.
+        """
+        if not tracing.enabled():
+            return call
+
+        queued = time.time()
+
+        def traced_call() -> Any:
+            started = time.time()
+            # Connect explicitly to measure time of the connection separately.
+            if not cxn.is_connected:
+                cxn.open()
+            connected = time.time()
+            try:
+                return call()
+            finally:
+                finished = time.time()
+                tracing.add_span(tracing.COMMAND, do_type, started, finished - started,
+                                 host=host, queue_time=started - queued, connect_time=connected - started,
+                                 exec_time=finished - connected, bytes_out=bytes_out, bytes_in=parser.received)
+
+        return traced_call
+
+    def _do_put(self, cxn: fabric.connection.Connection, transfers: List[Tuple[Union[io.BytesIO, str], str]]) \
+            -> List[Union[Exception, fabric.transfer.Result]]:
+        """
+        Uploads the files one by one using the same connection.
+        The SFTP session is opened only once and is then reused by the connection for all the subsequent uploads.
+        """
+        results: List[Union[Exception, fabric.transfer.Result]] = []
+        for local_stream, remote_file in transfers:
+            try:
+                results.append(cxn.put(local_stream, remote_file))
+            except Exception as e:
+                results.append(e)
+                break
+
+        return results
 
     def _flush_logger_writers(self, batch: Dict[str, List[_PayloadItem]]) -> None:
         for payloads in batch.values():
@@ -483,7 +866,7 @@ class RawExecutor:
                     writer: log.LoggerWriter = kwargs[stream_key]
                     writer.flush(remainder=True)
 
-    def _do_batch(self, batch: Dict[str, List[_PayloadItem]], tpe: ThreadPoolExecutor) -> Dict[str, TokenizedResult]:
+    def _do_batch(self, batch: Dict[str, List[_PayloadItem]]) -> Dict[str, TokenizedResult]:
         results: _RawHostToResult = {}
         futures: Dict[str, concurrent.futures.Future] = {}
 
@@ -493,17 +876,27 @@ class RawExecutor:
             except Exception as e:
                 results[host] = e
 
+        pipeline: Optional[_HostPipeline] = getattr(self._inline, 'pipeline', None)
+        inline = pipeline is not None
+        parsers: Dict[str, _BatchOutputParser] = {}
         for host, payloads in batch.items():
-            cxn = self.connection_pool.get_connection(host)
-            do_type, args, kwargs = self._prepare_merged_action(host, payloads)
-            safe_exec(futures, host, lambda: tpe.submit(getattr(cxn, do_type), *args, **kwargs))
+            parsers[host] = _BatchOutputParser(self._command_separator, host, payloads)
+            if pipeline is not None and not pipeline.set_in_flight(payloads, parsers[host]):
+                # The action is already timed out by the pipelined flush, and its results are already assigned.
+                results[host] = concurrent.futures.TimeoutError()
+                continue
+            merged_action = self._prepare_merged_action(host, payloads, parsers[host])
+            if inline:
+                safe_exec(results, host, merged_action)
+            else:
+                safe_exec(futures, host, lambda: self.worker_pool.submit(merged_action))
 
         for host, future in futures.items():
             safe_exec(results, host, lambda: future.result(timeout=self.timeout))
 
         self._flush_logger_writers(batch)
 
-        return self._reparse_results(results, batch)
+        return self._reparse_results(results, batch, parsers)
 
     def _get_remained_batch(self, batch: Dict[str, List[_PayloadItem]],
                             batch_results: Dict[str, TokenizedResult]) -> Dict[str, List[_PayloadItem]]:
@@ -523,7 +916,7 @@ class RawExecutor:
         return remained_batch
 
     def _try_workaround(self, batch: Dict[str, List[_PayloadItem]],
-                        batch_results: Dict[str, TokenizedResult], tpe: ThreadPoolExecutor) -> bool:
+                        batch_results: Dict[str, TokenizedResult]) -> bool:
         not_booted = []
 
         for host in batch:
@@ -552,7 +945,7 @@ class RawExecutor:
                 return False
 
         if not_booted:
-            results = self._wait_for_boot_with_executor(not_booted, tpe)
+            results = self._wait_for_boot(not_booted)
             # if there are not booted nodes, but we succeeded to wait for at least one is booted,
             # we can continue execution
             if all(isinstance(result, Exception) for result in results.values()):
@@ -562,12 +955,10 @@ class RawExecutor:
 
     def wait_for_boot(self, left_nodes: List[str], timeout: int = None,
                       initial_boot_history: Mapping[str, RunnersResult] = None) -> HostToResult:
-        with ThreadPoolExecutor(max_workers=len(left_nodes)) as TPE:
-            return self._wait_for_boot_with_executor(left_nodes, TPE, timeout, initial_boot_history)
+        return self._wait_for_boot(left_nodes, timeout, initial_boot_history)
 
-    def _wait_for_boot_with_executor(self, left_nodes: List[str], tpe: ThreadPoolExecutor,
-                                     timeout: int = None,
-                                     initial_boot_history: Mapping[str, RunnersResult] = None) -> HostToResult:
+    def _wait_for_boot(self, left_nodes: List[str], timeout: int = None,
+                       initial_boot_history: Mapping[str, RunnersResult] = None) -> HostToResult:
 
         boot_config = self._get_boot_config()
         if timeout is None:
@@ -591,7 +982,7 @@ class RawExecutor:
 
             self.logger.verbose("Attempting to connect to nodes...")
             # this should be invoked without explicit timeout, and relied on fabric Connection timeout instead.
-            results.update(self._do_nopasswd(left_nodes, tpe, "last reboot"))
+            results.update(self._do_nopasswd(left_nodes, "last reboot"))
             left_nodes = [host for host, result in results.items()
                           if (isinstance(result, Exception)
                               # Something is wrong with sudo access. Node is active.
@@ -628,7 +1019,7 @@ class RawExecutor:
         boot_config.update(static.GLOBALS['nodes']['boot'])
         return boot_config
 
-    def _do_nopasswd(self, left_nodes: List[str], tpe: ThreadPoolExecutor, command: str) -> HostToResult:
+    def _do_nopasswd(self, left_nodes: List[str], command: str) -> HostToResult:
         prompt = '[sudo] password: '
 
         class NoPasswdResponder(invoke.Responder):
@@ -652,7 +1043,7 @@ class RawExecutor:
                            {"hide": True, "watchers": [NoPasswdResponder()]})
         payload: _PayloadItem = (action, None, token)
         batch = {host: [payload] for host in left_nodes}
-        parsed_results = self._do_batch(batch, tpe)
+        parsed_results = self._do_batch(batch)
         return {host: next(iter(results.values())) for host, results in parsed_results.items()}
 
     @staticmethod
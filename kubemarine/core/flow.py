@@ -13,15 +13,17 @@
 # limitations under the License.
 
 import argparse
+import concurrent.futures
 import os
 import shlex
 import sys
+import threading
 import time
 from abc import abstractmethod, ABC
 from copy import deepcopy
-from typing import Type, Optional, List, Union, Sequence
+from typing import Type, Optional, List, Union, Sequence, Callable, Tuple, Dict
 
-from kubemarine.core import utils, cluster as c, action, resources as res, errors, summary, log
+from kubemarine.core import utils, cluster as c, action, resources as res, errors, summary, log, tracing
 
 DEFAULT_CLUSTER_OBJ: Optional[Type[c.KubernetesCluster]] = None
 TASK_DESCRIPTION_TEMPLATE = """
@@ -31,6 +33,24 @@ tasks list:
 
 END_OF_TASKS = object()
 
+# Guards modifications of the flow state in the cluster context by the concurrently running tasks.
+_flow_lock = threading.RLock()
+
+
+class ConcurrentTask:
+    """
+    Declares that the task, or all tasks of the group, can be run concurrently with the neighbouring concurrent tasks.
+    Tasks that are not declared as concurrent are always run exclusively.
+
+    :param after: names of tasks or groups of tasks that should be finished before the task is started
+    :param locks: names of resources that are exclusively used by the task, for example, 'package_manager'.
+                  Tasks that use the same resource are not run concurrently.
+    """
+
+    def __init__(self, after: Sequence[str] = (), locks: Sequence[str] = ()):
+        self.after = list(after)
+        self.locks = set(locks)
+
 
 class FlowResult:
     def __init__(self, context: dict, logger: log.EnhancedLogger):
@@ -55,7 +75,12 @@ class Flow(ABC):
                 utils.prepare_dump_directory(args.get('dump_location'),
                                              reset_directory=not args.get('disable_dump_cleanup', False))
             resources.logger()
-            self._run(resources)
+            if args.get('trace', False):
+                tracing.start()
+            try:
+                self._run(resources)
+            finally:
+                _report_trace(resources)
         except Exception as exc:
             logger = resources.logger_if_initialized()
             if isinstance(exc, errors.FailException):
@@ -80,6 +105,12 @@ class Flow(ABC):
         pass
 
 
+def _report_trace(resources: res.DynamicResources) -> None:
+    tracer = tracing.stop()
+    if tracer is not None:
+        tracing.report(resources.context, tracer, resources.logger_if_initialized())
+
+
 class ActionsFlow(Flow):
     def __init__(self, actions: List[action.Action]):
         self._actions = actions
@@ -164,9 +195,12 @@ def _post_process_actions_group(last_cluster: Optional[c.KubernetesCluster], con
                 "The option will be removed in next release.")
 
 
-def run_tasks(resources: res.DynamicResources, tasks, cumulative_points=None, tasks_filter: list = None):
+def run_tasks(resources: res.DynamicResources, tasks, cumulative_points=None, tasks_filter: list = None,
+              concurrent_tasks: Dict[str, ConcurrentTask] = None):
     """
     Filters and runs tasks.
+
+    :param concurrent_tasks: tasks or groups of tasks that can be run concurrently.
     """
 
     if cumulative_points is None:
@@ -191,7 +225,7 @@ def run_tasks(resources: res.DynamicResources, tasks, cumulative_points=None, ta
         return
 
     init_tasks_flow(cluster)
-    run_tasks_recursive(tasks, final_list, cluster, cumulative_points, [])
+    run_tasks_recursive(tasks, final_list, cluster, cumulative_points, [], concurrent_tasks=concurrent_tasks)
     proceed_cumulative_point(cluster, cumulative_points, END_OF_TASKS,
                              force=args.get('force_cumulative_points', False))
 
@@ -283,7 +317,20 @@ def _filter_flow_internal(tasks, tasks_filter: List[List[str]], excluded_tasks:
 
 
 def run_tasks_recursive(tasks: dict, final_task_names: List[str], cluster: c.KubernetesCluster,
-                        cumulative_points: dict, _task_path: List[str]):
+                        cumulative_points: dict, _task_path: List[str],
+                        concurrent_tasks: Dict[str, ConcurrentTask] = None):
+    steps = _plan_tasks(tasks, final_task_names, cluster, _task_path)
+    scheduler = _TasksScheduler(cluster, cumulative_points, concurrent_tasks or {})
+    scheduler.run(steps)
+
+
+def _plan_tasks(tasks: dict, final_task_names: List[str], cluster: c.KubernetesCluster,
+                _task_path: List[str]) -> List[Tuple[str, Optional[Callable], bool]]:
+    """
+    Returns flat list of all tasks and groups of tasks in order of their execution.
+    Each item consists of the task name, the task callable if it should be run, and the flag to force cumulative points.
+    """
+    steps: List[Tuple[str, Optional[Callable], bool]] = []
     for task_name, task in tasks.items():
         __task_path = _task_path + [task_name]
         __task_name = ".".join(__task_path)
@@ -292,22 +339,116 @@ def run_tasks_recursive(tasks: dict, final_task_names: List[str], cluster: c.Kub
         args = cluster.context['execution_arguments']
         # --force-cumulative-points forcibly run the point only if the related task is going to be executed
         force_cumulative_point = run and args.get('force_cumulative_points', False)
-        proceed_cumulative_point(cluster, cumulative_points, __task_name, force=force_cumulative_point)
 
         if callable(task):
-            if not run:
-                continue
-            cluster.log.info("*** TASK %s ***" % __task_name)
-            try:
-                task(cluster)
-                add_task_to_proceeded_list(cluster, __task_name)
-            except Exception as exc:
-                raise errors.FailException(
-                    "TASK FAILED %s" % __task_name, exc,
-                    hint=cluster.globals['error_handling']['failure_message'] % (sys.argv[0], __task_name)
-                )
+            steps.append((__task_name, task if run else None, force_cumulative_point))
         else:
-            run_tasks_recursive(task, final_task_names, cluster, cumulative_points, __task_path)
+            steps.append((__task_name, None, force_cumulative_point))
+            steps.extend(_plan_tasks(task, final_task_names, cluster, __task_path))
+
+    return steps
+
+
+class _TasksScheduler:
+    """
+    Runs the tasks in the specified order.
+    The tasks that are declared as concurrent are started without waiting for the previous concurrent tasks,
+    if they do not depend on the running tasks and do not use the same resources.
+    Cumulative points and not concurrent tasks wait for all the running tasks.
+    """
+
+    def __init__(self, cluster: c.KubernetesCluster, cumulative_points: dict,
+                 concurrent_tasks: Dict[str, ConcurrentTask]):
+        self.cluster = cluster
+        self.cumulative_points = cumulative_points
+        self.concurrent_tasks = concurrent_tasks
+        self.max_parallel_tasks: int = cluster.globals['flow']['max_parallel_tasks']
+        self._running: Dict[concurrent.futures.Future, Tuple[str, ConcurrentTask]] = {}
+        self._failure: Optional[BaseException] = None
+
+    def run(self, steps: List[Tuple[str, Optional[Callable], bool]]) -> None:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_parallel_tasks,
+                                                   thread_name_prefix='task') as pool:
+            try:
+                for task_name, task, force_cumulative_point in steps:
+                    if any(task_name in points_tasks_names for points_tasks_names in self.cumulative_points.values()):
+                        self._wait_all()
+                    proceed_cumulative_point(self.cluster, self.cumulative_points, task_name,
+                                             force=force_cumulative_point)
+
+                    if task is None:
+                        continue
+
+                    spec = self._get_spec(task_name)
+                    if spec is None or self.max_parallel_tasks <= 1:
+                        self._wait_all()
+                        _run_task(self.cluster, task_name, task)
+                    else:
+                        self._wait_startable(spec)
+                        self._running[pool.submit(_run_task, self.cluster, task_name, task)] = (task_name, spec)
+            finally:
+                self._wait_all(raise_failure=False)
+
+        self._raise_failure()
+
+    def _get_spec(self, task_name: str) -> Optional[ConcurrentTask]:
+        task_path = task_name.split('.')
+        for i in range(len(task_path), 0, -1):
+            spec = self.concurrent_tasks.get('.'.join(task_path[:i]))
+            if spec is not None:
+                return spec
+
+        return None
+
+    def _is_blocked_by(self, spec: ConcurrentTask, running_name: str, running_spec: ConcurrentTask) -> bool:
+        if spec.locks & running_spec.locks:
+            return True
+
+        return any(running_name == after or running_name.startswith(after + '.') for after in spec.after)
+
+    def _wait_startable(self, spec: ConcurrentTask) -> None:
+        while True:
+            self._raise_failure()
+            if len(self._running) < self.max_parallel_tasks \
+                    and not any(self._is_blocked_by(spec, name, running_spec)
+                                for name, running_spec in self._running.values()):
+                return
+
+            self._wait(concurrent.futures.FIRST_COMPLETED)
+
+    def _wait_all(self, raise_failure: bool = True) -> None:
+        while self._running:
+            self._wait(concurrent.futures.ALL_COMPLETED)
+
+        if raise_failure:
+            self._raise_failure()
+
+    def _wait(self, return_when: str) -> None:
+        done, _ = concurrent.futures.wait(list(self._running), return_when=return_when)
+        for future in done:
+            del self._running[future]
+            exception = future.exception()
+            if exception is not None and self._failure is None:
+                self._failure = exception
+
+    def _raise_failure(self) -> None:
+        if self._failure is not None:
+            # Wait for the tasks that are already started.
+            self._wait_all(raise_failure=False)
+            raise self._failure
+
+
+def _run_task(cluster: c.KubernetesCluster, task_name: str, task: Callable) -> None:
+    cluster.log.info("*** TASK %s ***" % task_name)
+    try:
+        with tracing.span(tracing.TASK, task_name):
+            task(cluster)
+        add_task_to_proceeded_list(cluster, task_name)
+    except Exception as exc:
+        raise errors.FailException(
+            "TASK FAILED %s" % task_name, exc,
+            hint=cluster.globals['error_handling']['failure_message'] % (sys.argv[0], task_name)
+        )
 
 
 def new_common_parser(cli_help: str) -> argparse.ArgumentParser:
@@ -335,6 +476,15 @@ def new_common_parser(cli_help: str) -> argparse.ArgumentParser:
                         action='store_true',
                         help='prevent dump directory cleaning on process launch')
 
+    parser.add_argument('--disable-enrichment-cache',
+                        action='store_true',
+                        help='prevent loading of the compiled inventory from the cache near the dump directory')
+
+    parser.add_argument('--nodes-facts-cache',
+                        action='store_true',
+                        help='reuse the detected nodes context from the cache near the dump directory '
+                             'if it is not expired and the nodes are not rebooted')
+
     parser.add_argument('--log',
                         action='append',
                         nargs='*',
@@ -344,6 +494,11 @@ def new_common_parser(cli_help: str) -> argparse.ArgumentParser:
                         default='',
                         help='Custom path of the workdir')
 
+    parser.add_argument('--trace',
+                        action='store_true',
+                        help='collect timings of tasks and remote commands, dump them to trace.json '
+                             'and print the slowest tasks and hosts')
+
     # TODO remove in next release
     parser.add_argument('--ignore-schema-errors',
                         action='store_true',
@@ -422,14 +577,15 @@ def schedule_cumulative_point(cluster: c.KubernetesCluster, point_method) -> Non
         cluster.log.verbose('Method %s not scheduled - it set to be excluded' % point_fullname)
         return
 
-    scheduled_points = cluster.context.get('scheduled_cumulative_points', [])
+    with _flow_lock:
+        scheduled_points = cluster.context.get('scheduled_cumulative_points', [])
 
-    if point_method not in scheduled_points:
-        scheduled_points.append(point_method)
-        cluster.context['scheduled_cumulative_points'] = scheduled_points
-        cluster.log.verbose('Method %s scheduled' % point_fullname)
-    else:
-        cluster.log.verbose('Method %s already scheduled' % point_fullname)
+        if point_method not in scheduled_points:
+            scheduled_points.append(point_method)
+            cluster.context['scheduled_cumulative_points'] = scheduled_points
+            cluster.log.verbose('Method %s scheduled' % point_fullname)
+        else:
+            cluster.log.verbose('Method %s already scheduled' % point_fullname)
 
 
 def proceed_cumulative_point(cluster: c.KubernetesCluster, points_list: dict,
@@ -468,9 +624,10 @@ def init_tasks_flow(cluster: c.KubernetesCluster):
 
 
 def add_task_to_proceeded_list(cluster: c.KubernetesCluster, task_path: str):
-    if not is_task_completed(cluster, task_path):
-        cluster.context['proceeded_tasks'].append(task_path)
-        utils.dump_file(cluster, "\n".join(cluster.context['proceeded_tasks'])+"\n", 'finished_tasks')
+    with _flow_lock:
+        if not is_task_completed(cluster, task_path):
+            cluster.context['proceeded_tasks'].append(task_path)
+            utils.dump_file(cluster, "\n".join(cluster.context['proceeded_tasks'])+"\n", 'finished_tasks')
 
 
 def is_task_completed(cluster: c.KubernetesCluster, task_path: str) -> bool:
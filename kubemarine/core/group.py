@@ -14,17 +14,20 @@
 
 from __future__ import annotations
 
+import hashlib
 import io
 import os
 import random
+import tarfile
 import uuid
 from abc import ABC, abstractmethod
 from types import FunctionType
 from typing import (
-    Callable, Dict, List, Union, Any, TypeVar, Mapping, Iterator, Optional, Iterable, Generic, Set, cast
+    Callable, Dict, List, Union, Any, TypeVar, Mapping, Iterator, Optional, Iterable, Generic, Set, Tuple, cast
 )
 
 from kubemarine.core import utils, log, errors
+from kubemarine.core.connections import OutputConsumer
 from kubemarine.core.executor import (
     RawExecutor, Token, GenericResult, RunnersResult, HostToResult, Callback, TokenizedResult,
 )
@@ -300,24 +303,24 @@ class AbstractGroup(Generic[GROUP_RUN_TYPE], ABC):
     def run(self, command: str,
             warn: bool = False, hide: bool = True,
             env: Dict[str, str] = None, timeout: int = None,
-            callback: Callback = None) -> GROUP_RUN_TYPE:
+            callback: Callback = None, watchers: List[OutputConsumer] = None) -> GROUP_RUN_TYPE:
         caller: Optional[Dict[str, object]] = None
         if not hide:
             # fetching of the caller info should be at the earliest point
             caller = log.caller_info(self.cluster.log)
         return self._run("run", command, caller,
-                         warn=warn, hide=hide, env=env, timeout=timeout, callback=callback)
+                         warn=warn, hide=hide, env=env, timeout=timeout, callback=callback, watchers=watchers)
 
     def sudo(self, command: str,
              warn: bool = False, hide: bool = True,
              env: Dict[str, str] = None, timeout: int = None,
-             callback: Callback = None) -> GROUP_RUN_TYPE:
+             callback: Callback = None, watchers: List[OutputConsumer] = None) -> GROUP_RUN_TYPE:
         caller: Optional[Dict[str, object]] = None
         if not hide:
             # fetching of the caller info should be at the earliest point
             caller = log.caller_info(self.cluster.log)
         return self._run("sudo", command, caller,
-                         warn=warn, hide=hide, env=env, timeout=timeout, callback=callback)
+                         warn=warn, hide=hide, env=env, timeout=timeout, callback=callback, watchers=watchers)
 
     @abstractmethod
     def _run(self, do_type: str, command: str, caller: Optional[Dict[str, object]],
@@ -401,7 +404,11 @@ class AbstractGroup(Generic[GROUP_RUN_TYPE], ABC):
             return
 
         self.cluster.log.verbose("Moving temporary file '%s' to '%s'..." % (temp_filepath, remote_file))
+        self.sudo(self._get_mv_command(temp_filepath, remote_file, backup, sudo, mkdir, immutable))
 
+    @staticmethod
+    def _get_mv_command(temp_filepath: str, remote_file: str,
+                        backup: bool, sudo: bool, mkdir: bool, immutable: bool) -> str:
         if sudo:
             mv_command = "sudo chown root:root %s && sudo mv -f %s %s" % (temp_filepath, temp_filepath, remote_file)
         else:
@@ -430,7 +437,81 @@ class AbstractGroup(Generic[GROUP_RUN_TYPE], ABC):
             else:
                 mv_command = "chattr -i %s; %s; chattr +i %s" % (remote_file, mv_command, remote_file)
 
-        self.sudo(mv_command)
+        return mv_command
+
+    def sync_files(self, files: Mapping[Union[io.StringIO, str], str],
+                   backup: bool = False, sudo: bool = False,
+                   mkdir: bool = False, immutable: bool = False) -> None:
+        """
+        Uploads many files at once with the same semantics of `backup`, `sudo`, `mkdir`, and `immutable` as `put`.
+        Hashes of all the remote files are fetched by one command.
+        Only the changed files are uploaded in a single tar archive per node,
+        and are moved to their places using sudo as in `put`, with all the moves merged into one remote call.
+
+        :param files: mapping of local files or text to the remote file paths
+        """
+        if not files:
+            return
+
+        self.cluster.log.verbose("Files %s are being synchronized on nodes %s" % (list(files.values()), list(self.nodes)))
+
+        contents: List[bytes] = []
+        for local_file in files:
+            if isinstance(local_file, io.StringIO):
+                contents.append(local_file.getvalue().encode('utf-8'))
+            else:
+                if not os.path.isfile(local_file):
+                    raise Exception(f"File {local_file} does not exist")
+                with open(local_file, 'rb') as f:
+                    contents.append(f.read())
+
+        remote_files = list(files.values())
+        local_hashes = [hashlib.sha1(content).hexdigest() for content in contents]
+
+        eager_group = self.cluster.make_group(self.nodes)
+        results = eager_group.sudo("sha1sum %s 2>/dev/null || true" % ' '.join(remote_files))
+
+        hosts_to_upload: Dict[Tuple[int, ...], List[str]] = {}
+        for host, result in results.items():
+            remote_hashes = {}
+            for line in result.stdout.splitlines():
+                remote_hash, _, remote_file = line.partition('  ')
+                remote_hashes[remote_file] = remote_hash
+
+            changed = tuple(i for i, remote_file in enumerate(remote_files)
+                            if remote_hashes.get(remote_file) != local_hashes[i])
+            if changed:
+                self.cluster.log.verbose('Files %s are changed on node \'%s\''
+                                         % ([remote_files[i] for i in changed], host))
+                hosts_to_upload.setdefault(changed, []).append(host)
+
+        if not hosts_to_upload:
+            self.cluster.log.verbose('Local and remote hashes are equal on all nodes, no transmission required')
+            return
+
+        for changed, hosts in hosts_to_upload.items():
+            temp_dirpath = "/tmp/%s" % uuid.uuid4().hex
+            archive = io.BytesIO()
+            with tarfile.open(fileobj=archive, mode='w') as tar:
+                for i in changed:
+                    tarinfo = tarfile.TarInfo(str(i))
+                    tarinfo.size = len(contents[i])
+                    tarinfo.mode = 0o644
+                    tar.addfile(tarinfo, io.BytesIO(contents[i]))
+
+            moves = [(f"{temp_dirpath}/{i}", remote_files[i]) for i in changed]
+            self._make_group(hosts)._put_and_move_archive(archive, temp_dirpath, moves,
+                                                          backup, sudo, mkdir, immutable)
+
+    def _put_and_move_archive(self, archive: io.BytesIO, temp_dirpath: str, moves: List[Tuple[str, str]],
+                              backup: bool, sudo: bool, mkdir: bool, immutable: bool) -> None:
+        self._put(archive, temp_dirpath + '.tar')
+        self.run(f"mkdir -p {temp_dirpath} && tar -xf {temp_dirpath}.tar -C {temp_dirpath} "
+                 f"&& rm -f {temp_dirpath}.tar")
+        # Each file is moved by the same command as in put(). Consecutive commands are merged by the executor.
+        for temp_filepath, remote_file in moves:
+            self.sudo(self._get_mv_command(temp_filepath, remote_file, backup, sudo, mkdir, immutable))
+        self.sudo(f"rm -rf {temp_dirpath}")
 
     @abstractmethod
     def _put(self, local_stream: Union[io.BytesIO, str], remote_file: str) -> None:
@@ -647,8 +728,8 @@ class NodeGroup(AbstractGroup[RunnersGroupResult]):
     def new_defer(self, timeout: int = None) -> DeferredGroup:
         return self.new_executor(timeout).group
 
-    def new_executor(self, timeout: int = None) -> RemoteExecutor:
-        return RemoteExecutor(self, timeout=timeout)
+    def new_executor(self, timeout: int = None, pipelined: bool = None) -> RemoteExecutor:
+        return RemoteExecutor(self, timeout=timeout, pipelined=pipelined)
 
     def get(self, remote_file: str, local_file: str) -> None:
         self._do_exec("get", remote_file, local_file)
@@ -656,6 +737,11 @@ class NodeGroup(AbstractGroup[RunnersGroupResult]):
     def _put(self, local_stream: Union[io.BytesIO, str], remote_file: str) -> None:
         self._do_exec("put", local_stream, remote_file)
 
+    def _put_and_move_archive(self, archive: io.BytesIO, temp_dirpath: str, moves: List[Tuple[str, str]],
+                              backup: bool, sudo: bool, mkdir: bool, immutable: bool) -> None:
+        with self.new_executor() as exe:
+            exe.group._put_and_move_archive(archive, temp_dirpath, moves, backup, sudo, mkdir, immutable)
+
     def _run(self, do_type: str, command: str, caller: Optional[Dict[str, object]],
              **kwargs: Any) -> RunnersGroupResult:
         """
@@ -766,8 +852,8 @@ class DeferredGroup(AbstractGroup[Token]):
 
 
 class RemoteExecutor(RawExecutor):
-    def __init__(self, group: NodeGroup, timeout: int = None) -> None:
-        super().__init__(group.cluster, timeout)
+    def __init__(self, group: NodeGroup, timeout: int = None, pipelined: bool = None) -> None:
+        super().__init__(group.cluster, timeout, pipelined)
         self.group: DeferredGroup = group._make_defer(self)
         self.cluster = group.cluster
 
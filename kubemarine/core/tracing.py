@@ -0,0 +1,175 @@
+# Copyright 2021-2023 NetCracker Technology Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional, Iterator
+
+from kubemarine.core import log, utils
+
+TASK = 'task'
+FLUSH = 'flush'
+COMMAND = 'command'
+ENRICHMENT = 'enrichment'
+
+
+class Span:
+    def __init__(self, category: str, name: str, start: float, duration: float, thread: str, args: Dict[str, Any]):
+        self.category = category
+        self.name = name
+        self.start = start
+        self.duration = duration
+        self.thread = thread
+        self.args = args
+
+
+class Tracer:
+    """
+    Collects spans of the procedure execution: tasks, flushes of executors, remote commands, and enrichment functions.
+    The spans can be recorded from different threads.
+    """
+
+    def __init__(self) -> None:
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def add_span(self, category: str, name: str, start: float, duration: float, **args: Any) -> None:
+        span = Span(category, name, start, duration, threading.current_thread().name, args)
+        with self._lock:
+            self.spans.append(span)
+
+    def get_spans(self, category: str) -> List[Span]:
+        with self._lock:
+            return [span for span in self.spans if span.category == category]
+
+    def to_chrome_trace(self) -> dict:
+        """
+        Represents the spans in Chrome Trace Event Format, that can be opened in chrome://tracing or Perfetto UI.
+        """
+        with self._lock:
+            spans = list(self.spans)
+
+        thread_ids: Dict[str, int] = {}
+        events = []
+        for span in spans:
+            tid = thread_ids.setdefault(span.thread, len(thread_ids) + 1)
+            events.append({
+                'name': span.name,
+                'cat': span.category,
+                'ph': 'X',
+                'ts': int(span.start * 1000000),
+                'dur': int(span.duration * 1000000),
+                'pid': 1,
+                'tid': tid,
+                'args': span.args,
+            })
+
+        for thread, tid in thread_ids.items():
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': tid, 'args': {'name': thread}})
+
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def make_summary(self, top: int) -> List[str]:
+        """
+        Returns lines of the summary table with the slowest tasks and hosts.
+
+        :param top: number of the slowest tasks and hosts to show
+        """
+        lines = []
+
+        tasks = sorted(self.get_spans(TASK), key=lambda s: s.duration, reverse=True)[:top]
+        if tasks:
+            lines.append('Slowest tasks:')
+            max_length = max(len(span.name) for span in tasks)
+            for span in tasks:
+                lines.append('  %s  %8.2fs' % (span.name.ljust(max_length), span.duration))
+
+        hosts: Dict[str, Dict[str, float]] = {}
+        for span in self.get_spans(COMMAND):
+            host_stats = hosts.setdefault(span.args['host'], {'commands': 0, 'queue': 0, 'connect': 0, 'exec': 0})
+            host_stats['commands'] += 1
+            host_stats['queue'] += span.args['queue_time']
+            host_stats['connect'] += span.args['connect_time']
+            host_stats['exec'] += span.args['exec_time']
+
+        slowest_hosts = sorted(hosts.items(), key=lambda item: item[1]['exec'], reverse=True)[:top]
+        if slowest_hosts:
+            lines.append('Slowest hosts:')
+            max_length = max(len(host) for host, _ in slowest_hosts)
+            lines.append('  %s  %8s  %8s  %8s  %8s' % ('HOST'.ljust(max_length), 'COMMANDS', 'QUEUE', 'CONNECT', 'EXEC'))
+            for host, stats in slowest_hosts:
+                lines.append('  %s  %8d  %7.2fs  %7.2fs  %7.2fs' % (host.ljust(max_length), stats['commands'],
+                                                                  stats['queue'], stats['connect'], stats['exec']))
+
+        return lines
+
+
+TRACER: Optional[Tracer] = None
+"""Tracer of the currently running procedure, or None if tracing is disabled."""
+
+
+def start() -> Tracer:
+    global TRACER
+    TRACER = Tracer()
+    return TRACER
+
+
+def stop() -> Optional[Tracer]:
+    global TRACER
+    tracer = TRACER
+    TRACER = None
+    return tracer
+
+
+def enabled() -> bool:
+    return TRACER is not None
+
+
+@contextmanager
+def span(category: str, name: str, **args: Any) -> Iterator[Dict[str, Any]]:
+    """
+    Records span of the code executed within the context.
+    The yielded dictionary can be used to add arguments to the span.
+    """
+    tracer = TRACER
+    if tracer is None:
+        yield args
+        return
+
+    start_time = time.time()
+    try:
+        yield args
+    finally:
+        tracer.add_span(category, name, start_time, time.time() - start_time, **args)
+
+
+def add_span(category: str, name: str, start: float, duration: float, **args: Any) -> None:
+    tracer = TRACER
+    if tracer is not None:
+        tracer.add_span(category, name, start, duration, **args)
+
+
+def report(context: dict, tracer: Tracer, logger: Optional[log.EnhancedLogger], top: int = 10) -> None:
+    """
+    Dumps the collected trace to the dump directory and prints the summary of the slowest tasks and hosts.
+    """
+    utils.dump_file(context, json.dumps(tracer.to_chrome_trace()), 'trace.json')
+
+    lines = tracer.make_summary(top)
+    if lines and logger is not None:
+        logger.info('')
+        for line in lines:
+            logger.info(line)
@@ -229,6 +229,10 @@ def get_dump_filepath(context, filename):
     return get_external_resource_path(os.path.join(context['execution_arguments']['dump_location'], 'dump', filename))
 
 
+def get_cache_dirpath(context: dict, name: str) -> str:
+    return get_external_resource_path(os.path.join(context['execution_arguments']['dump_location'], 'cache', name))
+
+
 def wait_command_successful(g, command, retries=15, timeout=5, warn=True, hide=False):
     from kubemarine.core.group import NodeGroup
     group: NodeGroup = g
@@ -21,7 +21,7 @@ import threading
 import time
 from abc import ABC
 from copy import deepcopy
-from typing import List, Dict, Union, Any, Optional, Mapping, Iterable, IO
+from typing import List, Dict, Union, Any, Optional, Mapping, Iterable, IO, Callable
 
 import fabric  # type: ignore[import]
 import invoke
@@ -38,6 +38,7 @@ from kubemarine.core.group import (
 from kubemarine.core.resources import DynamicResources
 
 _ShellResult = Dict[str, Any]
+_ShellHandler = Callable[[str, str], Optional[GenericResult]]
 _ROLE_SPEC = Union[int, List[str]]
 
 
@@ -45,11 +46,15 @@ class FakeShell:
     def __init__(self):
         self.results: Dict[str, List[_ShellResult]] = {}
         self.history: Dict[str, List[_ShellResult]] = {}
+        self.handlers: Dict[str, List[_ShellHandler]] = {}
+        self.handled: Dict[str, List[str]] = {}
         self._lock = threading.Lock()
 
     def reset(self):
         self.results = {}
         self.history = {}
+        self.handlers = {}
+        self.handled = {}
 
     def add(self, results: Mapping[str, GenericResult], do_type, args, usage_limit=0):
         args.sort()
@@ -85,7 +90,31 @@ class FakeShell:
                         if item['usage_limit'] < 1:
                             del results[i]
                     return item['result']
-            return None
+
+            handlers = list(self.handlers.get(do_type, []))
+
+        # Handlers are called without lock, as they may wait for other commands.
+        for handler in handlers:
+            result = handler(host, args[0])
+            if result is not None:
+                with self._lock:
+                    self.handled.setdefault(host, []).append(args[0])
+                return result
+
+        return None
+
+    def add_handler(self, do_type: str, handler: _ShellHandler) -> None:
+        """
+        Registers the handler of the commands, that cannot be predefined using `add`,
+        for example, if the commands contain generated temporary paths or the output depends on the command arguments.
+        The handler is called only if no predefined result is found for the command.
+
+        :param do_type: The type of commands to handle
+        :param handler: function that accepts the host and the command,
+                        and returns the result or None if the command is not handled.
+                        The handled commands are recorded to `handled` in order of their execution.
+        """
+        self.handlers.setdefault(do_type, []).append(handler)
 
     # covered by test.test_demo.TestFakeShell.test_calculate_calls
     def history_find(self, host: str, do_type, args):
@@ -259,6 +288,9 @@ class FakeConnection(fabric.connection.Connection):  # type: ignore[misc]
             return object.__setattr__(self, key, value)
         super().__setattr__(key, value)
 
+    def open(self):
+        pass
+
     def run(self, command, **kwargs) -> fabric.runners.Result:
         return self._do("run", command, **kwargs)
 
@@ -314,6 +346,8 @@ class FakeConnection(fabric.connection.Connection):  # type: ignore[misc]
                     # stop fake execution
                     break
 
+            self._stream_output(final_res, kwargs.get('watchers') or [])
+
             if prev_exited == 0 or kwargs.get('warn', False):
                 return final_res
 
@@ -326,6 +360,26 @@ class FakeConnection(fabric.connection.Connection):  # type: ignore[misc]
 
         raise Exception('Unsupported do type')
 
+    def _stream_output(self, result: fabric.runners.Result, watchers: list) -> None:
+        """
+        Emulates how StreamingRemote passes the output to the consumers.
+        """
+        consumers = [watcher for watcher in watchers if isinstance(watcher, connections.OutputConsumer)]
+        if not consumers:
+            return
+
+        binary_consumers = [consumer for consumer in consumers
+                            if isinstance(consumer, connections.BinaryOutputConsumer)]
+        for binary_consumer in binary_consumers:
+            binary_consumer.consume_bytes(result.stdout.encode('utf-8'))
+        for consumer in consumers:
+            if not binary_consumers:
+                consumer.consume(result.stdout, False)
+            consumer.consume(result.stderr, True)
+
+        if binary_consumers or any(consumer.owns_stdout for consumer in consumers):
+            result.stdout = ''
+
     def _split_command(self, do_type, command: str):
         """
         This is a reverse operation to the RemoteExecutor#_merge_actions
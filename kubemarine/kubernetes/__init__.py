@@ -12,14 +12,18 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import collections
 import io
 import math
 import os
+import re
+import threading
 import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
 from contextlib import contextmanager
 from copy import deepcopy
-from typing import List, Dict, Tuple, Iterator
+from typing import List, Dict, Tuple, Iterator, Optional, Union, cast
 
 import ruamel.yaml
 import yaml
@@ -29,9 +33,10 @@ import ipaddress
 from kubemarine import system, plugins, admission, etcd, packages
 from kubemarine.core import utils, static, summary, log, errors
 from kubemarine.core.cluster import KubernetesCluster
-from kubemarine.core.executor import Token
-from kubemarine.core.group import NodeGroup, NodeConfig, RunnersGroupResult, RunResult, AbstractGroup, DeferredGroup, \
-    CollectorCallback
+from kubemarine.core.connections import OutputConsumer
+from kubemarine.core.executor import GenericResult, RunnersResult
+from kubemarine.core.group import NodeGroup, NodeConfig, RunnersGroupResult, RunResult, AbstractGroup, \
+    GroupResultException, NodeGroupResult
 from kubemarine.core.errors import KME
 
 ERROR_DOWNGRADE='Kubernetes old version \"%s\" is greater than new one \"%s\"'
@@ -930,10 +935,21 @@ def patch_kubeadm_configmap(first_control_plane: NodeGroup, cluster: KubernetesC
     return True
 
 
-def upgrade_workers(upgrade_group: NodeGroup, cluster: KubernetesCluster, **drain_kwargs):
+def upgrade_workers(upgrade_group: NodeGroup, cluster: KubernetesCluster,
+                    batch_size: int = 1, topology_label: str = None, **drain_kwargs):
+    """
+    Upgrades workers by batches of the specified size. Workers of each batch are drained and upgraded concurrently.
+    The next batch is started only if all workers of the previous batch have the expected Kubernetes version.
+
+    :param upgrade_group: group of nodes that require upgrade
+    :param cluster: KubernetesCluster instance
+    :param batch_size: maximum number of simultaneously unavailable workers
+    :param topology_label: if specified, each batch consists only of the workers with the same value of the label
+    """
     version = cluster.inventory["services"]["kubeadm"]["kubernetesVersion"]
     first_control_plane = cluster.nodes['control-plane'].get_first_member()
 
+    workers = []
     for node in cluster.nodes['worker'].exclude_group(cluster.nodes['control-plane'])\
             .get_ordered_members_list():
         node_name = node.get_node_name()
@@ -942,35 +958,75 @@ def upgrade_workers(upgrade_group: NodeGroup, cluster: KubernetesCluster, **drai
             cluster.log.debug("Worker \"%s\" upgrade is not required" % node_name)
             continue
 
-        cluster.log.debug("Upgrading worker \"%s\"" % node_name)
+        workers.append(node)
 
-        # put control-plane patches
-        create_kubeadm_patches_for_node(cluster, node)
+    for batch in get_worker_upgrade_batches(workers, batch_size, topology_label):
+        nodes_names = [node.get_node_name() for node in batch]
+        if len(batch) == 1:
+            upgrade_worker(cluster, batch[0], **drain_kwargs)
+        else:
+            cluster.log.debug("Upgrading workers batch %s" % nodes_names)
+            with ThreadPoolExecutor(max_workers=len(batch), thread_name_prefix='upgrade') as pool:
+                futures = [pool.submit(upgrade_worker, cluster, node, **drain_kwargs) for node in batch]
+            for future in futures:
+                # Stop the rollout if any worker of the batch is failed
+                future.result()
+
+        expect_kubernetes_version(cluster, version, apply_filter=nodes_names)
+        # workers do not have system pods to wait for their start
+        for node_name in nodes_names:
+            exclude_node_from_upgrade_list(first_control_plane, node_name)
 
-        drain_cmd = prepare_drain_command(cluster, node_name, **drain_kwargs)
-        first_control_plane.sudo(drain_cmd, hide=False)
 
-        upgrade_cri_if_required(node)
+def get_worker_upgrade_batches(workers: List[NodeGroup], batch_size: int, topology_label: str = None) \
+        -> List[List[NodeGroup]]:
+    """
+    Splits the workers by batches of the specified size preserving the order of the workers.
+    If topology label is specified, the workers are grouped by the value of the label in the inventory,
+    so that each batch affects only one topology domain.
+    """
+    domains: Dict[Optional[str], List[NodeGroup]] = {}
+    for node in workers:
+        domain = node.get_config().get('labels', {}).get(topology_label) if topology_label else None
+        domains.setdefault(domain, []).append(node)
 
-        # The procedure for removing the deprecated kubelet flag for versions older than 1.27.0
-        fix_flag_kubelet(cluster, node)
+    batches = []
+    for domain_workers in domains.values():
+        for i in range(0, len(domain_workers), batch_size):
+            batches.append(domain_workers[i:i + batch_size])
 
-        # TODO: when k8s v1.21 is excluded from Kubemarine, this condition should be removed
-        # and only "else" branch remains
-        if "v1.21" in cluster.inventory["services"]["kubeadm"]["kubernetesVersion"]:
-            node.sudo(
-                "kubeadm upgrade node --certificate-renewal=true && "
-                "sudo systemctl restart kubelet")
-        else:
-            node.sudo(
-                "kubeadm upgrade node --certificate-renewal=true --patches=/etc/kubernetes/patches && "
-                "sudo systemctl restart kubelet")
+    return batches
 
-        first_control_plane.sudo("kubectl uncordon %s" % node_name, hide=False)
 
-        expect_kubernetes_version(cluster, version, apply_filter=node_name)
-        # workers do not have system pods to wait for their start
-        exclude_node_from_upgrade_list(first_control_plane, node_name)
+def upgrade_worker(cluster: KubernetesCluster, node: NodeGroup, **drain_kwargs):
+    node_name = node.get_node_name()
+    first_control_plane = cluster.nodes['control-plane'].get_first_member()
+
+    cluster.log.debug("Upgrading worker \"%s\"" % node_name)
+
+    # put control-plane patches
+    create_kubeadm_patches_for_node(cluster, node)
+
+    drain_cmd = prepare_drain_command(cluster, node_name, **drain_kwargs)
+    first_control_plane.sudo(drain_cmd, hide=False)
+
+    upgrade_cri_if_required(node)
+
+    # The procedure for removing the deprecated kubelet flag for versions older than 1.27.0
+    fix_flag_kubelet(cluster, node)
+
+    # TODO: when k8s v1.21 is excluded from Kubemarine, this condition should be removed
+    # and only "else" branch remains
+    if "v1.21" in cluster.inventory["services"]["kubeadm"]["kubernetesVersion"]:
+        node.sudo(
+            "kubeadm upgrade node --certificate-renewal=true && "
+            "sudo systemctl restart kubelet")
+    else:
+        node.sudo(
+            "kubeadm upgrade node --certificate-renewal=true --patches=/etc/kubernetes/patches && "
+            "sudo systemctl restart kubelet")
+
+    first_control_plane.sudo("kubectl uncordon %s" % node_name, hide=False)
 
 
 def prepare_drain_command(cluster: KubernetesCluster, node_name: str,
@@ -1057,7 +1113,8 @@ def verify_supported_version(target_version: str, logger: log.EnhancedLogger) ->
 
 
 def expect_kubernetes_version(cluster: KubernetesCluster, version: str,
-                              timeout=None, retries=None, node: NodeGroup = None, apply_filter: str = None):
+                              timeout=None, retries=None, node: NodeGroup = None,
+                              apply_filter: Union[str, List[str]] = None):
     if timeout is None:
         timeout = cluster.globals['nodes']['expect']['kubernetes_version']['timeout']
     if retries is None:
@@ -1072,7 +1129,9 @@ def expect_kubernetes_version(cluster: KubernetesCluster, version: str,
         node = cluster.nodes['control-plane'].get_first_member()
 
     command = 'kubectl get nodes -o=wide'
-    if apply_filter is not None:
+    if isinstance(apply_filter, list):
+        command += ' | grep -w %s' % ' '.join('-e %s' % item for item in apply_filter)
+    elif apply_filter is not None:
         command += ' | grep -w %s' % apply_filter
 
     while retries > 0:
@@ -1225,12 +1284,15 @@ def get_group_for_upgrade(cluster: KubernetesCluster, ignore_cache=False) -> Nod
     return cluster.context['upgrade_group']
 
 
-def images_grouped_prepull(group: NodeGroup, group_size: int = None):
+def images_grouped_prepull(group: NodeGroup, group_size: int = None) -> RunnersGroupResult:
     """
-    Prepull kubeadm images on group, separated on sub-groups with certain group size. Separation required to avoid high
-    load on images repository server, when using large clusters.
+    Prepull kubeadm images on group with limited number of nodes that pull images simultaneously.
+    The limit is required to avoid high load on images repository server, when using large clusters.
+    The limit is adapted to the observed pull durations and errors in the sliding window manner:
+    the next node starts to pull as soon as any node finishes.
     :param group: NodeGroup where prepull should be performed.
-    :param group_size: integer number of nodes per group. Will be automatically used from procedure_yaml or globals, if not set.
+    :param group_size: initial number of nodes that pull images simultaneously.
+    Will be automatically used from procedure_yaml or globals, if not set.
     :return: String results from all nodes in presented group.
     """
 
@@ -1250,26 +1312,148 @@ def images_grouped_prepull(group: NodeGroup, group_size: int = None):
     if nodes_amount != 0 and nodes_amount < group_size:
         group_size = nodes_amount
 
-    groups_amount = math.ceil(nodes_amount / group_size)
+    log.verbose("Nodes amount: %s\nInitial group size: %s" % (nodes_amount, group_size))
+    return PrepullScheduler(cluster, group_size).run(group.get_ordered_members_list())
 
-    log.verbose("Nodes amount: %s\nGroup size: %s\nGroups amount: %s" % (nodes_amount, group_size, groups_amount))
-    collector = CollectorCallback(cluster)
-    with group.new_executor() as exe:
-        nodes = exe.group.get_ordered_members_list()
-        for group_i in range(groups_amount):
-            log.verbose('Prepulling images for group #%s...' % group_i)
-            # RemoteExecutor used for future cases, when some nodes will require another/additional actions for prepull
-            for node_i in range(group_i*group_size, (group_i*group_size)+group_size):
-                if node_i < nodes_amount:
-                    images_prepull(nodes[node_i], collector=collector)
 
-    return collector.result
+class _PulledImagesTimer(OutputConsumer):
+    """
+    Measures time of pulling of each image by the moments when `kubeadm config images pull` reports the pulled images.
+    """
+
+    owns_stdout = False
+
+    def __init__(self) -> None:
+        self._last = time.time()
+        self._pending = ''
+        self.durations: Dict[str, float] = {}
+
+    def consume(self, data: str, stderr: bool) -> None:
+        if stderr:
+            return
+
+        lines = (self._pending + data).split('\n')
+        self._pending = lines.pop()
+        now = time.time()
+        for line in lines:
+            match = re.search(r'\[config/images] Pulled (\S+)', line)
+            if match:
+                self.durations[match.group(1)] = now - self._last
+                self._last = now
 
 
-def images_prepull(group: DeferredGroup, collector: CollectorCallback) -> Token:
+class PrepullScheduler:
+    """
+    Schedules the prepull of images on the nodes with the sliding window of simultaneously pulling nodes.
+
+    The size of the window is adapted like in TCP congestion control.
+    It grows by one after each pull that is not slower than the average pull by `globals.prepull.slowdown_factor`,
+    and is halved after each slow or failed pull. The failed pulls are retried `globals.prepull.retries` times.
+    """
+
+    def __init__(self, cluster: KubernetesCluster, initial_window: int) -> None:
+        self.cluster = cluster
+        config = cluster.globals['prepull']
+        self.window = max(1, initial_window)
+        self.max_window = max(self.window, config['max_group_size'])
+        self.slowdown_factor: float = config['slowdown_factor']
+        self.retries: int = config['retries']
+        self.average_duration: Optional[float] = None
+        self.nodes_durations: Dict[str, float] = {}
+        self.images_durations: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def run(self, nodes: List[NodeGroup]) -> RunnersGroupResult:
+        pending = collections.deque(nodes)
+        attempts: Dict[str, int] = {}
+        results: Dict[str, GenericResult] = {}
+        running: Dict[Future, NodeGroup] = {}
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_window, len(nodes))),
+                                thread_name_prefix='prepull') as pool:
+            while pending or running:
+                while pending and len(running) < self.window:
+                    node = pending.popleft()
+                    running[pool.submit(self._pull, node)] = node
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    node = running.pop(future)
+                    host = node.get_host()
+                    attempts[host] = attempts.get(host, 0) + 1
+                    try:
+                        result, duration = future.result()
+                    except Exception as e:
+                        if attempts[host] <= self.retries:
+                            self.cluster.log.verbose("Failed to prepull images on node %s, retrying: %s"
+                                                     % (node.get_node_name(), e))
+                            pending.append(node)
+                        else:
+                            results[host] = e
+                        self._shrink()
+                        continue
+
+                    results[host] = result
+                    self._adapt(duration)
+
+        self._report()
+
+        if any(isinstance(result, Exception) for result in results.values()):
+            raise GroupResultException(NodeGroupResult(self.cluster, results))
+
+        return RunnersGroupResult(self.cluster, cast(Dict[str, RunnersResult], results))
+
+    def _pull(self, node: NodeGroup) -> Tuple[RunnersResult, float]:
+        timer = _PulledImagesTimer()
+        started = time.time()
+        result = images_prepull(node, watchers=[timer])
+        duration = time.time() - started
+
+        runners_result = result[node.get_host()]
+        if not timer.durations:
+            # The output is not streamed, so the duration of the particular images is unknown.
+            timer.consume(runners_result.stdout + '\n', False)
+
+        with self._lock:
+            self.nodes_durations[node.get_node_name()] = duration
+            for image, image_duration in timer.durations.items():
+                self.images_durations.setdefault(image, []).append(image_duration)
+
+        return runners_result, duration
+
+    def _adapt(self, duration: float) -> None:
+        if self.average_duration is not None and duration > self.average_duration * self.slowdown_factor:
+            self._shrink()
+        elif self.window < self.max_window:
+            self.window += 1
+            self.cluster.log.verbose("Prepull concurrency is increased to %s" % self.window)
+
+        if self.average_duration is None:
+            self.average_duration = duration
+        else:
+            self.average_duration = 0.7 * self.average_duration + 0.3 * duration
+
+    def _shrink(self) -> None:
+        if self.window > 1:
+            self.window = max(1, self.window // 2)
+            self.cluster.log.verbose("Prepull concurrency is decreased to %s" % self.window)
+
+    def _report(self) -> None:
+        log = self.cluster.log
+        if self.nodes_durations:
+            log.verbose("Prepull time per node:\n" + '\n'.join(
+                "  %s: %.1fs" % (node_name, duration)
+                for node_name, duration in sorted(self.nodes_durations.items(), key=lambda item: -item[1])))
+        if self.images_durations:
+            log.debug("Prepull time per image (average / max):\n" + '\n'.join(
+                "  %s: %.1fs / %.1fs" % (image, sum(durations) / len(durations), max(durations))
+                for image, durations in sorted(self.images_durations.items())))
+
+
+def images_prepull(group: NodeGroup, watchers: List[OutputConsumer] = None) -> RunnersGroupResult:
     """
     Prepull kubeadm images on group.
     :param group: NodeGroup where prepull should be performed.
+    :param watchers: consumers of the output of the prepull command
     :return: NodeGroupResult from all nodes in presented group.
     """
 
@@ -1285,7 +1469,7 @@ def images_prepull(group: DeferredGroup, collector: CollectorCallback) -> Token:
     group.put(io.StringIO(config), '/etc/kubernetes/prepull-config.yaml', sudo=True)
 
     return group.sudo("kubeadm config images pull --config=/etc/kubernetes/prepull-config.yaml",
-                      callback=collector)
+                      watchers=watchers)
 
 
 def schedule_running_nodes_report(cluster: KubernetesCluster):
@@ -1391,6 +1575,7 @@ def create_kubeadm_patches_for_node(cluster: KubernetesCluster, node: NodeGroup)
 
     # read patches content from inventory and upload patch files to a node
     node_config = node.get_config()
+    patch_files: Dict[Union[io.StringIO, str], str] = {}
     for control_plane_item in cluster.inventory['services']['kubeadm_patches']:
         patched_flags = get_patched_flags_for_control_plane_item(cluster.inventory, control_plane_item, node_config)
         if patched_flags:
@@ -1401,8 +1586,11 @@ def create_kubeadm_patches_for_node(cluster: KubernetesCluster, node: NodeGroup)
 
             control_plane_patch = Template(utils.read_internal(template_filename)).render(flags=patched_flags)
             patch_file = '/etc/kubernetes/patches/' + control_plane_patch_files[control_plane_item]
-            node.put(io.StringIO(control_plane_patch + "\n"), patch_file, sudo=True)
-            node.sudo(f'chmod 644 {patch_file}')
+            patch_files[io.StringIO(control_plane_patch + "\n")] = patch_file
+
+    if patch_files:
+        node.sync_files(patch_files, sudo=True)
+        node.sudo(f"chmod 644 {' '.join(patch_files.values())}")
 
     return
 
@@ -0,0 +1,109 @@
+# Copyright 2021-2023 NetCracker Technology Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+from typing import Dict, List, Optional, Tuple
+
+from kubemarine.core.cluster import KubernetesCluster
+
+
+_SnapshotKey = Tuple[str, Optional[str], Optional[str]]
+
+
+class ClusterSnapshot:
+    """
+    Snapshot of the Kubernetes resources, that is shared between the checks of one procedure run.
+    Resources of each type are lazily fetched by one `kubectl get` request the first time they are needed,
+    either in all namespaces or in the requested namespace only, and then all the checks are served from the snapshot.
+    """
+
+    def __init__(self, cluster: KubernetesCluster) -> None:
+        self._cluster = cluster
+        self._lists: Dict[_SnapshotKey, dict] = {}
+        self._indexes: Dict[_SnapshotKey, Dict[Tuple[Optional[str], str], dict]] = {}
+
+    def get_list(self, resource: str, namespace: str = None, field_selector: str = None) -> dict:
+        """
+        Returns the list of resources of the specified type.
+        If the resources of all namespaces are already in the snapshot, they are reused for the namespace.
+
+        :param resource: resource type in the form accepted by `kubectl get`, for example, `nodes` or `daemonsets`
+        :param namespace: namespace to fetch the resources from, or None to fetch the resources of all namespaces
+        :param field_selector: selector in the form accepted by `kubectl get --field-selector`
+                               to filter the resources on the server side
+        :return: List object in the same form as returned by `kubectl get -o json`
+        """
+        key = (resource, namespace, field_selector)
+        all_namespaces_key = (resource, None, None)
+        if key not in self._lists and field_selector is None and all_namespaces_key in self._lists:
+            all_items = self._lists[all_namespaces_key]['items']
+            self._lists[key] = {'items': [item for item in all_items
+                                          if item['metadata'].get('namespace') == namespace]}
+        elif key not in self._lists:
+            scope = '-A' if namespace is None else f'-n {namespace}'
+            if field_selector is not None:
+                scope += f" --field-selector '{field_selector}'"
+            control_plane = self._cluster.nodes['control-plane'].get_final_nodes().get_any_member()
+            result = control_plane.sudo(f'kubectl get {resource} {scope} -o json')
+            self._cluster.log.verbose(f"Fetched {resource} {scope} to the cluster snapshot")
+            self._lists[key] = json.loads(result.get_simple_out())
+
+        return self._lists[key]
+
+    def get_items(self, resource: str, namespace: str = None, field_selector: str = None) -> List[dict]:
+        """
+        Returns resources of the specified type in the specified namespace, or in all namespaces.
+        """
+        items: List[dict] = self.get_list(resource, namespace, field_selector)['items']
+        return items
+
+    def get_item(self, resource: str, name: str, namespace: str = None) -> Optional[dict]:
+        """
+        Returns the resource of the specified type by its name and namespace, or None if the resource does not exist.
+        For the cluster-scoped resources, the namespace should not be specified.
+        """
+        key = (resource, namespace, None)
+        index = self._indexes.get(key)
+        if index is None:
+            items = self.get_list(resource, namespace)['items']
+            index = {(item['metadata'].get('namespace'), item['metadata']['name']): item for item in items}
+            self._indexes[key] = index
+
+        return index.get((namespace, name))
+
+    def invalidate(self, resource: str, namespace: str = None) -> None:
+        """
+        Drops the resources of the specified type from the snapshot,
+        so that they are fetched again the next time they are needed. Other resource types are kept.
+
+        :param resource: resource type to drop
+        :param namespace: namespace to drop the resources of, or None to drop the resources of all namespaces.
+                          The resources of all namespaces are dropped in both cases, as they include the namespace.
+        """
+        for cache in (self._lists, self._indexes):
+            for key in list(cache):
+                if key[0] == resource and (namespace is None or key[1] in (namespace, None)):
+                    del cache[key]
+
+
+def get_snapshot(cluster: KubernetesCluster) -> ClusterSnapshot:
+    """
+    Returns the snapshot of the Kubernetes resources, that is created once for the cluster object.
+    """
+    snapshot: Optional[ClusterSnapshot] = cluster.context.get('cluster_snapshot')
+    if snapshot is None:
+        snapshot = ClusterSnapshot(cluster)
+        cluster.context['cluster_snapshot'] = snapshot
+
+    return snapshot
@@ -16,6 +16,8 @@
 import glob
 import importlib.util
 import io
+import json
+import math
 import os
 import re
 import shutil
@@ -23,6 +25,7 @@ import ssl
 import subprocess
 import sys
 import tarfile
+import threading
 import time
 import urllib.request
 import zipfile
@@ -38,11 +41,13 @@ import yaml
 import inspect
 
 from kubemarine.core.cluster import KubernetesCluster
+from kubemarine.core.connections import OutputConsumer
 from kubemarine import jinja, thirdparties
 from kubemarine.core import utils, static, errors, os as kos
 from kubemarine.core.yaml_merger import default_merger
 from kubemarine.core.group import NodeGroup
 from kubemarine.kubernetes.daemonset import DaemonSet
+from kubemarine.kubernetes.object import KubernetesObject
 from kubemarine.kubernetes.deployment import Deployment
 from kubemarine.kubernetes.replicaset import ReplicaSet
 from kubemarine.kubernetes.statefulset import StatefulSet
@@ -204,19 +209,28 @@ def install_plugin(cluster: KubernetesCluster, plugin_name: str, installation_pr
             procedure_types()[apply_type]['apply'](cluster, configs, plugin_name)
 
 
-def expect_daemonset(cluster: KubernetesCluster,
-                     daemonsets_names: List[Union[str, Dict[str, str]]],
+_WORKLOAD_READINESS: Dict[str, Tuple[Callable[..., KubernetesObject], Callable[..., bool]]] = {
+    'daemonset': (DaemonSet, DaemonSet.is_up_to_date),
+    'replicaset': (ReplicaSet, ReplicaSet.is_available),
+    'statefulset': (StatefulSet, StatefulSet.is_updated),
+    'deployment': (Deployment, Deployment.is_actual_and_ready),
+}
+
+
+def expect_workloads(cluster: KubernetesCluster,
+                     workloads: List[KubernetesObject],
                      timeout: int = None,
                      retries: int = None,
                      node: NodeGroup = None) -> None:
     """
-    The method waits for the configuration parameters of the given DaemonSets to be applied.
+    The method waits for the configuration parameters of the given workloads to be applied.
+    The workloads can be of different kinds (DaemonSet, ReplicaSet, StatefulSet, Deployment) and in different namespaces.
+    The status of all the workloads is fetched by the single command on each retry attempt.
     :param cluster: KubernetesCluster object where method should be performed
-    :param daemonsets_names: List of DaemonSet names (or dicts with name and namespace) to be
-    expected
+    :param workloads: List of workloads to be expected
     :param timeout: Retry attempt time (seconds)
     :param retries: Number of retry attempts
-    :param node: Node where daemonsets should be detected
+    :param node: Node where workloads should be detected
     :return: None
     """
 
@@ -227,33 +241,97 @@ def expect_daemonset(cluster: KubernetesCluster,
     if retries is None:
         retries = cluster.inventory['globals']['expect']['deployments']['retries']
 
-    log.debug(f"Expecting the following DaemonSets to be up to date: {daemonsets_names}")
+    if node is None:
+        node = cluster.nodes['control-plane'].get_any_member()
+
+    workloads_names = ["%s %s/%s" % (workload.kind, workload.namespace, workload.name) for workload in workloads]
+    log.debug(f"Expecting the following workloads to be up to date: {workloads_names}")
     log.verbose("Max expectation time: %ss" % (timeout * retries))
 
-    log.debug("Waiting for DaemonSets...")
+    log.debug("Waiting for workloads...")
 
-    daemonsets = []
-    for name in daemonsets_names:
-        if isinstance(name, str):
-            daemonsets.append(DaemonSet(cluster, name=name, namespace='kube-system'))
-        elif isinstance(name, dict):
-            daemonsets.append(DaemonSet(cluster, name=name['name'], namespace=name['namespace']))
+    namespaces: Dict[str, List[str]] = {}
+    for workload in workloads:
+        namespaces.setdefault(workload.namespace, []).append(f"{workload.kind}/{workload.name}")
+
+    command = ' ; sudo '.join(f"kubectl get -n {namespace} {' '.join(resources)} --ignore-not-found -o json"
+                              for namespace, resources in namespaces.items())
 
     while retries > 0:
-        up_to_date = True
-        for daemonset in daemonsets:
-            if not daemonset.reload(control_plane=node, suppress_exceptions=True).is_up_to_date():
-                up_to_date = False
+        result = node.sudo(command, warn=True)
+        stdout = list(result.values())[0].stdout
 
-        if up_to_date:
-            cluster.log.debug("DaemonSets are up to date")
+        objects: Dict[Tuple[str, str, str], dict] = {}
+        try:
+            loaded_objects = _load_json_stream(stdout)
+        except json.JSONDecodeError as e:
+            # The output can be truncated or contain not JSON, if kubectl failed. Consider workloads as not ready.
+            log.verbose(f"Failed to parse status of workloads: {e}")
+            loaded_objects = []
+
+        for obj in loaded_objects:
+            for item in obj['items'] if obj.get('kind') == 'List' else [obj]:
+                objects[(item['kind'].lower(), item['metadata']['namespace'], item['metadata']['name'])] = item
+
+        not_ready = []
+        for workload, workload_name in zip(workloads, workloads_names):
+            workload_obj = objects.get((workload.kind, workload.namespace, workload.name))
+            workload_type, is_ready = _WORKLOAD_READINESS[workload.kind]
+            if workload_obj is None or not is_ready(workload_type(cluster, obj=workload_obj)):
+                not_ready.append(workload_name)
+
+        if not not_ready:
+            cluster.log.debug("Workloads are up to date!")
             return
         else:
             retries -= 1
-            cluster.log.debug(f"DaemonSets are not up to date yet... ({retries * timeout}s left)")
+            cluster.log.debug(f"Workloads {not_ready} are not up to date yet... ({retries * timeout}s left)")
             time.sleep(timeout)
 
-    raise Exception('In the expected time, the DaemonSets did not become ready. Try to increase number of retries in expect.daemonsets: https://github.com/Netcracker/KubeMarine/blob/main/documentation/Installation.md#expect-deploymentsdaemonsetsreplicasetsstatefulsets')
+    raise Exception('In the expected time, the workloads did not become ready. Try to increase number of retries in expect: https://github.com/Netcracker/KubeMarine/blob/main/documentation/Installation.md#expect-deploymentsdaemonsetsreplicasetsstatefulsets')
+
+
+def _load_json_stream(stdout: str) -> List[dict]:
+    decoder = json.JSONDecoder()
+    objects = []
+    stdout = stdout.strip()
+    while stdout:
+        obj, end = decoder.raw_decode(stdout)
+        objects.append(obj)
+        stdout = stdout[end:].strip()
+
+    return objects
+
+
+def _get_workloads(cluster: KubernetesCluster, kind: str, names: List[Union[str, Dict[str, str]]]) \
+        -> List[KubernetesObject]:
+    workload_type, _ = _WORKLOAD_READINESS[kind]
+    workloads = []
+    for name in names:
+        if isinstance(name, str):
+            workloads.append(workload_type(cluster, name=name, namespace='kube-system'))
+        elif isinstance(name, dict):
+            workloads.append(workload_type(cluster, name=name['name'], namespace=name['namespace']))
+
+    return workloads
+
+
+def expect_daemonset(cluster: KubernetesCluster,
+                     daemonsets_names: List[Union[str, Dict[str, str]]],
+                     timeout: int = None,
+                     retries: int = None,
+                     node: NodeGroup = None) -> None:
+    """
+    The method waits for the configuration parameters of the given DaemonSets to be applied.
+    :param cluster: KubernetesCluster object where method should be performed
+    :param daemonsets_names: List of DaemonSet names (or dicts with name and namespace) to be
+    expected
+    :param timeout: Retry attempt time (seconds)
+    :param retries: Number of retry attempts
+    :param node: Node where daemonsets should be detected
+    :return: None
+    """
+    expect_workloads(cluster, _get_workloads(cluster, 'daemonset', daemonsets_names), timeout, retries, node)
 
 
 def expect_replicaset(cluster: KubernetesCluster,
@@ -271,41 +349,7 @@ def expect_replicaset(cluster: KubernetesCluster,
     :param node: Node where replicasests should be detected
     :return: None
     """
-
-    log = cluster.log
-
-    if timeout is None:
-        timeout = cluster.inventory['globals']['expect']['deployments']['timeout']
-    if retries is None:
-        retries = cluster.inventory['globals']['expect']['deployments']['retries']
-
-    log.debug(f"Expecting the following ReplicaSets to be up to date: {replicasets_names}")
-    log.verbose("Max expectation time: %ss" % (timeout * retries))
-
-    log.debug("Waiting for ReplicaSets...")
-
-    replicasets = []
-    for name in replicasets_names:
-        if isinstance(name, str):
-            replicasets.append(ReplicaSet(cluster, name=name, namespace='kube-system'))
-        elif isinstance(name, dict):
-            replicasets.append(ReplicaSet(cluster, name=name['name'], namespace=name['namespace']))
-
-    while retries > 0:
-        up_to_date = True
-        for replicaset in replicasets:
-            if not replicaset.reload(control_plane=node, suppress_exceptions=True).is_available():
-                up_to_date = False
-
-        if up_to_date:
-            cluster.log.debug("ReplicaSets are up to date")
-            return
-        else:
-            retries -= 1
-            cluster.log.debug(f"ReplicaSets are not up to date yet... ({retries * timeout}s left)")
-            time.sleep(timeout)
-
-    raise Exception('In the expected time, the ReplicaSets did not become ready. Try to increase number of retries in expect.replicasets: https://github.com/Netcracker/KubeMarine/blob/main/documentation/Installation.md#expect-deploymentsdaemonsetsreplicasetsstatefulsets')
+    expect_workloads(cluster, _get_workloads(cluster, 'replicaset', replicasets_names), timeout, retries, node)
 
 
 def expect_statefulset(cluster: KubernetesCluster,
@@ -323,41 +367,7 @@ def expect_statefulset(cluster: KubernetesCluster,
     :param node: Node where statefulsets should be detected
     :return: None
     """
-
-    log = cluster.log
-
-    if timeout is None:
-        timeout = cluster.inventory['globals']['expect']['deployments']['timeout']
-    if retries is None:
-        retries = cluster.inventory['globals']['expect']['deployments']['retries']
-
-    log.debug(f"Expecting the following StatefulSets to be up to date: {statefulsets_names}")
-    log.verbose("Max expectation time: %ss" % (timeout * retries))
-
-    log.debug("Waiting for StatefulSets...")
-
-    statefulsets = []
-    for name in statefulsets_names:
-        if isinstance(name, str):
-            statefulsets.append(StatefulSet(cluster, name=name, namespace='kube-system'))
-        elif isinstance(name, dict):
-            statefulsets.append(StatefulSet(cluster, name=name['name'], namespace=name['namespace']))
-
-    while retries > 0:
-        up_to_date = True
-        for statefulset in statefulsets:
-            if not statefulset.reload(control_plane=node, suppress_exceptions=True).is_updated():
-                up_to_date = False
-
-        if up_to_date:
-            cluster.log.debug("StatefulSets are up to date")
-            return
-        else:
-            retries -= 1
-            cluster.log.debug(f"StatefulSets are not up to date yet... ({retries * timeout}s left)")
-            time.sleep(timeout)
-
-    raise Exception('In the expected time, the StatefulSets did not become ready. Try to increase number of retries in expect.statefulsets: https://github.com/Netcracker/KubeMarine/blob/main/documentation/Installation.md#expect-deploymentsdaemonsetsreplicasetsstatefulsets')
+    expect_workloads(cluster, _get_workloads(cluster, 'statefulset', statefulsets_names), timeout, retries, node)
 
 
 def expect_deployment(cluster: KubernetesCluster,
@@ -375,41 +385,120 @@ def expect_deployment(cluster: KubernetesCluster,
     :param node: Node where deployments should be detected
     :return: None
     """
+    expect_workloads(cluster, _get_workloads(cluster, 'deployment', deployments_names), timeout, retries, node)
 
-    log = cluster.log
-
-    if timeout is None:
-        timeout = cluster.inventory['globals']['expect']['deployments']['timeout']
-    if retries is None:
-        retries = cluster.inventory['globals']['expect']['deployments']['retries']
-
-    log.debug(f"Expecting the following Deployments to be up to date: {deployments_names}")
-    log.verbose("Max expectation time: %ss" % (timeout * retries))
 
-    log.debug("Waiting for Deployments...")
+class _PodsWatcher(OutputConsumer):
+    """
+    Consumes the stream of watch events of `kubectl get pods --watch --output-watch-events -o json`,
+    tracks the state of the requested pods, and stops as soon as the pods are ready,
+    or if the number of detected failures exceeds `globals.pods.allowed_failures`.
+    """
 
-    deployments = []
-    for name in deployments_names:
-        if isinstance(name, str):
-            deployments.append(Deployment(cluster, name=name, namespace='kube-system'))
-        elif isinstance(name, dict):
-            deployments.append(Deployment(cluster, name=name['name'], namespace=name['namespace']))
+    def __init__(self, cluster: KubernetesCluster, pods: List[str], apply_filter: str = None):
+        self._cluster = cluster
+        self._pods = pods
+        self._apply_filter = apply_filter
+        self._decoder = json.JSONDecoder()
+        self._lock = threading.Lock()
+        self._buffer = ''
+        self._states: Dict[str, dict] = {}
+        self.streamed = False
+        self.failures = 0
+        self.failed = False
+        self.ready = False
+
+    @property
+    def stopped(self) -> bool:
+        return self.ready or self.failed
+
+    def consume(self, data: str, stderr: bool) -> None:
+        if stderr:
+            return
 
-    while retries > 0:
-        up_to_date = True
-        for deployment in deployments:
-            if not deployment.reload(control_plane=node, suppress_exceptions=True).is_actual_and_ready():
-                up_to_date = False
+        with self._lock:
+            self.streamed = True
+            self._buffer += data
+            while True:
+                stripped = self._buffer.lstrip()
+                try:
+                    event, end = self._decoder.raw_decode(stripped)
+                except ValueError:
+                    # The event is not fully received yet.
+                    self._buffer = stripped
+                    break
+
+                self._buffer = stripped[end:]
+                self._handle_event(event)
+
+    def finish(self, stdout: str) -> None:
+        """
+        Consumes the output of the finished watch if it was not streamed by the runner,
+        and resets the state of the pods for the next watch.
+        """
+        if not self.streamed:
+            self.consume(stdout, False)
+
+        with self._lock:
+            self._buffer = ''
+            self._states = {}
+            self.streamed = False
+
+    def describe(self) -> str:
+        with self._lock:
+            return '\n'.join("%s: %s" % (name, 'ready' if state['ready'] else (state['critical'] or 'not ready'))
+                             for name, state in self._states.items())
+
+    def _handle_event(self, event: dict) -> None:
+        pod = event.get('object', {})
+        if self.stopped or event.get('type') not in ('ADDED', 'MODIFIED', 'DELETED') or pod.get('kind') != 'Pod':
+            return
 
-        if up_to_date:
-            cluster.log.debug("Deployments are up to date!")
+        metadata = pod['metadata']
+        if not self._is_requested(metadata['name'], pod.get('spec', {}).get('nodeName')):
             return
-        else:
-            retries -= 1
-            cluster.log.debug(f"Deployments are not up to date yet... ({retries * timeout}s left)")
-            time.sleep(timeout)
 
-    raise Exception('In the expected time, the Deployments did not become ready. Try to increase number of retries in expect.deployments: https://github.com/Netcracker/KubeMarine/blob/main/documentation/Installation.md#expect-deploymentsdaemonsetsreplicasetsstatefulsets')
+        key = "%s/%s" % (metadata['namespace'], metadata['name'])
+        if event['type'] == 'DELETED':
+            self._states.pop(key, None)
+        else:
+            status = pod.get('status', {})
+            reasons = [status['reason']] if status.get('reason') else []
+            container_statuses = status.get('containerStatuses', [])
+            for container_status in status.get('initContainerStatuses', []) + container_statuses:
+                for state in container_status.get('state', {}).values():
+                    if state.get('reason'):
+                        reasons.append(state['reason'])
+
+            critical = [reason for reason in reasons if is_critical_state_in_stdout(self._cluster, reason)]
+            previous = self._states.get(key)
+            if critical and (previous is None or previous['critical'] != critical):
+                self._cluster.log.verbose("Failed pod detected: %s %s" % (key, critical))
+                self.failures += 1
+                # just in case, skip the error a couple of times, what if it comes out of the failure state?
+                if self.failures > self._cluster.globals['pods']['allowed_failures']:
+                    self.failed = True
+                    return
+
+            ready = bool(container_statuses) and all(container_status.get('ready', False)
+                                                     for container_status in container_statuses)
+            self._states[key] = {'critical': critical, 'ready': ready}
+
+        self.ready = self._is_ready()
+
+    def _is_requested(self, name: str, node_name: str = None) -> bool:
+        if self._apply_filter is not None and self._apply_filter not in name and self._apply_filter != node_name:
+            return False
+
+        # it is necessary to look for pods with the name "xxxx-xxxx-" instead of "xxxx-xxxx"
+        # because the name of the pod is always followed by the suffix
+        return any(pod + "-" in name for pod in self._pods)
+
+    def _is_ready(self) -> bool:
+        # we have to take into account any pod in not a critical state
+        running = {key: state for key, state in self._states.items() if not state['critical']}
+        return all(any(pod + "-" in key.split('/')[1] for key in running) for pod in self._pods) \
+            and all(state['ready'] for state in running.values())
 
 
 def expect_pods(cluster: KubernetesCluster, pods: List[str], namespace=None, timeout=None, retries=None,
@@ -425,8 +514,6 @@ def expect_pods(cluster: KubernetesCluster, pods: List[str], namespace=None, tim
 
     cluster.log.debug("Waiting for pods...")
 
-    failures = 0
-
     if node is None:
         node = cluster.nodes['control-plane'].get_first_member()
 
@@ -434,62 +521,33 @@ def expect_pods(cluster: KubernetesCluster, pods: List[str], namespace=None, tim
     if namespace is not None:
         namespace_filter = "-n " + namespace
 
-    command = f"kubectl get pods {namespace_filter} -o=wide"
-    if apply_filter is not None:
-        command += ' | grep %s' % apply_filter
-
-    while retries > 0:
-
-        result = node.sudo(command, warn=True)
+    watcher = _PodsWatcher(cluster, pods, apply_filter)
+    deadline = time.time() + timeout * retries
+    while True:
+        left = math.ceil(deadline - time.time())
+        if left <= 0:
+            break
 
+        # The watch is finished as soon as the pods are ready, or by timeout.
+        command = f"timeout {left} kubectl get pods {namespace_filter} --watch --output-watch-events -o json"
+        result = node.sudo(command, warn=True, watchers=[watcher])
         stdout = list(result.values())[0].stdout
-        running_pods_stdout = ''
-
-        failure_found = False
-
-        for stdout_line in iter(stdout.splitlines()):
-
-            stdout_line_allowed = False
-
-            # is current line has requested pod for verification?
-            # we do not have to fail on pods with bad status which was not requested
-            for pod in pods:
-                if pod + "-" in stdout_line:
-                    stdout_line_allowed = True
-
-            if stdout_line_allowed:
-                if is_critical_state_in_stdout(cluster, stdout_line):
-                    cluster.log.verbose("Failed pod detected: %s\n" % stdout_line)
-
-                    if not failure_found:
-                        failure_found = True
-                        failures += 1
-
-                    # just in case, skip the error a couple of times, what if it comes out of the failure state?
-                    if failures > cluster.globals['pods']['allowed_failures']:
-                        raise Exception('Pod entered a state of error, further proceeding is impossible')
-                else:
-                # we have to take into account any pod in not a critical state
-                    running_pods_stdout += stdout_line + '\n'
+        pods_description = watcher.describe()
+        watcher.finish(stdout)
 
-        pods_ready = False
-        if running_pods_stdout and running_pods_stdout != "" and "0/1" not in running_pods_stdout:
-            pods_ready = True
-            for pod in pods:
-                # it is necessary to look for pods with the name "xxxx-xxxx-" instead of "xxxx-xxxx" because
-                # "xxxx-xxxx" may be the name of the namespace in which another healthy pod will be running
-                if pod + "-" not in running_pods_stdout:
-                    pods_ready = False
+        if watcher.failed:
+            raise Exception('Pod entered a state of error, further proceeding is impossible')
 
-        if pods_ready:
+        if watcher.ready:
             cluster.log.debug("Pods are ready!")
-            cluster.log.debug(running_pods_stdout)
+            cluster.log.debug(pods_description)
             return
-        else:
-            retries -= 1
-            cluster.log.debug("Pods are not ready yet... (%ss left)" % (retries * timeout))
-            cluster.log.debug(running_pods_stdout)
-            time.sleep(timeout)
+
+        # The watch can be interrupted if the API server is not available.
+        left = max(0, math.ceil(deadline - time.time()))
+        cluster.log.debug("Pods are not ready yet... (%ss left)" % left)
+        cluster.log.debug(pods_description)
+        time.sleep(min(timeout, left))
 
     raise Exception('In the expected time, the pods did not become ready')
 
@@ -544,31 +602,32 @@ def convert_expect(_, config: dict):
 def apply_expect(cluster: KubernetesCluster, config: dict, plugin_name=None):
     # TODO: Add support for expect services and expect nodes
 
+    # Types of resources are expected in the configured order.
+    # Consecutive workloads of different kinds with the same timeout and retries are expected together.
+    workloads: List[KubernetesObject] = []
+    workloads_timeout, workloads_retries = None, None
     for expect_type, expect_conf in config.items():
-        if expect_type == 'daemonsets':
-            expect_daemonset(cluster, config['daemonsets']['list'],
-                             timeout=config['daemonsets'].get('timeout'),
-                             retries=config['daemonsets'].get('retries'))
-
-        elif expect_type == 'replicasets':
-            expect_replicaset(cluster, config['replicasets']['list'],
-                              timeout=config['replicasets'].get('timeout'),
-                              retries=config['replicasets'].get('retries'))
-
-        elif expect_type == 'statefulsets':
-            expect_statefulset(cluster, config['statefulsets']['list'],
-                               timeout=config['statefulsets'].get('timeout'),
-                               retries=config['statefulsets'].get('retries'))
-
-        elif expect_type == 'deployments':
-            expect_deployment(cluster, config['deployments']['list'],
-                              timeout=config['deployments'].get('timeout'),
-                              retries=config['deployments'].get('retries'))
+        if expect_type in ('daemonsets', 'replicasets', 'statefulsets', 'deployments'):
+            timeout = expect_conf.get('timeout', cluster.inventory['globals']['expect']['deployments']['timeout'])
+            retries = expect_conf.get('retries', cluster.inventory['globals']['expect']['deployments']['retries'])
+            if workloads and (timeout, retries) != (workloads_timeout, workloads_retries):
+                expect_workloads(cluster, workloads, timeout=workloads_timeout, retries=workloads_retries)
+                workloads = []
+
+            workloads.extend(_get_workloads(cluster, expect_type[:-1], expect_conf['list']))
+            workloads_timeout, workloads_retries = timeout, retries
 
         elif expect_type == 'pods':
-            expect_pods(cluster, config['pods']['list'], namespace=config['pods'].get('namespace'),
-                        timeout=config['pods'].get('timeout'),
-                        retries=config['pods'].get('retries'))
+            if workloads:
+                expect_workloads(cluster, workloads, timeout=workloads_timeout, retries=workloads_retries)
+                workloads = []
+
+            expect_pods(cluster, expect_conf['list'], namespace=expect_conf.get('namespace'),
+                        timeout=expect_conf.get('timeout'),
+                        retries=expect_conf.get('retries'))
+
+    if workloads:
+        expect_workloads(cluster, workloads, timeout=workloads_timeout, retries=workloads_retries)
 
 # **** PYTHON ****
 
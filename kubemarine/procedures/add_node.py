@@ -115,7 +115,8 @@ class AddNodeAction(Action):
         super().__init__('add node', recreate_inventory=True)
 
     def run(self, res: DynamicResources):
-        flow.run_tasks(res, tasks, cumulative_points=install.cumulative_points)
+        flow.run_tasks(res, tasks, cumulative_points=install.cumulative_points,
+                       concurrent_tasks=install.concurrent_tasks)
         res.make_final_inventory()
 
 
@@ -15,22 +15,28 @@
 
 
 import datetime
+import hashlib
 import io
 import json
 import os
 import random
 import shutil
 import tarfile
+import threading
 import time
+import zlib
 from collections import OrderedDict
-from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, BinaryIO, Optional, IO, Tuple, cast
 
 import yaml
 
-from kubemarine.core import utils, flow
+from kubemarine.core import utils, flow, chunkstore
 from kubemarine.core.action import Action
 from kubemarine.core.cluster import KubernetesCluster
-from kubemarine.core.group import NodeGroup
+from kubemarine.core.connections import BinaryOutputConsumer, OutputConsumer
+from kubemarine.core.executor import GenericResult, RunnersResult
+from kubemarine.core.group import NodeGroup, NodeGroupResult, GroupResultException
 from kubemarine.core.resources import DynamicResources
 
 
@@ -79,11 +85,18 @@ def prepare_backup_tmpdir(cluster: KubernetesCluster):
 
 
 def verify_backup_location(cluster: KubernetesCluster):
+    if is_repository_format(cluster) and not cluster.procedure_inventory.get('backup_location'):
+        raise Exception('Backup location of the repository should be specified explicitly')
+
     target = utils.get_external_resource_path(cluster.procedure_inventory.get('backup_location', 'backup.tar.gz'))
     if not os.path.isdir(target) and not os.path.isdir(os.path.abspath(os.path.join(target, os.pardir))):
         raise FileNotFoundError('Backup location directory not exists')
 
 
+def is_repository_format(cluster: KubernetesCluster) -> bool:
+    return cluster.procedure_inventory.get('backup_format', 'archive') == 'repository'
+
+
 def export_ansible_inventory(cluster: KubernetesCluster):
     backup_directory = prepare_backup_tmpdir(cluster)
     shutil.copyfile(cluster.context['execution_arguments']['ansible_inventory_location'],
@@ -119,13 +132,73 @@ def export_cluster_yaml(cluster: KubernetesCluster):
     cluster.log.verbose('cluster.yaml exported to backup')
 
 
+class _ArchiveWriter(BinaryOutputConsumer):
+    """
+    Writes the archive that is streamed from the node to the local file.
+    """
+
+    def __init__(self, archive: BinaryIO) -> None:
+        self._archive = archive
+        self.written = 0
+
+    def consume_bytes(self, data: bytes) -> None:
+        self._archive.write(data)
+        self.written += len(data)
+
+    def restart(self) -> None:
+        self._archive.seek(0)
+        self._archive.truncate()
+        self.written = 0
+
+
+class _DecompressingWriter(BinaryOutputConsumer):
+    """
+    Decompresses the gzip stream from the node, writes the result to the local file, and calculates its SHA1.
+    """
+
+    def __init__(self, file: BinaryIO) -> None:
+        self._file = file
+        self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        self._sha1 = hashlib.sha1()
+        self.received = 0
+        self.written = 0
+
+    def restart(self) -> None:
+        self._file.seek(0)
+        self._file.truncate()
+        self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        self._sha1 = hashlib.sha1()
+        self.received = 0
+        self.written = 0
+
+    def consume_bytes(self, data: bytes) -> None:
+        self.received += len(data)
+        self._write(self._decompressor.decompress(data))
+
+    def finish(self) -> str:
+        """
+        :return: SHA1 of the decompressed data
+        """
+        self._write(self._decompressor.flush())
+        if not self._decompressor.eof:
+            raise Exception('Compressed stream is truncated')
+
+        return self._sha1.hexdigest()
+
+    def _write(self, data: bytes) -> None:
+        self._file.write(data)
+        self._sha1.update(data)
+        self.written += len(data)
+
+
 def export_nodes(cluster: KubernetesCluster):
     backup_directory = prepare_backup_tmpdir(cluster)
     backup_nodes_data_dir = os.path.join(backup_directory, 'nodes_data')
     os.mkdir(backup_nodes_data_dir)
 
+    backup_plan = cluster.procedure_inventory.get('backup_plan', {})
     backup_list = get_default_backup_files_list(cluster)
-    for filepath, enabled in cluster.procedure_inventory.get('backup_plan', {}).get('nodes', {}).items():
+    for filepath, enabled in backup_plan.get('nodes', {}).items():
         if not enabled and filepath in backup_list:
             backup_list.remove(filepath)
         if enabled and filepath not in backup_list:
@@ -133,23 +206,51 @@ def export_nodes(cluster: KubernetesCluster):
 
     cluster.log.debug('Backing up the following files: \n' + '  - ' + '\n  - '.join(backup_list))
 
-    backup_command = 'cd /tmp && ' \
-                     'sudo tar -czvf /tmp/kubemarine-backup.tar.gz -P $(sudo readlink -e %s) && ' \
-                     'sudo ls -la /tmp/kubemarine-backup.tar.gz && ' \
-                     'sudo du -hs /tmp/kubemarine-backup.tar.gz' % (' '.join(backup_list))
-
-    data_copy_res = cluster.nodes['all'].run(backup_command)
-
-    cluster.log.debug('Backup created:\n%s' % data_copy_res)
-
-    cluster.log.debug('Downloading nodes backups:')
-    for node in cluster.nodes['all'].get_ordered_members_list():
-        node.get('/tmp/kubemarine-backup.tar.gz',
-                 os.path.join(backup_nodes_data_dir, '%s.tar.gz' % node.get_node_name()))
-        cluster.log.debug('Backup \'%s\' downloaded' % node.get_node_name())
+    # The archive is written to stdout and is streamed directly to the deployer without temporary file on the node.
+    # The list of archived files is written to stderr.
+    # The repository compresses the content-defined chunks itself. The chunks of compressed data cannot be deduplicated,
+    # because any change shifts the compressed stream after it. That is why the archive is not compressed in this case.
+    if is_repository_format(cluster):
+        tar_flags, extension = '-cvf', 'tar'
+    else:
+        tar_flags, extension = '-czvf', 'tar.gz'
+    backup_command = 'sudo tar %s - -P $(sudo readlink -e %s)' % (tar_flags, ' '.join(backup_list))
+
+    nodes = cluster.nodes['all'].get_ordered_members_list()
+    parallelism = backup_plan.get('nodes_parallelism', cluster.globals['backup']['nodes_parallelism'])
+    cluster.log.debug('Downloading nodes backups, %s nodes at a time:' % parallelism)
+
+    results: Dict[str, GenericResult] = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(parallelism, len(nodes))), thread_name_prefix='backup') as pool:
+        futures = {node.get_host(): pool.submit(_download_node_backup, node, backup_command,
+                                                os.path.join(backup_nodes_data_dir,
+                                                             '%s.%s' % (node.get_node_name(), extension)))
+                   for node in nodes}
+        for host, future in futures.items():
+            try:
+                results[host] = future.result()
+            except GroupResultException as e:
+                results[host] = e.result[host]
+            except Exception as e:
+                results[host] = e
+
+    if any(isinstance(result, Exception) for result in results.values()):
+        raise GroupResultException(NodeGroupResult(cluster, results))
+
+
+def _download_node_backup(node: NodeGroup, backup_command: str, local_filepath: str) -> RunnersResult:
+    try:
+        with open(local_filepath, 'wb') as archive:
+            writer = _ArchiveWriter(archive)
+            result = node.run(backup_command, watchers=[writer])
+    except Exception:
+        os.remove(local_filepath)
+        raise
 
-    cluster.log.verbose('Deleting backup file from nodes...')
-    cluster.nodes['all'].sudo('rm -f /tmp/kubemarine-backup.tar.gz')
+    node_name = node.get_node_name()
+    node.cluster.log.verbose('Backup of node \'%s\' created:\n%s' % (node_name, result))
+    node.cluster.log.debug('Backup \'%s\' downloaded, %s bytes' % (node_name, writer.written))
+    return result[node.get_host()]
 
 
 def export_etcd(cluster: KubernetesCluster):
@@ -193,17 +294,33 @@ def export_etcd(cluster: KubernetesCluster):
             raise Exception('Failed to detect ETCD leader - not possible to create backup from actual DB')
 
     snap_name = 'snapshot%s.db' % int(round(time.time() * 1000))
+    snap_path = '/var/lib/etcd/' + snap_name
     endpoint_ip = etcd_node.get_config()["internal_address"]
     cluster.log.debug('Creating ETCD backup "%s"...' % snap_name)
-    result = etcd_node.sudo(f'etcdctl snapshot save /var/lib/etcd/{snap_name} --endpoints=https://{endpoint_ip}:2379 '
-                            f'&& sudo mv /var/lib/etcd/{snap_name} /tmp/{snap_name} '
-                            f'&& sudo ls -la /tmp/{snap_name} '
-                            f'&& sudo du -hs /tmp/{snap_name} '
-                            f'&& sudo chmod 666 /tmp/{snap_name}', timeout=600)
-    cluster.log.debug(result)
-    etcd_node.get('/tmp/' + snap_name, backup_directory + '/etcd.db')
-    cluster.log.verbose('Deleting ETCD snapshot file from "%s"...')
-    etcd_node.sudo('rm -f /tmp/%s' % snap_name)
+    try:
+        result = etcd_node.sudo(f'etcdctl snapshot save {snap_path} --endpoints=https://{endpoint_ip}:2379 '
+                                f'&& sudo du -hs {snap_path} '
+                                f'&& sudo sha1sum {snap_path}', timeout=600)
+        cluster.log.debug(result)
+        remote_sha1 = result.get_simple_out().strip().split('\n')[-1].split(' ')[0]
+
+        # The snapshot is compressed on the node, and is decompressed on the fly while it is streamed to the deployer.
+        cluster.log.debug('Downloading ETCD snapshot...')
+        with open(os.path.join(backup_directory, 'etcd.db'), 'wb') as snapshot:
+            writer = _DecompressingWriter(snapshot)
+            etcd_node.run(f'sudo gzip -c {snap_path}', watchers=[writer], timeout=600)
+            local_sha1 = writer.finish()
+    finally:
+        cluster.log.verbose('Deleting ETCD snapshot file from "%s"...' % etcd_node.get_node_name())
+        etcd_node.sudo(f'rm -f {snap_path}')
+
+    cluster.log.verbose('ETCD snapshot downloaded, %s bytes transferred, %s bytes written'
+                        % (writer.received, writer.written))
+    if local_sha1 != remote_sha1:
+        raise Exception(f'SHA1 hash {local_sha1} of the downloaded ETCD snapshot '
+                        f'does not match the hash {remote_sha1} of the snapshot on the node')
+
+    cluster.context['backup_descriptor']['etcd']['sha1'] = local_sha1
 
 
 def select_etcd_node(cluster: KubernetesCluster):
@@ -339,17 +456,7 @@ def export_kubernetes(cluster: KubernetesCluster):
                 raise Exception('Proposed resource "%s" not found in loaded cluster resources' % proposed_resource)
 
     cluster.log.debug(resources)
-
-    namespaced_resources_map = {}
-    total_files = 0
-
-    for namespace in namespaces:
-        namespace_dir = os.path.join(kubernetes_res_dir, namespace)
-        os.mkdir(namespace_dir)
-        actual_resources = download_resources(cluster.log, resources, namespace_dir, control_plane, namespace)
-        if actual_resources:
-            total_files += len(actual_resources)
-            namespaced_resources_map[namespace] = actual_resources
+    namespaced_resources = resources
 
     cluster.log.debug('Loading non-namespaced resources:')
     resources_result = control_plane.sudo('kubectl api-resources --verbs=list --namespaced=false -o name '
@@ -370,10 +477,26 @@ def export_kubernetes(cluster: KubernetesCluster):
                 raise Exception('Proposed resource "%s" not found in loaded cluster resources' % proposed_resource)
 
     cluster.log.debug(resources)
+    nonnamespaced_resources = resources
 
-    nonnamespaced_resources_list = download_resources(cluster.log, resources, kubernetes_res_dir, control_plane)
-    total_files += len(nonnamespaced_resources_list)
-
+    export_mode = cluster.procedure_inventory.get('backup_plan', {}).get('kubernetes', {}).get('export_mode', 'per-namespace')
+    if export_mode == 'cluster-wide':
+        namespaced_resources_map, nonnamespaced_resources_list = export_resources_cluster_wide(
+            cluster, control_plane, kubernetes_res_dir, namespaces, namespaced_resources, nonnamespaced_resources)
+    else:
+        namespaced_resources_map = {}
+        for namespace in namespaces:
+            namespace_dir = os.path.join(kubernetes_res_dir, namespace)
+            os.mkdir(namespace_dir)
+            actual_resources = download_resources(cluster.log, namespaced_resources, namespace_dir, control_plane, namespace)
+            if actual_resources:
+                namespaced_resources_map[namespace] = actual_resources
+
+        cluster.log.debug('Downloading non-namespaced resources...')
+        nonnamespaced_resources_list = download_resources(cluster.log, nonnamespaced_resources, kubernetes_res_dir, control_plane)
+
+    total_files = sum(len(actual_resources) for actual_resources in namespaced_resources_map.values()) \
+        + len(nonnamespaced_resources_list)
     cluster.log.verbose('Total files saved: %s' % total_files)
 
     if namespaced_resources_map:
@@ -383,6 +506,202 @@ def export_kubernetes(cluster: KubernetesCluster):
         cluster.context['backup_descriptor']['kubernetes']['resources']['nonnamespaced'] = nonnamespaced_resources_list
 
 
+class _ResourcesSplitter(OutputConsumer):
+    """
+    Parses the JSON list of resources of one type as it arrives,
+    and appends each resource to the YAML list of resources of its namespace.
+    The files have the same format as the output of `kubectl get <resource> -o yaml`.
+    """
+
+    def __init__(self, location: str, resource: str, namespaces: Optional[List[str]]) -> None:
+        """
+        :param location: directory, in which the files are written
+        :param resource: full name of the resource type
+        :param namespaces: namespaces to export, or None if the resource type is not namespaced
+        """
+        self.location = location
+        self.resource = resource
+        self.namespaces = None if namespaces is None else set(namespaces)
+        self.files: List[str] = []
+        """Paths to the written files in the order of their creation."""
+
+        self._lock = threading.Lock()
+        self._decoder = json.JSONDecoder()
+        self._reset()
+
+    def _reset(self) -> None:
+        self._buffer = ''
+        self._pending: List[str] = []
+        self._tail = ''
+        self._waiting_item_end = False
+        self._items_started = False
+        self._items_finished = False
+        self._item_end_marker: Optional[str] = None
+        self._file: Optional[IO] = None
+        self._filepath: Optional[str] = None
+
+    def consume(self, data: str, stderr: bool) -> None:
+        if stderr:
+            return
+
+        with self._lock:
+            self._feed(data)
+
+    def restart(self) -> None:
+        # The retried command outputs the whole list again.
+        with self._lock:
+            self._close()
+            for filepath in self.files:
+                os.remove(filepath)
+            self.files = []
+            self._reset()
+
+    def _feed(self, data: str) -> None:
+        self._pending.append(data)
+        if self._waiting_item_end:
+            # Do not join and decode the large item until its end arrives.
+            marker = cast(str, self._item_end_marker)
+            tail = self._tail + data
+            self._tail = tail[-len(marker):]
+            if marker not in tail:
+                return
+
+        self._buffer += ''.join(self._pending)
+        self._pending = []
+        self._parse()
+
+    def _parse(self) -> None:
+        self._waiting_item_end = False
+        if not self._items_started:
+            start = self._buffer.find('"items": [')
+            if start == -1:
+                return
+            self._buffer = self._buffer[start + len('"items": ['):]
+            self._items_started = True
+
+        while not self._items_finished:
+            item_text = self._buffer.lstrip(', \t\r\n')
+            if not item_text:
+                # Keep the leading whitespaces to detect the indentation of items.
+                return
+            if item_text[0] == ']':
+                self._items_finished = True
+                self._buffer = ''
+                return
+
+            if self._item_end_marker is None:
+                # The output is indented, so the item is complete only when the closing brace of its indentation arrives.
+                # This avoids repeated attempts to decode large incomplete items.
+                leading = self._buffer[:len(self._buffer) - len(item_text)]
+                indent = leading[leading.rfind('\n') + 1:] if '\n' in leading else ''
+                self._item_end_marker = '\n' + indent + '}' if indent else ''
+
+            if self._item_end_marker and self._item_end_marker not in item_text:
+                self._buffer = item_text
+                self._waiting_item_end = True
+                self._tail = item_text[-len(self._item_end_marker):]
+                return
+
+            try:
+                item, end = self._decoder.raw_decode(item_text)
+            except json.JSONDecodeError:
+                self._buffer = item_text
+                return
+
+            self._write(item)
+            self._buffer = item_text[end:]
+
+    def _write(self, item: dict) -> None:
+        if self.namespaces is None:
+            filepath = os.path.join(self.location, '%s.yaml' % self.resource)
+        else:
+            namespace = item['metadata']['namespace']
+            if namespace not in self.namespaces:
+                return
+            filepath = os.path.join(self.location, namespace, '%s.yaml' % self.resource)
+
+        if filepath != self._filepath:
+            self._close()
+            created = not os.path.exists(filepath)
+            if created:
+                os.makedirs(os.path.dirname(filepath), exist_ok=True)
+                self.files.append(filepath)
+            file = self._file = utils.open_utf8(filepath, 'a')
+            self._filepath = filepath
+            if created:
+                file.write('apiVersion: v1\nitems:\n')
+
+        cast(IO, self._file).write(yaml.dump([item]))
+
+    def _close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._filepath = None
+
+    def finish(self) -> None:
+        """
+        Completes all the written files.
+        """
+        with self._lock:
+            self._close()
+            for filepath in self.files:
+                with utils.open_utf8(filepath, 'a') as file:
+                    file.write('kind: List\nmetadata:\n  resourceVersion: ""\n')
+
+            if not self._items_finished:
+                raise Exception('Unexpected end of the list of resources "%s"' % self.resource)
+
+
+def export_resources_cluster_wide(cluster: KubernetesCluster, control_plane: NodeGroup, location: str,
+                                  namespaces: List[str], namespaced_resources: List[str],
+                                  nonnamespaced_resources: List[str]) -> Tuple[Dict[str, List[str]], List[str]]:
+    """
+    Exports each resource type by one paginated `kubectl get` call for all namespaces,
+    and splits the resources to the files per namespace as soon as they arrive.
+    Different resource types are exported concurrently.
+
+    :return: map of namespaces to exported namespaced resource types, and list of exported non-namespaced resource types
+    """
+    config = cluster.globals['backup']['kubernetes']
+    splitters = [_ResourcesSplitter(location, resource, namespaces) for resource in namespaced_resources] \
+        + [_ResourcesSplitter(location, resource, None) for resource in nonnamespaced_resources]
+
+    def export(splitter: _ResourcesSplitter) -> None:
+        all_namespaces = '' if splitter.namespaces is None else ' --all-namespaces'
+        # The output is owned by the splitter, and is not accumulated in the result of the command.
+        control_plane.sudo(f'kubectl get {splitter.resource}{all_namespaces} '
+                           f'--chunk-size={config["chunk_size"]} -o json',
+                           watchers=[splitter])
+        splitter.finish()
+        cluster.log.verbose('Resources "%s" exported to %s files' % (splitter.resource, len(splitter.files)))
+
+    cluster.log.debug('Downloading resources, %s types at a time...' % config['parallelism'])
+    with ThreadPoolExecutor(max_workers=max(1, min(config['parallelism'], len(splitters))),
+                            thread_name_prefix='export') as pool:
+        for future in [pool.submit(export, splitter) for splitter in splitters]:
+            future.result()
+
+    namespaced_resources_map: Dict[str, List[str]] = {}
+    nonnamespaced_resources_list = []
+    for splitter in splitters:
+        if not splitter.files:
+            continue
+        if splitter.namespaces is None:
+            nonnamespaced_resources_list.append(splitter.resource)
+            continue
+        for filepath in splitter.files:
+            namespace = os.path.basename(os.path.dirname(filepath))
+            namespaced_resources_map.setdefault(namespace, []).append(splitter.resource)
+
+    # Preserve the order of namespaces and resources as in the per-namespace export.
+    namespaced_resources_map = {namespace: sorted(namespaced_resources_map[namespace],
+                                                  key=namespaced_resources.index)
+                                for namespace in namespaces if namespace in namespaced_resources_map}
+
+    return namespaced_resources_map, nonnamespaced_resources_list
+
+
 def make_descriptor(cluster: KubernetesCluster):
     backup_directory = prepare_backup_tmpdir(cluster)
 
@@ -397,7 +716,34 @@ def pack_data(cluster: KubernetesCluster):
     cluster_name = cluster.inventory['cluster_name']
     backup_directory = prepare_backup_tmpdir(cluster)
 
-    backup_filename = 'backup-%s-%s.tar.gz' % (cluster_name, utils.get_current_timestamp_formatted())
+    backup_name = 'backup-%s-%s' % (cluster_name, utils.get_current_timestamp_formatted())
+    if is_repository_format(cluster):
+        pack_repository(cluster, backup_name)
+    else:
+        pack_archive(cluster, backup_name)
+
+    cluster.log.verbose('Cleaning up...')
+    shutil.rmtree(backup_directory, ignore_errors=True)
+
+
+def pack_repository(cluster: KubernetesCluster, backup_name: str):
+    backup_directory = prepare_backup_tmpdir(cluster)
+    repository_path = utils.get_external_resource_path(cluster.procedure_inventory['backup_location'])
+
+    config = cluster.globals['backup']['repository']
+    chunker = chunkstore.Chunker(config['min_chunk_size'], config['avg_chunk_size'], config['max_chunk_size'])
+    repository = chunkstore.ChunkStore(repository_path)
+
+    cluster.log.debug('Writing all data to the backup repository...')
+    snapshot_path = repository.put_snapshot(backup_name, backup_directory, chunker)
+    cluster.log.debug('%s of %s chunks are new, %s bytes written to the repository'
+                      % (repository.written_chunks, repository.total_chunks, repository.written_bytes))
+    cluster.log.debug('Backup snapshot is saved to %s' % snapshot_path)
+
+
+def pack_archive(cluster: KubernetesCluster, backup_name: str):
+    backup_directory = prepare_backup_tmpdir(cluster)
+    backup_filename = backup_name + '.tar.gz'
 
     target = utils.get_external_resource_path(cluster.procedure_inventory.get('backup_location', backup_filename))
     if os.path.isdir(target):
@@ -411,9 +757,6 @@ def pack_data(cluster: KubernetesCluster):
                 tar_handle.add(pathname, pathname.replace(backup_directory, ''))
         tar_handle.close()
 
-    cluster.log.verbose('Cleaning up...')
-    shutil.rmtree(backup_directory, ignore_errors=True)
-
 
 tasks = OrderedDict({
     "verify_backup_location": verify_backup_location,
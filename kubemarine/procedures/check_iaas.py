@@ -14,15 +14,17 @@
 # limitations under the License.
 import io
 import ipaddress
+import json
 import math
 import os
+import random
 import re
 import sys
 import uuid
 from collections import OrderedDict
 import time
 from contextlib import contextmanager
-from typing import List, Dict, Any, cast, Match, Iterator, Optional
+from typing import List, Dict, Any, cast, Match, Iterator, Optional, Tuple, Set
 
 import yaml
 
@@ -684,12 +686,10 @@ def pod_subnet_connectivity(cluster: KubernetesCluster):
         tcp_ports = ["30050"]
         with assign_random_ips(cluster, nodes, pod_subnet) as host_to_ip, \
                 install_tcp_listener(cluster, nodes, tcp_ports):
-            failed_nodes = check_tcp_connect_between_all_nodes(cluster, list(nodes.values()), tcp_ports, host_to_ip)
-
-            if failed_nodes:
-                raise TestFailure(f"Failed to connect to {len(failed_nodes)} nodes.",
-                                  hint=f"Traffic is not allowed for the pod subnet({pod_subnet}) "
-                                       f"on nodes: {failed_nodes}.")
+            failed_nodes, failed_sources = check_tcp_connect(cluster, list(nodes.values()), tcp_ports, host_to_ip,
+                                                             'pod_subnet')
+            verify_tcp_connect(failed_nodes, failed_sources,
+                               f"Traffic is not allowed for the pod subnet({pod_subnet}) on nodes: {failed_nodes}.")
 
 
 def service_subnet_connectivity(cluster: KubernetesCluster):
@@ -700,12 +700,11 @@ def service_subnet_connectivity(cluster: KubernetesCluster):
         tcp_ports = ["30050"]
         with assign_random_ips(cluster, nodes, service_subnet) as host_to_ip, \
                 install_tcp_listener(cluster, nodes, tcp_ports):
-            failed_nodes = check_tcp_connect_between_all_nodes(cluster, list(nodes.values()), tcp_ports, host_to_ip)
-
-            if failed_nodes:
-                raise TestFailure(f"Failed to connect to {len(failed_nodes)} nodes.",
-                                  hint=f"Traffic is not allowed for the service subnet({service_subnet}) "
-                                       f"on nodes: {failed_nodes}.")
+            failed_nodes, failed_sources = check_tcp_connect(cluster, list(nodes.values()), tcp_ports, host_to_ip,
+                                                             'service_subnet')
+            verify_tcp_connect(failed_nodes, failed_sources,
+                               f"Traffic is not allowed for the service subnet({service_subnet}) "
+                               f"on nodes: {failed_nodes}.")
 
 
 def cmd_for_ports(ports, query):
@@ -717,7 +716,7 @@ def cmd_for_ports(ports, query):
 
 def tcp_connect(cluster: KubernetesCluster, node_from: NodeConfig, node_to: NodeConfig,
                 tcp_ports: List[str], host_to_ip: Dict[str, Any], mtu):
-    # 40 bites for headers
+    # 40 bytes for headers
     mtu -= 40
     cluster.log.verbose(f"Trying connection from '{node_from['name']}' to '{node_to['name']}")
     cmd = cmd_for_ports(tcp_ports, f"echo $(dd if=/dev/urandom bs={mtu}  count=1) >/dev/tcp/{host_to_ip[node_to['connect_to']]}/%s")
@@ -801,8 +800,123 @@ def check_tcp_connect_between_all_nodes(cluster: KubernetesCluster, node_list: L
     return failed_nodes
 
 
+def check_tcp_connect(cluster: KubernetesCluster, node_list: List[NodeConfig],
+                      tcp_ports: List[str], host_to_ip: Dict[str, Any],
+                      check_name: str) -> Tuple[List[str], List[str]]:
+    """
+    Checks TCP connectivity between the nodes using the mode specified by `--tcp-connect-mode`.
+
+    :return: pair of lists. The first list contains names of the nodes, that are not reachable.
+             The second list contains names of the nodes, that cannot connect to the other reachable nodes.
+    """
+    if cluster.context['execution_arguments'].get('tcp_connect_mode') != 'full-mesh':
+        return check_tcp_connect_between_all_nodes(cluster, node_list, tcp_ports, host_to_ip), []
+
+    unreachable = check_tcp_connect_full_mesh(cluster, node_list, tcp_ports, host_to_ip)
+    utils.dump_file(cluster, yaml.dump(unreachable), f'{check_name}_unreachable.yaml')
+
+    for node_from, nodes_to in unreachable.items():
+        for node_to, ports in nodes_to.items():
+            cluster.log.error(f"Connectivity test failed from '{node_from}' to '{node_to}' for ports {ports}")
+
+    # The port of the target is blamed only if no other node can connect to it.
+    # Other failed connections are caused by the source node that has broken outgoing traffic.
+    sources_count = len(node_list) - 1
+    failed_ports: Dict[str, Set[str]] = {}
+    for port in tcp_ports:
+        for node in node_list:
+            failed_from = [node_from for node_from, nodes_to in unreachable.items()
+                           if port in nodes_to.get(node['name'], [])]
+            if failed_from and len(failed_from) == sources_count:
+                failed_ports.setdefault(node['name'], set()).add(port)
+
+    failed_sources = set()
+    for node_from, nodes_to in unreachable.items():
+        for node_to, ports in nodes_to.items():
+            if not set(ports) <= failed_ports.get(node_to, set()):
+                failed_sources.add(node_from)
+
+    return ([node['name'] for node in node_list if node['name'] in failed_ports],
+            [node['name'] for node in node_list if node['name'] in failed_sources])
+
+
+def verify_tcp_connect(failed_nodes: List[str], failed_sources: List[str], hint: str) -> None:
+    """
+    Raises TestFailure if some nodes are not reachable, or if some nodes cannot connect to the other nodes.
+
+    :param failed_nodes: names of the nodes, that are not reachable
+    :param failed_sources: names of the nodes, that cannot connect to the other reachable nodes
+    :param hint: hint to show if some nodes are not reachable
+    """
+    messages = []
+    hints = []
+    if failed_nodes:
+        messages.append(f"Failed to connect to {len(failed_nodes)} nodes.")
+        hints.append(hint)
+    if failed_sources:
+        messages.append(f"Failed to connect from {len(failed_sources)} nodes.")
+        hints.append(f"Outgoing traffic is not allowed on nodes: {failed_sources}.")
+    if messages:
+        raise TestFailure(' '.join(messages), hint=' '.join(hints))
+
+
+def check_tcp_connect_full_mesh(cluster: KubernetesCluster, node_list: List[NodeConfig],
+                                tcp_ports: List[str], host_to_ip: Dict[str, Any]) -> Dict[str, Dict[str, List[str]]]:
+    """
+    Checks TCP connectivity from each node to each other node for all the ports.
+    All the nodes run the client script simultaneously, and each client connects to all the targets in parallel.
+
+    :return: reachability matrix, that contains the unreachable ports for each pair of nodes.
+             The pairs of nodes that are connected for all the ports are not presented.
+    """
+    if len(node_list) <= 1:
+        return {}
+
+    config = cluster.globals['check_iaas']['tcp_mesh']
+    # 40 bytes for headers
+    payload_size = cluster.inventory['plugins']['calico']['mtu'] - 40
+    address_to_name = {str(host_to_ip[node['connect_to']]): node['name'] for node in node_list}
+    targets = ''.join(f"{address} {port}\n" for address in address_to_name for port in tcp_ports)
+    targets_count = (len(node_list) - 1) * len(tcp_ports)
+    timeout = math.ceil(targets_count / config['parallelism']) * config['connect_timeout'] \
+        + cluster.globals['connection']['defaults']['timeout']
+
+    tcp_client = "/tmp/%s.py" % uuid.uuid4().hex
+    targets_file = tcp_client + '.targets'
+    group = cluster.make_group([node['connect_to'] for node in node_list])
+    group.put(io.StringIO(utils.read_internal('resources/scripts/tcp_mesh_client.py')), tcp_client)
+    group.put(io.StringIO(targets), targets_file)
+
+    cluster.log.verbose(f"Checking {targets_count} connections from each of {len(node_list)} nodes...")
+    collector = CollectorCallback(cluster)
+    try:
+        with group.new_executor() as exe:
+            for node in exe.group.get_ordered_members_list():
+                host = node.get_host()
+                python_executable = cluster.context['nodes'][host]['python']['executable']
+                node.run(f"{python_executable} {tcp_client} {targets_file} {host_to_ip[host]} {payload_size} "
+                         f"{config['connect_timeout']} {config['parallelism']}",
+                         timeout=timeout, callback=collector)
+    finally:
+        group.run(f"rm -f {tcp_client} {targets_file}", warn=True)
+
+    unreachable: Dict[str, Dict[str, List[str]]] = {}
+    for host, result in collector.result.items():
+        node_from = address_to_name[str(host_to_ip[host])]
+        for line in result.stdout.strip().split('\n'):
+            if not line:
+                continue
+            address, port, status = line.split(' ', 2)
+            if status != 'OK':
+                cluster.log.verbose(f"Connection from '{node_from}' to {address}:{port} failed: {status[5:]}")
+                unreachable.setdefault(node_from, {}).setdefault(address_to_name[address], []).append(port)
+
+    return unreachable
+
+
 @contextmanager
-def install_tcp_listener(cluster: KubernetesCluster, nodes: Dict[str, NodeConfig], tcp_ports):
+def install_tcp_listener(cluster: KubernetesCluster, nodes: Dict[str, NodeConfig], tcp_ports,
+                         script: str = 'resources/scripts/simple_tcp_listener.py'):
     detect_preinstalled_python(cluster)
     nodes_without_python = {node_config['name']: node_config for host, node_config in nodes.items()
                             if cluster.context['nodes'][host]['python'] == "Not installed"}
@@ -810,7 +924,7 @@ def install_tcp_listener(cluster: KubernetesCluster, nodes: Dict[str, NodeConfig
         del nodes[node_nonfig['connect_to']]
 
     # currently tcp listener can be run on both python 2 and 3
-    check_script = utils.read_internal('resources/scripts/simple_tcp_listener.py')
+    check_script = utils.read_internal(script)
     tcp_listener = "/tmp/%s.py" % uuid.uuid4().hex
     cluster.make_group(nodes.keys()).put(io.StringIO(check_script), tcp_listener)
 
@@ -872,12 +986,234 @@ def check_tcp_ports(cluster: KubernetesCluster):
                  for node in cluster.inventory['nodes']}
         host_to_ip = {host: node['internal_address'] for host, node in nodes.items()}
         with install_tcp_listener(cluster, nodes, tcp_ports):
-            failed_nodes = check_tcp_connect_between_all_nodes(cluster, list(nodes.values()), tcp_ports, host_to_ip)
+            failed_nodes, failed_sources = check_tcp_connect(cluster, list(nodes.values()), tcp_ports, host_to_ip,
+                                                             'tcp_ports')
+            verify_tcp_connect(failed_nodes, failed_sources,
+                               f"Not all needed tcp ports are opened on nodes: {failed_nodes}. "
+                               f"Ports that should be opened: {tcp_ports}")
+
+
+def get_network_benchmark(cluster: KubernetesCluster) -> Dict[str, Dict[str, float]]:
+    """
+    Measures throughput and round-trip time between the sampled pairs of nodes.
+    The measurements are performed only once and then reused by all the network performance tests.
+
+    :return: measurements for each pair of nodes in the form of '<node_from> -> <node_to>'
+    """
+    measurements: Optional[Dict[str, Dict[str, float]]] = cluster.context.get('network_benchmark')
+    if measurements is not None:
+        return measurements
 
-            if failed_nodes:
-                raise TestFailure(f"Failed to connect to {len(failed_nodes)} nodes.",
-                                  hint=f"Not all needed tcp ports are opened on nodes: {failed_nodes}. "
-                                       f"Ports that should be opened: {tcp_ports}")
+    measurements = {}
+    nodes = _get_not_balancers(cluster)
+    tcp_ports = ["30050"]
+    with suspend_firewalld(cluster), \
+            install_tcp_listener(cluster, nodes, tcp_ports, script='resources/scripts/tcp_benchmark_server.py'):
+        measurements = measure_network_performance(cluster, list(nodes.values()), tcp_ports[0])
+        cluster.context['network_benchmark'] = measurements
+
+    return measurements
+
+
+def measure_network_performance(cluster: KubernetesCluster, node_list: List[NodeConfig],
+                                port: str) -> Dict[str, Dict[str, float]]:
+    if len(node_list) <= 1:
+        return {}
+
+    config = cluster.globals['check_iaas']['network_benchmark']
+    # Each node sends the data to the next node, and receives the data from the previous node.
+    pairs = [(node_list[i], node_list[(i + 1) % len(node_list)]) for i in range(len(node_list))]
+    if len(node_list) == 2:
+        pairs = pairs[:1]
+    if len(pairs) > config['max_pairs']:
+        pairs = random.sample(pairs, config['max_pairs'])
+
+    # 40 bytes for headers
+    message_size = cluster.inventory['plugins']['calico']['mtu'] - 40
+    check_script = utils.read_internal('resources/scripts/tcp_benchmark_client.py')
+    tcp_client = "/tmp/%s.py" % uuid.uuid4().hex
+    group = cluster.make_group([node_from['connect_to'] for node_from, _ in pairs])
+    group.put(io.StringIO(check_script), tcp_client)
+
+    measurements = {}
+    try:
+        # Pairs are measured one by one, so that they do not compete for the network bandwidth.
+        for node_from, node_to in pairs:
+            cluster.log.verbose(f"Measuring network performance from '{node_from['name']}' to '{node_to['name']}'...")
+            python_executable = cluster.context['nodes'][node_from['connect_to']]['python']['executable']
+            result = cluster.make_group([node_from['connect_to']]).run(
+                f"{python_executable} {tcp_client} {node_to['internal_address']} {port} "
+                f"{message_size} {config['rtt_samples']} {config['duration']}",
+                timeout=config['duration'] + cluster.globals['connection']['defaults']['timeout'])
+            measurement: Dict[str, float] = json.loads(list(result.values())[0].stdout)
+            cluster.log.verbose(f"Throughput: {measurement['throughput']}Mbit/s, "
+                                f"RTT p50: {measurement['rtt_p50']}ms, RTT p99: {measurement['rtt_p99']}ms")
+            measurements[f"{node_from['name']} -> {node_to['name']}"] = measurement
+    finally:
+        group.run(f"rm -f {tcp_client}", warn=True)
+
+    return measurements
+
+
+def network_throughput(cluster: KubernetesCluster):
+    thresholds = cluster.globals['compatibility_map']['network']['nodes_connection']['throughput']
+    with TestCase(cluster, '016', 'Network', 'Throughput',
+                  minimal=thresholds['critical'], recommended=thresholds['recommended']) as tc:
+        measurements = get_network_benchmark(cluster)
+        if not measurements:
+            return tc.success(results='Skipped')
+
+        pair, measurement = min(measurements.items(), key=lambda item: item[1]['throughput'])
+        throughput = measurement['throughput']
+        if throughput < thresholds['critical']:
+            raise TestFailure("Very low throughput: %sMbit/s" % throughput,
+                              hint="A very low throughput was detected between the nodes %s. "
+                                   "Check your network settings and status. It is necessary to increase the throughput to %sMbit/s."
+                                   % (pair, thresholds['critical']))
+        if throughput < thresholds['recommended']:
+            raise TestWarn("Low throughput: %sMbit/s" % throughput,
+                           hint="The detected throughput between the nodes %s is lower than the recommended value (%sMbit/s). "
+                                "Check your network settings and status." % (pair, thresholds['recommended']))
+        tc.success(results="%sMbit/s" % throughput)
+
+
+def network_latency(cluster: KubernetesCluster, percentile: str):
+    thresholds = cluster.globals['compatibility_map']['network']['nodes_connection']['latency'][percentile]
+    with TestCase(cluster, '017', 'Network', 'Latency - %s' % percentile,
+                  minimal=thresholds['critical'], recommended=thresholds['recommended']) as tc:
+        measurements = get_network_benchmark(cluster)
+        if not measurements:
+            return tc.success(results='Skipped')
+
+        pair, measurement = max(measurements.items(), key=lambda item: item[1]['rtt_' + percentile])
+        latency = measurement['rtt_' + percentile]
+        if latency > thresholds['critical']:
+            raise TestFailure("Very high latency: %sms" % latency,
+                              hint="A very high latency was detected between the nodes %s. "
+                                   "Check your network settings and status. It is necessary to reduce the latency to %sms."
+                                   % (pair, thresholds['critical']))
+        if latency > thresholds['recommended']:
+            raise TestWarn("High latency: %sms" % latency,
+                           hint="The detected latency between the nodes %s is higher than the recommended value (%sms). "
+                                "Check your network settings and status." % (pair, thresholds['recommended']))
+        tc.success(results="%sms" % latency)
+
+
+def get_disk_benchmark(cluster: KubernetesCluster, volume: str) -> Tuple[Dict[str, Dict[str, Any]], List[str]]:
+    """
+    Measures fdatasync latency and sequential write throughput of the etcd or the container runtime volume.
+    The measurements are performed only once for each volume and then reused by all the disk tests.
+
+    :param volume: 'etcd' or 'cri'
+    :return: pair of measurements for each node name, and names of the nodes that are skipped due to absent python
+    """
+    benchmarks = cluster.context.setdefault('disk_benchmark', {})
+    if volume in benchmarks:
+        benchmark: Tuple[Dict[str, Dict[str, Any]], List[str]] = benchmarks[volume]
+        return benchmark
+
+    if volume == 'etcd':
+        group = cluster.nodes['control-plane']
+        directory = '/var/lib/etcd'
+    else:
+        group = cluster.make_group_from_roles(['control-plane', 'worker'])
+        cri_config = cluster.inventory['services']['cri']
+        if cri_config['containerRuntime'] == 'docker':
+            directory = cri_config['dockerConfig'].get('data-root', '/var/lib/docker')
+        else:
+            directory = cri_config['containerdConfig'].get('root', '/var/lib/containerd')
+
+    detect_preinstalled_python(cluster)
+    nodes_without_python = [node.get_node_name() for node in group.get_ordered_members_list()
+                            if cluster.context['nodes'][node.get_host()]['python'] == "Not installed"]
+    group = group.exclude_group(cluster.make_group_from_nodes(nodes_without_python))
+
+    config = cluster.globals['check_iaas']['disk_benchmark']
+    check_script = utils.read_internal('resources/scripts/disk_benchmark.py')
+    disk_benchmark = "/tmp/%s.py" % uuid.uuid4().hex
+    group.put(io.StringIO(check_script), disk_benchmark)
+
+    collector = CollectorCallback(cluster)
+    try:
+        with group.new_executor() as exe:
+            for node in exe.group.get_ordered_members_list():
+                python_executable = cluster.context['nodes'][node.get_host()]['python']['executable']
+                node.sudo(f"{python_executable} {disk_benchmark} {directory} "
+                          f"{config['block_size']} {config['writes']} {config['sequential_size']}",
+                          timeout=config['timeout'], callback=collector)
+    finally:
+        group.run(f"rm -f {disk_benchmark}", warn=True)
+
+    node_names = {node.get_host(): node.get_node_name() for node in group.get_ordered_members_list()}
+    measurements = {}
+    for host, result in collector.result.items():
+        node_name = node_names[host]
+        measurement: Dict[str, Any] = json.loads(result.stdout)
+        cluster.log.info(f"Disk of {measurement['directory']} on node '{node_name}': "
+                         f"fsync p99 {measurement['fsync_p99']}ms, throughput {measurement['throughput']}MB/s")
+        measurements[node_name] = measurement
+
+    benchmarks[volume] = measurements, nodes_without_python
+    return measurements, nodes_without_python
+
+
+def _warn_disk_benchmark_skipped(skipped_nodes: List[str]) -> None:
+    if skipped_nodes:
+        raise TestWarn(f"Cannot perform check on {skipped_nodes}: python doesn't exist.")
+
+
+def disk_fsync_latency(cluster: KubernetesCluster, volume: str):
+    thresholds = cluster.globals['compatibility_map']['storage']['fsync_latency']
+    with TestCase(cluster, '018', 'Hardware', 'Disk Fsync Latency - %s' % volume.upper(),
+                  minimal=thresholds['critical'], recommended=thresholds['recommended']) as tc:
+        measurements, skipped_nodes = get_disk_benchmark(cluster, volume)
+        if not measurements:
+            _warn_disk_benchmark_skipped(skipped_nodes)
+            return tc.success(results='Skipped')
+
+        latency = max(measurement['fsync_p99'] for measurement in measurements.values())
+        critical_nodes = [node for node, measurement in measurements.items()
+                          if measurement['fsync_p99'] > thresholds['critical']]
+        slow_nodes = [node for node, measurement in measurements.items()
+                      if measurement['fsync_p99'] > thresholds['recommended']]
+        if critical_nodes:
+            raise TestFailure("Very high fsync latency: %sms" % latency,
+                              hint="A very high 99th percentile of fsync latency was detected on the nodes %s. "
+                                   "Use faster disks. It is necessary to reduce the latency to %sms."
+                                   % (critical_nodes, thresholds['critical']))
+        if slow_nodes:
+            raise TestWarn("High fsync latency: %sms" % latency,
+                           hint="The detected 99th percentile of fsync latency on the nodes %s is higher "
+                                "than the recommended value (%sms). Use faster disks." % (slow_nodes, thresholds['recommended']))
+        _warn_disk_benchmark_skipped(skipped_nodes)
+        tc.success(results="%sms" % latency)
+
+
+def disk_throughput(cluster: KubernetesCluster, volume: str):
+    thresholds = cluster.globals['compatibility_map']['storage']['throughput']
+    with TestCase(cluster, '019', 'Hardware', 'Disk Throughput - %s' % volume.upper(),
+                  minimal=thresholds['critical'], recommended=thresholds['recommended']) as tc:
+        measurements, skipped_nodes = get_disk_benchmark(cluster, volume)
+        if not measurements:
+            _warn_disk_benchmark_skipped(skipped_nodes)
+            return tc.success(results='Skipped')
+
+        throughput = min(measurement['throughput'] for measurement in measurements.values())
+        critical_nodes = [node for node, measurement in measurements.items()
+                          if measurement['throughput'] < thresholds['critical']]
+        slow_nodes = [node for node, measurement in measurements.items()
+                      if measurement['throughput'] < thresholds['recommended']]
+        if critical_nodes:
+            raise TestFailure("Very low disk throughput: %sMB/s" % throughput,
+                              hint="A very low sequential write throughput was detected on the nodes %s. "
+                                   "Use faster disks. It is necessary to increase the throughput to %sMB/s."
+                                   % (critical_nodes, thresholds['critical']))
+        if slow_nodes:
+            raise TestWarn("Low disk throughput: %sMB/s" % throughput,
+                           hint="The detected sequential write throughput on the nodes %s is lower "
+                                "than the recommended value (%sMB/s). Use faster disks." % (slow_nodes, thresholds['recommended']))
+        _warn_disk_benchmark_skipped(skipped_nodes)
+        tc.success(results="%sMB/s" % throughput)
 
 
 def make_reports(context: dict):
@@ -900,7 +1236,14 @@ tasks = OrderedDict({
     'network': {
         'pod_subnet_connectivity': pod_subnet_connectivity,
         'service_subnet_connectivity': service_subnet_connectivity,
-        'check_tcp_ports': check_tcp_ports
+        'check_tcp_ports': check_tcp_ports,
+        'performance': {
+            'throughput': network_throughput,
+            'latency': {
+                'p50': lambda cluster: network_latency(cluster, 'p50'),
+                'p99': lambda cluster: network_latency(cluster, 'p99'),
+            }
+        }
     },
     'hardware': {
         'members_amount': {
@@ -919,6 +1262,16 @@ tasks = OrderedDict({
             'balancers': lambda cluster: hardware_ram(cluster, 'balancer'),
             'control-planes': lambda cluster: hardware_ram(cluster, 'control-plane'),
             'workers': lambda cluster: hardware_ram(cluster, 'worker')
+        },
+        'disk': {
+            'etcd': {
+                'fsync_latency': lambda cluster: disk_fsync_latency(cluster, 'etcd'),
+                'throughput': lambda cluster: disk_throughput(cluster, 'etcd'),
+            },
+            'cri': {
+                'fsync_latency': lambda cluster: disk_fsync_latency(cluster, 'cri'),
+                'throughput': lambda cluster: disk_throughput(cluster, 'cri'),
+            }
         }
     },
     'system': {
@@ -977,6 +1330,12 @@ def main(cli_arguments=None):
                         action='store_true',
                         help='forcibly disable HTML report file creation')
 
+    parser.add_argument('--tcp-connect-mode',
+                        choices=['success-node', 'full-mesh'],
+                        default='success-node',
+                        help='check TCP connectivity from one successfully connected node to all other nodes, '
+                             'or simultaneously from each node to each other node')
+
     context = flow.create_context(parser, cli_arguments, procedure='check_iaas')
     context['testsuite'] = TestSuite()
     context['preserve_inventory'] = False
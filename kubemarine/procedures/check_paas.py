@@ -17,7 +17,7 @@ import sys
 import time
 from collections import OrderedDict
 import re
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 
 import yaml
 import ruamel.yaml
@@ -34,6 +34,7 @@ from kubemarine.core import flow, static
 from kubemarine.testsuite import TestSuite, TestCase, TestFailure, TestWarn
 from kubemarine.kubernetes.daemonset import DaemonSet
 from kubemarine.kubernetes.deployment import Deployment
+from kubemarine.kubernetes import snapshot
 from kubemarine.coredns import generate_configmap
 from deepdiff import DeepDiff  # type: ignore[import]
 
@@ -243,7 +244,7 @@ def check_packages_versions(cluster: KubernetesCluster, tc: TestCase, hosts_to_p
 
 
 def get_nodes_description(cluster: KubernetesCluster):
-    return kubernetes.get_nodes_description(cluster)
+    return snapshot.get_snapshot(cluster).get_list('nodes')
 
 
 def kubelet_version(cluster: KubernetesCluster):
@@ -502,25 +503,49 @@ def kubernetes_nodes_condition(cluster: KubernetesCluster, condition_type: str):
         tc.success(results="%s" % ', '.join(positive_conditions))
 
 
-def get_not_running_pods(cluster: KubernetesCluster):
+def get_pod_status(pod: dict) -> str:
+    """
+    Returns the status of the pod in the same way as it is shown in the STATUS column of `kubectl get pods`.
+    """
+    status = pod.get('status', {})
+    reason: str = status.get('reason') or status.get('phase', 'Unknown')
+    for container_status in reversed(status.get('containerStatuses', [])):
+        state = container_status.get('state', {})
+        if state.get('waiting', {}).get('reason'):
+            reason = state['waiting']['reason']
+        elif state.get('terminated', {}).get('reason'):
+            reason = state['terminated']['reason']
+    return reason
+
+
+def get_not_running_pods(cluster: KubernetesCluster) -> List[Tuple[str, str, str]]:
+    """
+    :return: namespace, name, and status of each pod, that is not running.
+    """
+    not_running_pods = []
+    # Only not running pods are fetched, as all pods of the large cluster may take hundreds of megabytes.
     # Completed pods should be excluded from the list as well
-    get_pods_cmd = 'kubectl get pods -A --field-selector status.phase!=Running | awk \'{ print $1" "$2" "$4 }\' | grep -vw Completed || true'
-    result = cluster.nodes['control-plane'].get_any_member().sudo(get_pods_cmd)
-    cluster.log.verbose(result)
-    return list(result.values())[0].stdout.strip()
+    for pod in snapshot.get_snapshot(cluster).get_items(
+            'pods', field_selector='status.phase!=Running,status.phase!=Succeeded'):
+        pod_status = get_pod_status(pod)
+        if pod_status == 'Completed':
+            continue
+        not_running_pods.append((pod['metadata']['namespace'], pod['metadata']['name'], pod_status))
+
+    cluster.log.verbose(not_running_pods)
+    return not_running_pods
 
 
 def kubernetes_pods_condition(cluster: KubernetesCluster):
     system_namespaces = ["kube-system", "ingress-nginx", "kube-public", "kubernetes-dashboard", "default"]
     critical_states = cluster.globals['pods']['critical_states']
     with TestCase(cluster, '207', "Kubernetes", "Pods Condition") as tc:
-        pods_description = get_not_running_pods(cluster)
-        total_failed_amount = len(pods_description.split('\n')[1:])
+        not_running_pods = get_not_running_pods(cluster)
+        total_failed_amount = len(not_running_pods)
         critical_system_failed_amount = 0
 
-        for pod_description in pods_description.split('\n')[1:]:
-            split_description = pod_description.split(' ')
-            if split_description[0] in system_namespaces and split_description[2] in critical_states:
+        for namespace, _, pod_status in not_running_pods:
+            if namespace in system_namespaces and pod_status in critical_states:
                 critical_system_failed_amount += 1
 
         if critical_system_failed_amount > 0:
@@ -578,15 +603,15 @@ def kubernetes_dashboard_status(cluster: KubernetesCluster):
 
 def nodes_pid_max(cluster: KubernetesCluster):
     with TestCase(cluster, '202', "Nodes", "Nodes pid_max correctly installed") as tc:
-        control_plane = cluster.nodes['control-plane'].get_any_member()
         yaml = ruamel.yaml.YAML()
         nodes_failed_pid_max_check = {}
         for node in cluster.make_group_from_roles(['control-plane', 'worker']).get_ordered_members_list():
             node_name = node.get_node_name()
 
-            node_info = control_plane.sudo("kubectl get node %s -o yaml" % node_name).get_simple_out()
-            config = yaml.load(node_info)
-            max_pods = int(config['status']['capacity']['pods'])
+            node_info = snapshot.get_snapshot(cluster).get_item('nodes', node_name)
+            if node_info is None:
+                raise TestFailure("Node \"%s\" is not found in cluster" % node_name)
+            max_pods = int(node_info['status']['capacity']['pods'])
 
             kubelet_config = node.sudo("cat /var/lib/kubelet/config.yaml").get_simple_out()
             config = yaml.load(kubelet_config)
@@ -924,13 +949,10 @@ def control_plane_health_status(cluster: KubernetesCluster):
             for static_pod in static_pods:
                 static_pod_names.append(static_pod + '-' + control_plane.get_node_name())
 
-        first_control_plane = cluster.nodes['control-plane'].get_first_member()
         not_found_pod = []
         for static_pod_name in static_pod_names:
-            results = first_control_plane.sudo(f"kubectl get pod -n kube-system -oyaml {static_pod_name}", warn=True)
-            exit_code = list(results.values())[0].exited
-            if exit_code == 0:
-                result = yaml.safe_load(results.get_simple_out())
+            result = snapshot.get_snapshot(cluster).get_item('pods', static_pod_name, 'kube-system')
+            if result is not None:
                 if result['status']['containerStatuses'][0]['state'].get('running'):
                     break
             not_found_pod.append(static_pod_name)
@@ -950,8 +972,10 @@ def default_services_configuration_status(cluster: KubernetesCluster):
     with TestCase(cluster, '222', "Default services", "configuration status") as tc:
         first_control_plane = cluster.nodes['control-plane'].get_first_member()
         original_coredns_cm = yaml.safe_load(generate_configmap(cluster.inventory))
-        result = first_control_plane.sudo('kubectl get cm coredns -n kube-system -oyaml')
-        coredns_cm = yaml.safe_load(result.get_simple_out())
+        cluster_snapshot = snapshot.get_snapshot(cluster)
+        coredns_cm = cluster_snapshot.get_item('configmaps', 'coredns', 'kube-system')
+        if coredns_cm is None:
+            raise TestFailure('invalid', hint="CoreDNS configmap is not found")
         ddiff = DeepDiff(coredns_cm['data'], original_coredns_cm['data'], ignore_order=True)
         coredns_result = ddiff.to_dict().get('values_changed', {}).get("root['Corefile']", {}).get('diff')
 
@@ -976,9 +1000,10 @@ def default_services_configuration_status(cluster: KubernetesCluster):
                             if service_name == "ingress-nginx-controller":
                                 if not cluster.inventory['plugins']['nginx-ingress-controller']['install']:
                                     break
-                            result = first_control_plane.sudo(f"kubectl get {type} {service_name} -n {namespace} -oyaml")
-                            content = yaml.safe_load(result.get_simple_out())
-                            if properties["version"] in content["spec"]["template"]["spec"]["containers"][0].get("image", ""):
+                            content = cluster_snapshot.get_item(type.lower() + 's', service_name, namespace)
+                            if content is None:
+                                message += f"{service_name} is not found\n"
+                            elif properties["version"] in content["spec"]["template"]["spec"]["containers"][0].get("image", ""):
                                 results[service_name] = True
                             else:
                                 results[service_name] = False
@@ -1003,7 +1028,7 @@ def default_services_health_status(cluster: KubernetesCluster):
                                              {"Deployment": ["calico-kube-controllers", "coredns"]}],
                              "ingress-nginx": [{"DaemonSet": ["ingress-nginx-controller"]}]}
 
-        first_control_plane = cluster.nodes['control-plane'].get_first_member()
+        cluster_snapshot = snapshot.get_snapshot(cluster)
         not_ready_entities = []
         for namespace, types_dict in entities_to_check.items():
             for type_dict in types_dict:
@@ -1013,14 +1038,14 @@ def default_services_health_status(cluster: KubernetesCluster):
                             if service == "ingress-nginx-controller":
                                 if not cluster.inventory['plugins']['nginx-ingress-controller']['install']:
                                     break
-                            daemon_set = DaemonSet(cluster, name=service, namespace=namespace)
-                            ready = daemon_set.reload(control_plane=first_control_plane, suppress_exceptions=True).is_actual_and_ready()
+                            obj = cluster_snapshot.get_item('daemonsets', service, namespace)
+                            ready = obj is not None and DaemonSet(cluster, obj=obj).is_actual_and_ready()
                             if not ready:
                                 not_ready_entities.append(service)
                     elif type == 'Deployment':
                         for service in services:
-                            deployment = Deployment(cluster, name=service, namespace=namespace)
-                            ready = deployment.reload(control_plane=first_control_plane, suppress_exceptions=True).is_actual_and_ready()
+                            obj = cluster_snapshot.get_item('deployments', service, namespace)
+                            ready = obj is not None and Deployment(cluster, obj=obj).is_actual_and_ready()
                             if not ready:
                                 not_ready_entities.append(service)
         if len(not_ready_entities) == 0:
@@ -1039,8 +1064,10 @@ def calico_config_check(cluster: KubernetesCluster):
         message = ""
         correct_config = True
         first_control_plane = cluster.nodes['control-plane'].get_first_member()
-        result = first_control_plane.sudo(f"kubectl get DaemonSet calico-node -n kube-system -oyaml")
-        calico_daemonset = yaml.safe_load(result.get_simple_out())
+        cluster_snapshot = snapshot.get_snapshot(cluster)
+        calico_daemonset = cluster_snapshot.get_item('daemonsets', 'calico-node', 'kube-system')
+        if calico_daemonset is None:
+            raise TestFailure('invalid', hint="calico-node DaemonSet is not found")
         for env in calico_daemonset["spec"]["template"]["spec"]["containers"][0]["env"]:
             if cluster.inventory["plugins"]["calico"]["env"].get(env["name"]):
                 if "value" in env.keys() and not str(cluster.inventory["plugins"]["calico"]["env"].get(env["name"])) == env["value"]:
@@ -1050,8 +1077,9 @@ def calico_config_check(cluster: KubernetesCluster):
         if not correct_config:
             message += "calico-node env configuration is outdated\n"
 
-        result = first_control_plane.sudo(f"kubectl get cm calico-config -n kube-system -oyaml")
-        calico_config = yaml.safe_load(result.get_simple_out())
+        calico_config = cluster_snapshot.get_item('configmaps', 'calico-config', 'kube-system')
+        if calico_config is None:
+            raise TestFailure('invalid', hint="calico-config configmap is not found")
         cni_network_config = yaml.safe_load(calico_config["data"]["cni_network_config"])
         ip = cluster.inventory['services']['kubeadm']['networking']['podSubnet'].split('/')[0]
         if type(ipaddress.ip_address(ip)) is ipaddress.IPv4Address:
@@ -1084,8 +1112,9 @@ def kubernetes_admission_status(cluster: KubernetesCluster):
                 cluster.inventory["rbac"]["pss"]["pod-security"] == "enabled":
             profile_inv = cluster.inventory["rbac"]["pss"]["defaults"]["enforce"]
         profile = ""
-        result = first_control_plane.sudo("kubectl get cm kubeadm-config -n kube-system -o yaml")
-        kubeadm_cm = yaml.safe_load(list(result.values())[0].stdout)
+        kubeadm_cm = snapshot.get_snapshot(cluster).get_item('configmaps', 'kubeadm-config', 'kube-system')
+        if kubeadm_cm is None:
+            raise TestFailure('invalid', hint="kubeadm-config configmap is not found")
         cluster_config = yaml.safe_load(kubeadm_cm["data"]["ClusterConfiguration"])
         api_result = first_control_plane.sudo("cat /etc/kubernetes/manifests/kube-apiserver.yaml")
         api_conf = yaml.safe_load(list(api_result.values())[0].stdout)
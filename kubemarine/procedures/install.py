@@ -643,6 +643,21 @@ cumulative_points = {
 }
 
 
+concurrent_tasks = {
+    # chrony and timesyncd are mutually exclusive and disable each other
+    "prepare.ntp": flow.ConcurrentTask(locks=["ntp"]),
+    "prepare.system.setup_selinux": flow.ConcurrentTask(),
+    "prepare.system.setup_apparmor": flow.ConcurrentTask(),
+    "prepare.system.disable_firewalld": flow.ConcurrentTask(),
+    "prepare.system.disable_swap": flow.ConcurrentTask(),
+    "prepare.system.modprobe": flow.ConcurrentTask(),
+    # kernel parameters net.bridge.* exist only after br_netfilter module is loaded
+    "prepare.system.sysctl": flow.ConcurrentTask(after=["prepare.system.modprobe"]),
+    "prepare.system.audit.install": flow.ConcurrentTask(locks=["package_manager"]),
+    "prepare.system.audit.configure_daemon": flow.ConcurrentTask(after=["prepare.system.audit.install"]),
+}
+
+
 class InstallAction(Action):
     def __init__(self):
         super().__init__('install')
@@ -652,7 +667,7 @@ class InstallAction(Action):
         self.target_version = kubernetes.get_initial_kubernetes_version(res.raw_inventory())
         kubernetes.verify_supported_version(self.target_version, res.logger())
 
-        flow.run_tasks(res, tasks, cumulative_points=cumulative_points)
+        flow.run_tasks(res, tasks, cumulative_points=cumulative_points, concurrent_tasks=concurrent_tasks)
 
 
 def main(cli_arguments=None):
@@ -21,9 +21,10 @@ import time
 from collections import OrderedDict
 import yaml
 
-from kubemarine.core import utils, flow, defaults
+from kubemarine.core import utils, flow, defaults, chunkstore
 from kubemarine.core.action import Action
 from kubemarine.core.cluster import KubernetesCluster
+from kubemarine.core.group import CollectorCallback
 from kubemarine.core.resources import DynamicResources
 from kubemarine.procedures import install, backup
 from kubemarine import system, kubernetes, etcd
@@ -47,6 +48,12 @@ def replace_config_from_backup_if_needed(procedure_inventory_filepath: str, conf
             raise Exception('Backup location is not specified in procedure')
 
         print('Unpacking cluster.yaml...')
+        if chunkstore.is_snapshot(backup_location):
+            data = chunkstore.open_for_snapshot(backup_location).read_file(backup_location, 'original_cluster.yaml')
+            with open(config, 'wb') as file:
+                file.write(data)
+            return
+
         with tarfile.open(backup_location, 'r:gz') as tar:
             member = tar.getmember('original_cluster.yaml')
             tar.makefile(member, config)
@@ -64,6 +71,21 @@ def unpack_data(cluster: KubernetesCluster):
     if not os.path.isfile(backup_file_source):
         raise FileNotFoundError('Backup file "%s" not found' % backup_file_source)
 
+    if chunkstore.is_snapshot(backup_file_source):
+        cluster.log.debug('Reassembling all data from the backup repository...')
+        chunkstore.open_for_snapshot(backup_file_source).restore_snapshot(backup_file_source, backup_tmp_directory)
+    else:
+        unpack_archive(cluster, backup_file_source, backup_tmp_directory)
+
+    descriptor_filepath = os.path.join(backup_tmp_directory, 'descriptor.yaml')
+    if not os.path.isfile(descriptor_filepath):
+        raise FileNotFoundError('Descriptor not found in backup file')
+
+    with utils.open_external(descriptor_filepath, 'r') as stream:
+        cluster.context['backup_descriptor'] = yaml.safe_load(stream)
+
+
+def unpack_archive(cluster: KubernetesCluster, backup_file_source: str, backup_tmp_directory: str):
     cluster.log.debug('Unpacking all data...')
     with tarfile.open(backup_file_source, 'r:gz') as tar:
         for member in tar:
@@ -79,15 +101,10 @@ def unpack_data(cluster: KubernetesCluster):
             tar.makefile(member, fname)
         tar.close()
 
-    descriptor_filepath = os.path.join(backup_tmp_directory, 'descriptor.yaml')
-    if not os.path.isfile(descriptor_filepath):
-        raise FileNotFoundError('Descriptor not found in backup file')
-
-    with utils.open_external(descriptor_filepath, 'r') as stream:
-        cluster.context['backup_descriptor'] = yaml.safe_load(stream)
-
 
 def verify_backup_data(cluster: KubernetesCluster):
+    verify_etcd_snapshot(cluster)
+
     if not cluster.context['backup_descriptor'].get('kubernetes', {}).get('version'):
         cluster.log.debug('Not possible to verify Kubernetes version, because descriptor do not contain such information')
         return
@@ -105,6 +122,20 @@ def verify_backup_data(cluster: KubernetesCluster):
         cluster.log.debug('Kubernetes version from backup is correct')
 
 
+def verify_etcd_snapshot(cluster: KubernetesCluster):
+    expected_sha1 = cluster.context['backup_descriptor'].get('etcd', {}).get('sha1')
+    if not expected_sha1:
+        cluster.log.debug('Not possible to verify ETCD snapshot, because descriptor do not contain its hash')
+        return
+
+    actual_sha1 = utils.get_local_file_sha1(os.path.join(cluster.context['backup_tmpdir'], 'etcd.db'))
+    if actual_sha1 != expected_sha1:
+        raise Exception(f'SHA1 hash {actual_sha1} of ETCD snapshot does not match the hash {expected_sha1} '
+                        f'from the backup descriptor. The backup is corrupted.')
+
+    cluster.log.debug('ETCD snapshot hash is correct')
+
+
 def stop_cluster(cluster: KubernetesCluster):
     cluster.log.debug('Stopping the existing cluster...')
     cri_impl = cluster.inventory['services']['cri']['containerRuntime']
@@ -136,16 +167,21 @@ def restore_thirdparties(cluster: KubernetesCluster):
 
 
 def import_nodes(cluster: KubernetesCluster):
+    nodes_data_dir = os.path.join(cluster.context['backup_tmpdir'], 'nodes_data')
+    # The backup repository stores not compressed archives of nodes.
+    compressed = not any(filename.endswith('.tar') for filename in os.listdir(nodes_data_dir))
+    extension = 'tar.gz' if compressed else 'tar'
+
     with cluster.nodes['all'].new_executor() as exe:
         for node in exe.group.get_ordered_members_list():
             node_name = node.get_node_name()
             cluster.log.debug('Uploading backup for \'%s\'' % node_name)
-            node.put(os.path.join(cluster.context['backup_tmpdir'], 'nodes_data', '%s.tar.gz' % node_name),
-                     '/tmp/kubemarine-backup.tar.gz')
+            node.put(os.path.join(nodes_data_dir, '%s.%s' % (node_name, extension)),
+                     '/tmp/kubemarine-backup.%s' % extension)
 
     cluster.log.debug('Unpacking backup...')
 
-    unpack_cmd = "sudo tar xzvf /tmp/kubemarine-backup.tar.gz -C / --overwrite"
+    unpack_cmd = "sudo tar %s /tmp/kubemarine-backup.%s -C / --overwrite" % ('xzvf' if compressed else 'xvf', extension)
     result = cluster.nodes['all'].sudo(
         f"readlink /etc/resolv.conf ; "
         f"if [ $? -ne 0 ]; then sudo chattr -i /etc/resolv.conf; {unpack_cmd} && sudo chattr +i /etc/resolv.conf; "
@@ -187,47 +223,53 @@ def import_etcd(cluster: KubernetesCluster):
     else:
         cont_runtime = "podman"
 
-    etcd_instances = 0
-    for control_plane in cluster.nodes['control-plane'].get_ordered_members_configs_list():
-        cluster.log.debug('Restoring ETCD member ' + control_plane['name'])
-        control_plane_conn = cluster.make_group([control_plane['connect_to']])
-        control_plane_conn.sudo(
-            f'chmod 777 {snap_name} && '
-            f'sudo ls -la {snap_name} && '
-            f'sudo etcdctl snapshot restore {snap_name} '
-            f'--name={control_plane["name"]} '
-            f'--data-dir=/var/lib/etcd/snapshot '
-            f'--initial-cluster={initial_cluster} '
-            f'--initial-advertise-peer-urls=https://{control_plane["internal_address"]}:2380',
-            hide=False)
-
-        etcd_id = control_plane_conn.sudo(
-            f'mv /var/lib/etcd/snapshot/member /var/lib/etcd/member && '
-            f'sudo rm -rf /var/lib/etcd/snapshot {snap_name} && '
-            f'sudo {cont_runtime} run -d --network host -p 2379:2379 -p 2380:2380 '
-            f'-e ETCDCTL_API=3 '
-            f'-v /var/lib/etcd:/var/lib/etcd '
-            f'-v /etc/kubernetes/pki:/etc/kubernetes/pki '
-            f'{etcd_image} etcd '
-            f'--advertise-client-urls=https://{control_plane["internal_address"]}:2379 '
-            f'--cert-file={etcd_cert} '
-            f'--key-file={etcd_key} '
-            f'--trusted-ca-file={etcd_cacert} '
-            f'--client-cert-auth=true '
-            f'--data-dir=/var/lib/etcd '
-            f'--initial-advertise-peer-urls=https://{control_plane["internal_address"]}:2380 '
-            f'--initial-cluster={initial_cluster} '
-            f'--listen-client-urls=https://127.0.0.1:2379,https://{control_plane["internal_address"]}:2379 '
-            f'--listen-peer-urls=https://{control_plane["internal_address"]}:2380 '
-            f'--name={control_plane["name"]} '
-            f'--peer-client-cert-auth=true '
-            f'--peer-cert-file={etcd_peer_cert} '
-            f'--peer-key-file={etcd_peer_key} '
-            f'--peer-trusted-ca-file={etcd_peer_cacert} '
-        ).get_simple_out().strip()
-
-        control_plane_conn.sudo(f'{cont_runtime} logs {etcd_id}', hide=False)
-        etcd_instances += 1
+    # Members are restored and started concurrently on all control planes.
+    cluster.log.debug('Restoring ETCD members...')
+    collector = CollectorCallback(cluster)
+    with cluster.nodes['control-plane'].new_executor() as exe:
+        for node in exe.group.get_ordered_members_list():
+            control_plane_config = node.get_config()
+            name = control_plane_config['name']
+            internal_address = control_plane_config['internal_address']
+            node.sudo(
+                f'chmod 777 {snap_name} && '
+                f'sudo ls -la {snap_name} && '
+                f'sudo etcdctl snapshot restore {snap_name} '
+                f'--name={name} '
+                f'--data-dir=/var/lib/etcd/snapshot '
+                f'--initial-cluster={initial_cluster} '
+                f'--initial-advertise-peer-urls=https://{internal_address}:2380',
+                callback=collector)
+
+            node.sudo(
+                f'mv /var/lib/etcd/snapshot/member /var/lib/etcd/member && '
+                f'sudo rm -rf /var/lib/etcd/snapshot {snap_name} && '
+                f'ETCD_ID=$(sudo {cont_runtime} run -d --network host -p 2379:2379 -p 2380:2380 '
+                f'-e ETCDCTL_API=3 '
+                f'-v /var/lib/etcd:/var/lib/etcd '
+                f'-v /etc/kubernetes/pki:/etc/kubernetes/pki '
+                f'{etcd_image} etcd '
+                f'--advertise-client-urls=https://{internal_address}:2379 '
+                f'--cert-file={etcd_cert} '
+                f'--key-file={etcd_key} '
+                f'--trusted-ca-file={etcd_cacert} '
+                f'--client-cert-auth=true '
+                f'--data-dir=/var/lib/etcd '
+                f'--initial-advertise-peer-urls=https://{internal_address}:2380 '
+                f'--initial-cluster={initial_cluster} '
+                f'--listen-client-urls=https://127.0.0.1:2379,https://{internal_address}:2379 '
+                f'--listen-peer-urls=https://{internal_address}:2380 '
+                f'--name={name} '
+                f'--peer-client-cert-auth=true '
+                f'--peer-cert-file={etcd_peer_cert} '
+                f'--peer-key-file={etcd_peer_key} '
+                f'--peer-trusted-ca-file={etcd_peer_cacert}) && '
+                f'sudo {cont_runtime} logs $ETCD_ID',
+                callback=collector)
+
+    for control_plane_node in cluster.nodes['control-plane'].get_ordered_members_list():
+        cluster.log.debug('ETCD member %s restored:\n%s'
+                          % (control_plane_node.get_node_name(), collector.result[control_plane_node.get_host()]))
 
     # After restore check db size equal, cluster health and leader elected
     # Checks should be changed
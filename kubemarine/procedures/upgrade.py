@@ -67,7 +67,10 @@ def kubernetes_upgrade(cluster: KubernetesCluster):
     kubernetes.upgrade_other_control_planes(upgrade_group, cluster, **drain_kwargs)
 
     if cluster.nodes.get('worker', []):
-        kubernetes.upgrade_workers(upgrade_group, cluster, **drain_kwargs)
+        batch_size = cluster.procedure_inventory.get('worker_upgrade_batch_size', 1)
+        topology_label = cluster.procedure_inventory.get('worker_upgrade_topology_label')
+        kubernetes.upgrade_workers(upgrade_group, cluster,
+                                   batch_size=batch_size, topology_label=topology_label, **drain_kwargs)
 
     cluster.nodes['control-plane'].get_first_member().sudo('rm -f /etc/kubernetes/nodes-k8s-versions.txt')
     cluster.context['cached_nodes_versions_cleaned'] = True
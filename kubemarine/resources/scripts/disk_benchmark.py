@@ -0,0 +1,77 @@
+# Copyright 2021-2022 NetCracker Technology Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+# Disk benchmark that can be run on both python 2 and 3.
+# The script is for testing purpose only.
+# The first argv parameter is the directory to test. If the directory does not exist, its nearest existing parent is tested.
+# The second argv parameter is the size of each write, that is followed by fdatasync.
+# The third argv parameter is the number of such writes.
+# The fourth argv parameter is the amount of megabytes to write sequentially.
+# The script prints JSON with the tested directory, 99th percentile of fdatasync latency in milliseconds,
+# and sequential write throughput in MB/s.
+
+import json
+import os
+import sys
+import tempfile
+import time
+
+directory = sys.argv[1]
+block_size = int(sys.argv[2])
+writes = int(sys.argv[3])
+sequential_size = int(sys.argv[4])
+
+while not os.path.isdir(directory):
+    directory = os.path.dirname(directory)
+
+
+def measure_fsync(fd):
+    # Write ahead log of etcd appends small records and syncs each of them.
+    block = os.urandom(block_size)
+    latencies = []
+    for _ in range(writes):
+        os.write(fd, block)
+        start = time.time()
+        os.fdatasync(fd)
+        latencies.append((time.time() - start) * 1000)
+    latencies.sort()
+    return latencies[int(round(0.99 * (len(latencies) - 1)))]
+
+
+def measure_throughput(fd):
+    block = os.urandom(1024 * 1024)
+    start = time.time()
+    for _ in range(sequential_size):
+        os.write(fd, block)
+    os.fsync(fd)
+    return sequential_size / (time.time() - start)
+
+
+fd, path = tempfile.mkstemp(dir=directory, prefix='.kubemarine-disk-benchmark-')
+try:
+    fsync_p99 = measure_fsync(fd)
+    os.ftruncate(fd, 0)
+    os.lseek(fd, 0, os.SEEK_SET)
+    throughput = measure_throughput(fd)
+finally:
+    os.close(fd)
+    os.remove(path)
+
+sys.stdout.write(json.dumps({
+    'directory': directory,
+    'fsync_p99': round(fsync_p99, 3),
+    'throughput': round(throughput, 2),
+}) + "\n")
+sys.stdout.flush()
@@ -13,12 +13,13 @@
 # limitations under the License.
 
 # Simple TCP socket listener that can be run on both python 2 and 3,
-# The listener accepts connections sequentially, and suppresses the received data.
+# The listener accepts connections from many clients simultaneously, and suppresses the received data.
 # The script is for testing purpose only.
 # The first argv parameter is the TCP port to listen. The second argv parameter is the ip protocol version.
 
 import socket
 import sys
+import threading
 
 if sys.argv[2] == '6' :
   s = socket.socket(socket.AF_INET6, socket.SOCK_STREAM)
@@ -37,13 +38,21 @@ except socket.error as e:
 
 sys.stdout.write("Listen\n")
 sys.stdout.flush()
-s.listen(1)
+s.listen(128)
+
+
+def suppress(client):
+    try:
+        while True:
+            data = client.recv(1024)
+            if not data:
+                break
+    finally:
+        client.close()
+
 
 while True:
     client, _ = s.accept()
-    while True:
-        data = client.recv(1024)
-        if not data:
-            break
-
-    client.close()
+    t = threading.Thread(target=suppress, args=(client,))
+    t.daemon = True
+    t.start()
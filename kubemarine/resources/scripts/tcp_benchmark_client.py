@@ -0,0 +1,91 @@
+# Copyright 2021-2022 NetCracker Technology Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+# TCP client for the network benchmark that can be run on both python 2 and 3.
+# The script is for testing purpose only.
+# The first and the second argv parameters are the address and the port of the running tcp_benchmark_server.py.
+# The third argv parameter is the size of messages to measure round-trip time.
+# The fourth argv parameter is the number of round-trip time measurements.
+# The fifth argv parameter is the duration of the throughput measurement in seconds.
+# The script prints JSON with throughput in Mbit/s, and 50th and 99th percentiles of round-trip time in milliseconds.
+
+import json
+import os
+import socket
+import sys
+import time
+
+address = sys.argv[1]
+port = int(sys.argv[2])
+message_size = int(sys.argv[3])
+samples = int(sys.argv[4])
+duration = float(sys.argv[5])
+
+
+def percentile(sorted_values, percent):
+    index = int(round(percent / 100.0 * (len(sorted_values) - 1)))
+    return sorted_values[index]
+
+
+def measure_rtt():
+    message = os.urandom(message_size)
+    s = socket.create_connection((address, port), 10)
+    try:
+        s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        s.sendall(b'E')
+        rtt = []
+        for _ in range(samples):
+            start = time.time()
+            s.sendall(message)
+            received = 0
+            while received < message_size:
+                data = s.recv(message_size - received)
+                if not data:
+                    raise Exception("Connection is closed by the server")
+                received += len(data)
+            rtt.append((time.time() - start) * 1000)
+    finally:
+        s.close()
+    return sorted(rtt)
+
+
+def measure_throughput():
+    block = os.urandom(65536)
+    s = socket.create_connection((address, port), 10)
+    try:
+        s.sendall(b'S')
+        start = time.time()
+        while time.time() - start < duration:
+            s.sendall(block)
+        s.shutdown(socket.SHUT_WR)
+        response = b''
+        while not response.endswith(b'\n'):
+            data = s.recv(64)
+            if not data:
+                raise Exception("Connection is closed by the server")
+            response += data
+        elapsed = time.time() - start
+    finally:
+        s.close()
+    return int(response.decode()) * 8 / elapsed / 1000000
+
+
+rtt = measure_rtt()
+sys.stdout.write(json.dumps({
+    'throughput': round(measure_throughput(), 2),
+    'rtt_p50': round(percentile(rtt, 50), 3),
+    'rtt_p99': round(percentile(rtt, 99), 3),
+}) + "\n")
+sys.stdout.flush()
@@ -0,0 +1,83 @@
+# Copyright 2021-2022 NetCracker Technology Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+# TCP server for the network benchmark that can be run on both python 2 and 3.
+# The script is for testing purpose only.
+# The first argv parameter is the TCP port to listen. The second argv parameter is the ip protocol version.
+# The first byte of each connection chooses the mode:
+# "E" - the received data is sent back to measure round-trip time,
+# "S" - the received data is suppressed, and the amount of received bytes is sent back when the client stops sending.
+
+import socket
+import sys
+import threading
+
+if sys.argv[2] == '6':
+    s = socket.socket(socket.AF_INET6, socket.SOCK_STREAM)
+else:
+    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+
+try:
+    s.bind(('', int(sys.argv[1])))
+except socket.error as e:
+    if "Address already in use" in str(e):
+        sys.stdout.write("In use\n")
+        sys.stdout.flush()
+        exit(1)
+    else:
+        raise
+
+sys.stdout.write("Listen\n")
+sys.stdout.flush()
+s.listen(128)
+
+
+def echo(client):
+    client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    while True:
+        data = client.recv(65536)
+        if not data:
+            break
+        client.sendall(data)
+
+
+def sink(client):
+    received = 0
+    while True:
+        data = client.recv(65536)
+        if not data:
+            break
+        received += len(data)
+    client.sendall(("%d\n" % received).encode())
+
+
+def serve(client):
+    try:
+        mode = client.recv(1)
+        if mode == b'E':
+            echo(client)
+        elif mode == b'S':
+            sink(client)
+    except socket.error:
+        pass
+    finally:
+        client.close()
+
+
+while True:
+    client, _ = s.accept()
+    t = threading.Thread(target=serve, args=(client,))
+    t.daemon = True
+    t.start()
@@ -0,0 +1,78 @@
+# Copyright 2021-2022 NetCracker Technology Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# TCP client that checks connections to many addresses and ports in parallel. It can be run on both python 2 and 3.
+# The script is for testing purpose only.
+# The first argv parameter is the file with targets, one "<address> <port>" pair per line.
+# The second argv parameter is the own address of the node. Targets with this address are skipped.
+# The third argv parameter is the size of data to send to each target.
+# The fourth argv parameter is the timeout of each connection in seconds.
+# The fifth argv parameter is the number of simultaneous connections.
+# For each target, the script prints "<address> <port> OK" or "<address> <port> FAIL <reason>".
+
+import os
+import socket
+import sys
+import threading
+
+major_version = sys.version_info.major
+if major_version == 3:
+    import queue
+else:
+    import Queue as queue  # type: ignore[import, no-redef]
+
+targets_file = sys.argv[1]
+own_address = sys.argv[2]
+payload = os.urandom(int(sys.argv[3]))
+timeout = float(sys.argv[4])
+parallelism = int(sys.argv[5])
+
+targets = queue.Queue()  # type: ignore[var-annotated]
+with open(targets_file) as f:
+    for line in f:
+        parts = line.split()
+        if len(parts) == 2 and parts[0] != own_address:
+            targets.put((parts[0], int(parts[1])))
+
+output_lock = threading.Lock()
+
+
+def check():
+    while True:
+        try:
+            address, port = targets.get_nowait()
+        except queue.Empty:
+            return
+
+        try:
+            s = socket.create_connection((address, port), timeout)
+            try:
+                s.sendall(payload)
+            finally:
+                s.close()
+            status = "OK"
+        except Exception as e:
+            status = "FAIL %s" % str(e).replace("\n", " ")
+
+        with output_lock:
+            sys.stdout.write("%s %s %s\n" % (address, port, status))
+
+
+threads = [threading.Thread(target=check) for _ in range(max(1, min(parallelism, targets.qsize())))]
+for t in threads:
+    t.start()
+for t in threads:
+    t.join()
+
+sys.stdout.flush()
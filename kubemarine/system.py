@@ -14,6 +14,7 @@
 
 import configparser
 import io
+import json
 import paramiko
 import re
 import socket
@@ -24,12 +25,12 @@ from dateutil.parser import parse
 from ordered_set import OrderedSet
 
 from kubemarine import selinux, kubernetes, apparmor
-from kubemarine.core import utils, static
+from kubemarine.core import utils, static, cache
 from kubemarine.core.cluster import KubernetesCluster
 from kubemarine.core.executor import RunnersResult, Token, GenericResult, Callback, RawExecutor
 from kubemarine.core.group import (
     GenericGroupResult, RunnersGroupResult, GroupResultException,
-    NodeGroup, DeferredGroup, AbstractGroup, GROUP_RUN_TYPE, CollectorCallback
+    NodeGroup, DeferredGroup, AbstractGroup, GROUP_RUN_TYPE, CollectorCallback, NodeConfig
 )
 from kubemarine.core.annotations import restrict_empty_group
 
@@ -107,8 +108,10 @@ def enrich_kernel_modules(inventory: dict, cluster: KubernetesCluster) -> dict:
     return inventory
 
 
-def fetch_os_versions(cluster: KubernetesCluster) -> RunnersGroupResult:
-    group = cluster.nodes['all'].get_accessible_nodes()
+def fetch_os_versions(cluster: KubernetesCluster, group: NodeGroup = None) -> RunnersGroupResult:
+    if group is None:
+        group = cluster.nodes['all']
+    group = group.get_accessible_nodes()
     '''
     For Red Hat, CentOS, Oracle Linux, and Ubuntu information in /etc/os-release /etc/redhat-release is sufficient but,
     Debian stores the full version in a special file. sed transforms version string, eg 10.10 becomes DEBIAN_VERSION="10.10"  
@@ -118,8 +121,8 @@ def fetch_os_versions(cluster: KubernetesCluster) -> RunnersGroupResult:
         "cat /etc/*elease; cat /etc/debian_version 2> /dev/null | sed 's/\\(.\\+\\)/DEBIAN_VERSION=\"\\1\"/' || true")
 
 
-def detect_os_family(cluster: KubernetesCluster) -> None:
-    results = fetch_os_versions(cluster)
+def detect_os_family(cluster: KubernetesCluster, group: NodeGroup = None) -> None:
+    results = fetch_os_versions(cluster, group)
 
     for host, result in results.items():
         stdout = result.stdout.lower()
@@ -583,8 +586,10 @@ def verify_system(cluster: KubernetesCluster) -> None:
         log.debug('Modprobe verification skipped - origin setup task was not completed')
 
 
-def detect_active_interface(cluster: KubernetesCluster) -> None:
-    group = cluster.nodes['all'].get_accessible_nodes()
+def detect_active_interface(cluster: KubernetesCluster, group: NodeGroup = None) -> None:
+    if group is None:
+        group = cluster.nodes['all']
+    group = group.get_accessible_nodes()
     collector = CollectorCallback(cluster)
     with group.new_executor() as exe:
         for node in exe.group.get_ordered_members_list():
@@ -646,19 +651,104 @@ def _detect_nodes_access_info(cluster: KubernetesCluster) -> None:
             access_info['sudo'] = "Yes"
 
 
-def whoami(cluster: KubernetesCluster) -> RunnersGroupResult:
+def whoami(cluster: KubernetesCluster, group: NodeGroup = None) -> RunnersGroupResult:
     '''
     Determines different nodes access information, such as if the node is online, ssh credentials are correct, etc.
     '''
     _detect_nodes_access_info(cluster)
 
-    results = cluster.nodes["all"].get_sudo_nodes().sudo("whoami")
+    if group is None:
+        group = cluster.nodes["all"]
+    results = group.get_sudo_nodes().sudo("whoami")
     for host, result in results.items():
         node_ctx = cluster.context['nodes'][host]
         node_ctx['access']['sudo'] = 'Root' if result.stdout.strip() == "root" else 'Yes'
     return results
 
 
+def get_nodes_facts_cache(cluster: KubernetesCluster) -> Optional[cache.DiskCache]:
+    args: dict = cluster.context['execution_arguments']
+    # The cache is stored near the dump directory, and is not used if the dump is disabled.
+    if not args.get('nodes_facts_cache', False) or args.get('disable_dump', True):
+        return None
+
+    cache_config = static.GLOBALS['nodes_facts_cache']
+    return cache.DiskCache(utils.get_cache_dirpath(cluster.context, 'nodes'), cache_config['max_entries'])
+
+
+def _get_node_facts_key(node: NodeConfig) -> str:
+    # The facts depend on the node address, and on the identity used to access the node.
+    identity = {key: node.get(key) for key in ('connect_to', 'internal_address', 'connection_port',
+                                               'username', 'keyfile', 'password', 'gateway')}
+    return cache.make_key(utils.get_version(), identity)
+
+
+def _get_boot_ids(group: NodeGroup) -> Dict[str, str]:
+    results: GenericGroupResult[GenericResult]
+    try:
+        results = group.run('cat /proc/sys/kernel/random/boot_id', warn=True)
+    except GroupResultException as e:
+        results = e.result
+
+    return {host: result.stdout.strip() for host, result in results.items()
+            if not isinstance(result, Exception) and result.exited == 0}
+
+
+def load_cached_nodes_facts(cluster: KubernetesCluster, facts_cache: cache.DiskCache) -> NodeGroup:
+    """
+    Loads the nodes context from the cache for the nodes, whose facts are not expired,
+    and that are not rebooted since the facts were cached.
+
+    :return: group of nodes, whose facts are loaded from the cache
+    """
+    ttl = static.GLOBALS['nodes_facts_cache']['ttl']
+    entries = {}
+    for node in cluster.inventory['nodes']:
+        data = facts_cache.get(_get_node_facts_key(node))
+        if data is None:
+            continue
+        entry = json.loads(data)
+        if time.time() - entry['timestamp'] > ttl:
+            cluster.log.verbose(f"Cached facts of node {node['name']} are expired")
+            continue
+        entries[node['connect_to']] = entry
+
+    if not entries:
+        return cluster.make_group([])
+
+    loaded = []
+    for host, boot_id in _get_boot_ids(cluster.make_group(entries.keys())).items():
+        if boot_id != entries[host]['boot_id']:
+            cluster.log.verbose(f"Node {host} is rebooted since its facts were cached")
+            continue
+        cluster.context['nodes'][host].update(entries[host]['facts'])
+        loaded.append(host)
+
+    cluster.log.debug(f"Facts of nodes {loaded} are loaded from cache")
+    return cluster.make_group(loaded)
+
+
+def store_nodes_facts(cluster: KubernetesCluster, facts_cache: cache.DiskCache, group: NodeGroup) -> None:
+    """
+    Stores the detected context of the specified nodes to the cache.
+    Only the nodes that are accessible with sudo are cached.
+    """
+    group = group.get_sudo_nodes()
+    if group.is_empty():
+        return
+
+    boot_ids = _get_boot_ids(group)
+    timestamp = time.time()
+    for node in cluster.inventory['nodes']:
+        host = node['connect_to']
+        if host not in boot_ids:
+            continue
+        node_context = cluster.context['nodes'][host]
+        facts = {fact: node_context[fact] for fact in ('access', 'active_interface', 'os') if fact in node_context}
+        facts_cache.put(_get_node_facts_key(node),
+                        json.dumps({'timestamp': timestamp, 'boot_id': boot_ids[host], 'facts': facts}))
+
+
 @restrict_empty_group
 def get_nodes_time(group: NodeGroup) -> Tuple[float, Dict[str, float], float]:
     """
@@ -11,11 +11,16 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import hashlib
 import io
+import os
+import tempfile
+import urllib.request
+from contextlib import contextmanager
 from copy import deepcopy
-from typing import Tuple, Optional, Dict, List, Union
+from typing import Tuple, Optional, Dict, List, Union, Iterator
 
-from kubemarine.core import utils, static, errors
+from kubemarine.core import utils, static, errors, cache
 from kubemarine.core.cluster import KubernetesCluster
 from kubemarine.core.group import NodeGroup, RunnersGroupResult
 from kubemarine.core.yaml_merger import default_merger
@@ -321,7 +326,15 @@ def install_thirdparty(filter_group: NodeGroup, destination: str) -> Optional[Ru
     # is destination directory exists?
     remote_commands += 'mkdir -p %s' % destination_directory
 
-    if is_curl:
+    if is_curl and config.get('delivery') == 'deployer':
+        cluster.log.verbose('Installation via download on the deployer node detected')
+        cluster.log.debug(common_group.sudo(remote_commands))
+        remote_commands = ''
+        with _open_thirdparties_cache(cluster) as thirdparties_cache:
+            local_file = _download_thirdparty(cluster, thirdparties_cache, destination, config)
+            # The file is uploaded only to the nodes, where the hash of the existing file does not match.
+            common_group.put(local_file, destination, sudo=True)
+    elif is_curl:
         cluster.log.verbose('Installation via curl download detected')
         if config.get('sha1') is not None:
             cluster.log.verbose('SHA1 hash is defined, it will be used during installation')
@@ -373,6 +386,61 @@ def install_thirdparty(filter_group: NodeGroup, destination: str) -> Optional[Ru
     return common_group.sudo(remote_commands)
 
 
+@contextmanager
+def _open_thirdparties_cache(cluster: KubernetesCluster) -> Iterator[cache.DiskCache]:
+    max_entries = static.GLOBALS['thirdparties_cache']['max_entries']
+    # The cache is stored near the dump directory. If the dump is disabled, the files are downloaded to temporary directory.
+    if not cluster.context['execution_arguments'].get('disable_dump', True):
+        yield cache.DiskCache(utils.get_cache_dirpath(cluster.context, 'thirdparties'), max_entries)
+    else:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            yield cache.DiskCache(tmp_dir, max_entries)
+
+
+def _download_thirdparty(cluster: KubernetesCluster, thirdparties_cache: cache.DiskCache,
+                         destination: str, config: dict) -> str:
+    """
+    Downloads the thirdparty to the content-addressed cache on the deployer node.
+    If SHA1 hash of the thirdparty is specified, and the file with such hash is already cached, it is not downloaded again.
+
+    :return: path to the cached file
+    """
+    source: str = config['source']
+    expected_sha1: Optional[str] = config.get('sha1')
+    if expected_sha1 is not None:
+        cached_file = thirdparties_cache.get_file(expected_sha1)
+        if cached_file is not None:
+            cluster.log.verbose(f'Thirdparty {destination!r} is found in cache {cached_file}')
+            return cached_file
+
+    cluster.log.verbose(f'Downloading thirdparty {destination!r} from {source} on the deployer node...')
+    tmp_file = thirdparties_cache.mkstemp()
+    try:
+        sha1 = hashlib.sha1()
+        with urllib.request.urlopen(source, timeout=cluster.inventory['globals']['timeout_download']) as response, \
+                open(tmp_file, 'wb') as file:
+            while True:
+                data = response.read(2 ** 20)
+                if not data:
+                    break
+                sha1.update(data)
+                file.write(data)
+
+        actual_sha1 = sha1.hexdigest()
+        if expected_sha1 is not None and actual_sha1 != expected_sha1:
+            raise Exception(f"SHA1 hash {actual_sha1} of thirdparty {destination!r} downloaded from {source} "
+                            f"does not match the expected {expected_sha1}")
+
+        cached_file = thirdparties_cache.put_file(actual_sha1, tmp_file)
+    except BaseException:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        raise
+
+    cluster.log.verbose(f'Thirdparty {destination!r} is downloaded to {cached_file}')
+    return cached_file
+
+
 def install_all_thirparties(group: NodeGroup) -> None:
     cluster: KubernetesCluster = group.cluster
     log = cluster.log
@@ -0,0 +1,117 @@
+# Copyright 2021-2023 NetCracker Technology Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import io
+import os
+import random
+import tempfile
+import time
+import unittest
+import zlib
+
+from kubemarine.core import chunkstore
+
+
+class TestChunker(unittest.TestCase):
+    def setUp(self):
+        self.chunker = chunkstore.Chunker(64, 256, 1024)
+        self.data = bytes(random.Random(0).getrandbits(8) for _ in range(100000))
+
+    def test_chunks_sizes(self):
+        chunks = list(self.chunker.split(io.BytesIO(self.data)))
+        self.assertEqual(self.data, b''.join(chunks))
+        for chunk in chunks[:-1]:
+            self.assertTrue(64 <= len(chunk) <= 1024, f"Unexpected size of chunk {len(chunk)}")
+
+    def test_insertion_changes_only_neighbouring_chunks(self):
+        original = list(self.chunker.split(io.BytesIO(self.data)))
+        changed = list(self.chunker.split(io.BytesIO(self.data[:50000] + b'inserted' + self.data[50000:])))
+
+        new_chunks = set(changed) - set(original)
+        self.assertTrue(0 < len(new_chunks) <= 3, f"Too many chunks are changed: {len(new_chunks)}")
+
+    def test_empty_stream(self):
+        self.assertEqual([], list(self.chunker.split(io.BytesIO(b''))))
+
+    def test_throughput(self):
+        chunker = chunkstore.Chunker(262144, 1048576, 4194304)
+        data = os.urandom(32 * 1024 * 1024)
+        started = time.time()
+        chunks = sum(1 for _ in chunker.split(io.BytesIO(data)))
+        duration = time.time() - started
+
+        self.assertTrue(8 <= chunks <= 128, f"Unexpected number of chunks {chunks}")
+        # Rough check that the data is not processed byte by byte in Python, which gives only several MB/s.
+        self.assertLess(duration, 32 / 20, f"Chunking is too slow: {32 / duration:.1f} MB/s")
+
+
+class TestChunkStore(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.source = os.path.join(self.tmpdir.name, 'source')
+        self.chunker = chunkstore.Chunker(64, 256, 1024)
+        self.data = bytes(random.Random(0).getrandbits(8) for _ in range(100000))
+        self._write('etcd.db', self.data)
+        self._write('nodes_data/node-1.tar.gz', b'node data')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _write(self, relpath: str, data: bytes):
+        path = os.path.join(self.source, relpath)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as file:
+            file.write(data)
+
+    def _put(self, name: str):
+        repository = chunkstore.ChunkStore(os.path.join(self.tmpdir.name, 'repository'))
+        return repository, repository.put_snapshot(name, self.source, self.chunker)
+
+    def test_restore_snapshot(self):
+        _, snapshot = self._put('first')
+        self.assertTrue(chunkstore.is_snapshot(snapshot))
+
+        target = os.path.join(self.tmpdir.name, 'target')
+        chunkstore.open_for_snapshot(snapshot).restore_snapshot(snapshot, target)
+
+        with open(os.path.join(target, 'etcd.db'), 'rb') as file:
+            self.assertEqual(self.data, file.read())
+        with open(os.path.join(target, 'nodes_data', 'node-1.tar.gz'), 'rb') as file:
+            self.assertEqual(b'node data', file.read())
+
+    def test_repeated_snapshot_writes_only_new_chunks(self):
+        first_repository, _ = self._put('first')
+        self._write('etcd.db', self.data[:50000] + b'changed' + self.data[50007:])
+        second_repository, snapshot = self._put('second')
+
+        self.assertTrue(0 < second_repository.written_chunks <= 3)
+        self.assertEqual(first_repository.total_chunks, second_repository.total_chunks)
+        self.assertEqual(b'node data', second_repository.read_file(snapshot, 'nodes_data/node-1.tar.gz'))
+
+    def test_corrupted_chunk(self):
+        repository, snapshot = self._put('first')
+        chunks_dir = os.path.join(repository.chunks_path, os.listdir(repository.chunks_path)[0])
+        chunk_path = os.path.join(chunks_dir, os.listdir(chunks_dir)[0])
+        with open(chunk_path, 'rb') as file:
+            data = file.read()
+        with open(chunk_path, 'wb') as file:
+            # Valid compressed data of the different content
+            file.write(zlib.compress(data))
+
+        with self.assertRaisesRegex(Exception, 'is corrupted'):
+            repository.restore_snapshot(snapshot, os.path.join(self.tmpdir.name, 'target'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -14,9 +14,13 @@
 # limitations under the License.
 
 
+import logging
+import tempfile
 import unittest
+from unittest import mock
 
-from kubemarine import demo
+from kubemarine import demo, system
+from kubemarine.core import utils, log, static
 from kubemarine.demo import FakeKubernetesCluster
 
 
@@ -100,3 +104,90 @@ class KubernetesClusterTest(unittest.TestCase):
 
 if __name__ == '__main__':
     unittest.main()
+
+
+class NodesFactsCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.inventory = demo.generate_inventory(**demo.MINIHA)
+        utils.prepare_dump_directory(self.tmpdir.name)
+
+    def tearDown(self):
+        logger = logging.getLogger("k8s.fake.local")
+        for h in logger.handlers:
+            if isinstance(h, log.FileHandlerWithHeader):
+                h.close()
+        self.tmpdir.cleanup()
+
+    def _new_cluster(self, args: list = None):
+        context = demo.create_silent_context(args)
+        execution_args = context['execution_arguments']
+        execution_args['disable_dump'] = False
+        execution_args['dump_location'] = self.tmpdir.name
+        return demo.new_cluster(self.inventory, context=context)
+
+    def _add_boot_id(self, cluster, boot_ids: dict):
+        results = {host: demo.create_result(stdout=boot_id) for host, boot_id in boot_ids.items()}
+        cluster.fake_shell.add(results, 'run', ['cat /proc/sys/kernel/random/boot_id'])
+
+    def _boot_id_checked(self, cluster) -> bool:
+        return any(cluster.fake_shell.is_called(host, 'run', ['cat /proc/sys/kernel/random/boot_id'])
+                   for host in cluster.nodes['all'].get_hosts())
+
+    def _store_facts(self):
+        cluster = self._new_cluster(['--nodes-facts-cache'])
+        facts_cache = system.get_nodes_facts_cache(cluster)
+        self._add_boot_id(cluster, {host: 'boot-1' for host in cluster.nodes['all'].get_hosts()})
+        system.store_nodes_facts(cluster, facts_cache, cluster.nodes['all'])
+        return cluster
+
+    def _load_facts(self, boot_ids: dict):
+        cluster = self._new_cluster(['--nodes-facts-cache'])
+        for host in cluster.nodes['all'].get_hosts():
+            cluster.context['nodes'][host] = {}
+        self._add_boot_id(cluster, boot_ids)
+        loaded = system.load_cached_nodes_facts(cluster, system.get_nodes_facts_cache(cluster))
+        return cluster, loaded
+
+    def test_cache_disabled_by_default(self):
+        self.assertIsNone(system.get_nodes_facts_cache(self._new_cluster()))
+
+    def test_facts_loaded(self):
+        stored_cluster = self._store_facts()
+        hosts = stored_cluster.nodes['all'].get_hosts()
+        cluster, loaded = self._load_facts({host: 'boot-1' for host in hosts})
+
+        self.assertEqual(cluster.nodes['all'], loaded)
+        for host in hosts:
+            self.assertEqual(stored_cluster.context['nodes'][host]['os'], cluster.context['nodes'][host]['os'])
+            self.assertEqual(stored_cluster.context['nodes'][host]['access'], cluster.context['nodes'][host]['access'])
+
+    def test_rebooted_node_not_loaded(self):
+        hosts = self._store_facts().nodes['all'].get_hosts()
+        boot_ids = {host: 'boot-1' for host in hosts}
+        boot_ids[hosts[0]] = 'boot-2'
+        cluster, loaded = self._load_facts(boot_ids)
+
+        self.assertEqual(cluster.make_group(hosts[1:]), loaded)
+        self.assertEqual({}, cluster.context['nodes'][hosts[0]])
+
+    def test_expired_facts_not_loaded(self):
+        hosts = self._store_facts().nodes['all'].get_hosts()
+        with mock.patch.dict(static.GLOBALS['nodes_facts_cache'], {'ttl': -1}):
+            cluster, loaded = self._load_facts({host: 'boot-1' for host in hosts})
+
+        self.assertTrue(loaded.is_empty())
+        self.assertFalse(self._boot_id_checked(cluster))
+
+    def test_detect_nodes_context_from_cache(self):
+        hosts = self._store_facts().nodes['all'].get_hosts()
+        cluster = self._new_cluster(['--nodes-facts-cache'])
+        for host in hosts:
+            cluster.context['nodes'][host] = {}
+        # Other commands are not registered in the fake shell and fail if executed
+        self._add_boot_id(cluster, {host: 'boot-1' for host in hosts})
+        nodes_context = cluster.detect_nodes_context()
+
+        self.assertTrue(self._boot_id_checked(cluster), "Boot ID should be checked for the cached nodes")
+        for host in hosts:
+            self.assertEqual('rhel', nodes_context[host]['os']['family'])
@@ -0,0 +1,65 @@
+# Copyright 2021-2023 NetCracker Technology Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+from kubemarine.core.connections import ConnectionPool, GatewayConnection
+
+
+def generate_inventory(nodes: int, gateways: int = 1, max_tunnels: int = None) -> dict:
+    inventory: dict = {'nodes': [], 'gateway_nodes': []}
+    for i in range(gateways):
+        gateway = {'name': f'gateway-{i}', 'address': f'10.102.0.{i + 1}',
+                   'username': 'root', 'keyfile': '/dev/null'}
+        if max_tunnels is not None:
+            gateway['max_tunnels_per_connection'] = max_tunnels
+        inventory['gateway_nodes'].append(gateway)
+
+    for i in range(nodes):
+        inventory['nodes'].append({'name': f'node-{i}', 'connect_to': f'10.101.0.{i + 1}',
+                                   'keyfile': '/dev/null', 'gateway': f'gateway-{i % gateways}'})
+
+    return inventory
+
+
+class TestGatewayConnections(unittest.TestCase):
+    def test_gateway_connection_shared(self):
+        pool = ConnectionPool(generate_inventory(nodes=5))
+        gateways = {id(pool.get_connection(f'10.101.0.{i + 1}').gateway) for i in range(5)}
+        self.assertEqual(1, len(gateways), "Gateway connection should be shared between nodes")
+
+        gateway = pool.get_connection('10.101.0.1').gateway
+        self.assertIsInstance(gateway, GatewayConnection)
+        self.assertEqual('10.102.0.1', gateway.host)
+        self.assertEqual(5, gateway.tunnels)
+
+    def test_different_gateways_not_shared(self):
+        pool = ConnectionPool(generate_inventory(nodes=4, gateways=2))
+        self.assertIs(pool.get_connection('10.101.0.1').gateway, pool.get_connection('10.101.0.3').gateway)
+        self.assertIsNot(pool.get_connection('10.101.0.1').gateway, pool.get_connection('10.101.0.2').gateway)
+
+    def test_max_tunnels_per_connection(self):
+        pool = ConnectionPool(generate_inventory(nodes=5, max_tunnels=2))
+        gateways = [pool.get_connection(f'10.101.0.{i + 1}').gateway for i in range(5)]
+        self.assertEqual(3, len({id(gateway) for gateway in gateways}))
+        self.assertEqual([2, 2, 1], [gateway.tunnels for gateway in pool._gateway_connections['gateway-0']])
+
+    def test_connection_cached(self):
+        pool = ConnectionPool(generate_inventory(nodes=1))
+        self.assertIs(pool.get_connection('10.101.0.1'), pool.get_connection('10.101.0.1'))
+        self.assertEqual(1, pool.get_connection('10.101.0.1').gateway.tunnels)
+
+
+if __name__ == '__main__':
+    unittest.main()
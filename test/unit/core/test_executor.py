@@ -14,13 +14,19 @@
 import io
 import os
 import tempfile
+import threading
+import time
 import unittest
+from unittest import mock
 
 from concurrent.futures import TimeoutError
 
 from kubemarine import demo
-from kubemarine.core.executor import RunnersResult, UnexpectedExit
+from kubemarine.core import static
+from kubemarine.core.connections import OutputConsumer
+from kubemarine.core.executor import RunnersResult, UnexpectedExit, _BatchOutputParser
 from kubemarine.core.group import GroupException, RemoteGroupException, CollectorCallback
+from test.unit import utils as test_utils
 
 
 class RemoteExecutorTest(unittest.TestCase):
@@ -360,6 +366,212 @@ class RemoteExecutorTest(unittest.TestCase):
             for host in self.cluster.nodes["all"].get_hosts():
                 self.assertEqual('a' * 100000, self.cluster.fake_fs.read(host, '/fake/path'))
 
+    def test_consecutive_puts_merged(self):
+        results = demo.create_nodegroup_result(self.cluster.nodes["all"], stdout="foo\n")
+        self.cluster.fake_shell.add(results, "run", ["echo \"foo\""])
+        with self.cluster.nodes["all"].new_executor() as exe:
+            exe.group.run("echo \"foo\"")
+            for i in range(3):
+                exe.group.put(io.StringIO('test%s' % i), '/fake/path%s' % i)
+            self.assertEqual(2, len(exe._get_callables()), "Consecutive uploads should be merged")
+            exe.flush()
+
+            for host, tokenized_results in exe.get_last_results().items():
+                self.assertEqual(4, len(tokenized_results), "Result should be present for each upload")
+
+        for host in self.cluster.nodes['all'].get_hosts():
+            for i in range(3):
+                self.assertEqual('test%s' % i, self.cluster.fake_fs.read(host, '/fake/path%s' % i))
+
+    def test_pipelined_failure_short_circuits_only_failed_host(self):
+        for pipelined in (False, True):
+            with self.subTest(pipelined=pipelined):
+                cluster = demo.new_cluster(demo.generate_inventory(**demo.FULLHA))
+                group = cluster.nodes["all"]
+                failed_host = group.get_first_member().get_host()
+                results = demo.create_hosts_result(group.get_hosts(), stdout="foo\n")
+                results[failed_host] = demo.create_result(code=1)
+                cluster.fake_shell.add(results, "run", ["echo \"foo\""])
+                results = demo.create_nodegroup_result(group, stdout="bar\n")
+                cluster.fake_shell.add(results, "sudo", ["echo \"bar\""])
+
+                collector = CollectorCallback(cluster)
+                exception = None
+                try:
+                    with group.new_executor(pipelined=pipelined) as exe:
+                        self.assertEqual(pipelined, exe.pipelined)
+                        exe.group.run("echo \"foo\"", callback=collector)
+                        exe.group.sudo("echo \"bar\"", callback=collector)
+                        exe.group.put(io.StringIO('test'), '/fake/path')
+                except RemoteGroupException as exc:
+                    exception = exc
+
+                self.assertIsNotNone(exception, "Exception was not raised")
+                self.assertEqual([failed_host], exception.get_excepted_hosts_list())
+                self.assertNotIn(failed_host, collector.results)
+                self.assertIsNone(cluster.fake_fs.read(failed_host, '/fake/path'))
+                for host in group.exclude_group(cluster.make_group([failed_host])).get_hosts():
+                    self.assertEqual("foo\nbar\n", collector.result[host].stdout)
+                    self.assertEqual('test', cluster.fake_fs.read(host, '/fake/path'))
+
+    def test_pipelined_timeout_stops_hung_host(self):
+        cluster = demo.new_cluster(demo.generate_inventory(**demo.FULLHA))
+        group = cluster.nodes["all"]
+        hung_host = group.get_first_member().get_host()
+        cluster.fake_shell.add(demo.create_nodegroup_result(group, stdout="foo\n"), "run", ["echo \"foo\""])
+        cluster.fake_shell.add(demo.create_nodegroup_result(group, stdout="baz\n"), "run", ["echo \"baz\""])
+
+        released = threading.Event()
+
+        def hang(host: str, command: str):
+            if command != "sleep 10":
+                return None
+            if host == hung_host:
+                released.wait(10)
+            return demo.create_result(stdout="bar\n")
+
+        cluster.fake_shell.add_handler("sudo", hang)
+
+        exception = None
+        exe = group.new_executor(timeout=1, pipelined=True)
+        try:
+            with exe:
+                foo = exe.group.run("echo \"foo\"")
+                bar = exe.group.sudo("sleep 10")
+                baz = exe.group.run("echo \"baz\"")
+        except RemoteGroupException as exc:
+            exception = exc
+        finally:
+            released.set()
+
+        self.assertIsNotNone(exception, "Exception was not raised")
+        self.assertEqual([hung_host], exception.get_excepted_hosts_list())
+
+        hung_results = exe.get_last_results()[hung_host]
+        self.assertEqual("foo\n", hung_results[foo].stdout)
+        self.assertIsInstance(hung_results[bar], TimeoutError, "Timeout should be assigned to the hung command")
+        self.assertNotIn(baz, hung_results)
+        for host in group.exclude_group(cluster.make_group([hung_host])).get_hosts():
+            self.assertEqual("baz\n", exe.get_last_results()[host][baz].stdout)
+
+        # Let the released worker finish the hung command.
+        time.sleep(0.5)
+        self.assertFalse(cluster.fake_shell.is_called(hung_host, "run", ["echo \"baz\""]),
+                         "Queued commands should not be performed after the flush is finished")
+
+    def test_pipelined_timeout_not_spent_in_queue(self):
+        cluster = demo.new_cluster(demo.generate_inventory(**demo.FULLHA))
+        group = cluster.nodes["all"]
+
+        def sleep(host: str, command: str):
+            if command != "sleep 0.6":
+                return None
+            time.sleep(0.6)
+            return demo.create_result()
+
+        cluster.fake_shell.add_handler("run", sleep)
+
+        # One worker performs the actions of all hosts one by one.
+        # The actions waiting in the queue should not be timed out, even if they wait longer than the timeout.
+        with mock.patch.dict(static.GLOBALS['connection'], {'max_parallel_sessions': 1}), \
+                group.new_executor(timeout=1, pipelined=True) as exe:
+            exe.group.run("sleep 0.6")
+
+        for host in group.get_hosts():
+            self.assertEqual(["sleep 0.6"], cluster.fake_shell.handled[host])
+
+    def test_pipelined_disabled_by_default(self):
+        with self.cluster.nodes["all"].new_executor() as exe:
+            self.assertFalse(exe.pipelined)
+
+    def test_owned_stdout_not_kept_in_result(self):
+        class Consumer(OutputConsumer):
+            def __init__(self):
+                self.stdout = ''
+
+            def consume(self, data: str, stderr: bool) -> None:
+                if not stderr:
+                    self.stdout += data
+
+        node = self.cluster.nodes["all"].get_first_member()
+        results = demo.create_nodegroup_result(node, stdout="large output\n", stderr="warning\n")
+        self.cluster.fake_shell.add(results, "run", ["cat large"])
+
+        consumer = Consumer()
+        result = node.run("cat large", watchers=[consumer])[node.get_host()]
+        self.assertEqual("large output\n", consumer.stdout)
+        self.assertEqual("", result.stdout)
+        self.assertEqual("warning\n", result.stderr)
+
+    def test_executors_share_cluster_worker_pool(self):
+        results = demo.create_nodegroup_result(self.cluster.nodes["all"], stdout="foo\n")
+        self.cluster.fake_shell.add(results, "run", ["echo \"foo\""])
+
+        worker_pool = self.cluster.worker_pool
+        for _ in range(3):
+            with self.cluster.nodes["all"].new_executor() as exe:
+                self.assertIs(worker_pool, exe.worker_pool)
+                exe.group.run("echo \"foo\"")
+
+        self.cluster.nodes["all"].run("echo \"foo\"")
+        self.assertIs(worker_pool, self.cluster.worker_pool)
+
+    def test_limited_parallel_sessions(self):
+        with test_utils.backup_globals():
+            static.GLOBALS['connection']['max_parallel_sessions'] = 2
+            cluster = demo.new_cluster(demo.generate_inventory(**demo.FULLHA))
+            results = demo.create_nodegroup_result(cluster.nodes["all"], stdout="foo\n")
+            cluster.fake_shell.add(results, "run", ["echo \"foo\""])
+
+            collector = CollectorCallback(cluster)
+            cluster.nodes["all"].run("echo \"foo\"", callback=collector)
+            self.assertEqual(set(cluster.nodes["all"].get_hosts()), set(collector.result.keys()))
+            self.assertEqual(2, cluster.worker_pool._max_workers)
+
+
+class BatchOutputParserTest(unittest.TestCase):
+    def setUp(self):
+        self.cluster = demo.new_cluster(demo.generate_inventory(**demo.ALLINONE))
+        self.host = self.cluster.nodes['all'].get_host()
+        self.separator = '_' * 32
+        self.collector = CollectorCallback(self.cluster)
+        commands = ['echo foo', 'echo bar', 'false']
+        self.payloads = [(('run', (command,), {}), self.collector, token) for token, command in enumerate(commands)]
+
+    def _merged_output(self):
+        sep = self.separator
+        stdout = f"foo\n{sep}\n0\n{sep}\nbar\n{sep}\n0\n{sep}\n"
+        stderr = f"{sep}\nerror bar\n{sep}\nfailed"
+        return stdout, stderr
+
+    def _chunks(self, data: str, size: int):
+        return [data[i:i + size] for i in range(0, len(data), size)]
+
+    def test_parse_chunked_output(self):
+        stdout, stderr = self._merged_output()
+        for size in (1, 2, 7, 33, 1000):
+            parser = _BatchOutputParser(self.separator, self.host, self.payloads)
+            for chunk in self._chunks(stdout, size):
+                parser.consume(chunk, False)
+            for chunk in self._chunks(stderr, size):
+                parser.consume(chunk, True)
+
+            self.assertEqual(2, parser.accepted, "Callbacks should be called for all exited commands")
+            results = parser.finish(1)
+            self.assertEqual(['foo\n', 'bar\n', ''], [r.stdout for r in results])
+            self.assertEqual(['', 'error bar\n', 'failed'], [r.stderr for r in results])
+            self.assertEqual([0, 0, 1], [r.exited for r in results])
+            self.assertEqual(['echo foo', 'echo bar', 'false'], [r.command for r in results])
+
+    def test_callback_called_before_batch_exited(self):
+        sep = self.separator
+        parser = _BatchOutputParser(self.separator, self.host, self.payloads)
+        parser.consume(f"foo\n{sep}\n0\n{sep}\nbar", False)
+        self.assertEqual(0, parser.accepted, "Stderr of the first command is not yet completed")
+        parser.consume(f"{sep}\n", True)
+        self.assertEqual(1, parser.accepted)
+        self.assertEqual('foo\n', self.collector.results[self.host][0].stdout)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -16,6 +16,7 @@ import os
 import random
 import re
 import socket
+import threading
 import unittest
 import ast
 from copy import deepcopy
@@ -407,5 +408,84 @@ class FlowTest(unittest.TestCase):
         self.light_fake_shell.add(results, do_type, command, usage_limit=1)
 
 
+class ConcurrentTasksTest(unittest.TestCase):
+    def setUp(self):
+        self.cluster = demo.new_cluster(demo.generate_inventory(**demo.ALLINONE))
+        flow.init_tasks_flow(self.cluster)
+        self.events = []
+        self.lock = threading.Lock()
+
+    def _event(self, event: str):
+        with self.lock:
+            self.events.append(event)
+
+    def _task(self, name: str, barrier: threading.Barrier = None, fail=False):
+        def task(_):
+            self._event(f"start {name}")
+            if barrier is not None:
+                barrier.wait()
+            if fail:
+                raise Exception(f"{name} failed")
+            self._event(f"end {name}")
+
+        return task
+
+    def _run(self, tasks_: dict, concurrent_tasks: dict, cumulative_points: dict = None):
+        final_task_names = flow.get_task_list(tasks_)
+        flow.run_tasks_recursive(tasks_, final_task_names, self.cluster, cumulative_points or {}, [],
+                                 concurrent_tasks=concurrent_tasks)
+
+    def test_concurrent_tasks_overlap(self):
+        barrier = threading.Barrier(3, timeout=10)
+        tasks_ = {
+            "first": self._task("first"),
+            "group": {"a": self._task("a", barrier), "b": self._task("b", barrier), "c": self._task("c", barrier)},
+            "last": self._task("last"),
+        }
+        self._run(tasks_, {"group": flow.ConcurrentTask()})
+
+        self.assertEqual(["start first", "end first"], self.events[:2])
+        self.assertEqual(["start last", "end last"], self.events[-2:])
+        proceeded_tasks = self.cluster.context["proceeded_tasks"]
+        self.assertEqual("first", proceeded_tasks[0])
+        self.assertEqual(["group.a", "group.b", "group.c"], sorted(proceeded_tasks[1:4]))
+        self.assertEqual("last", proceeded_tasks[4])
+
+    def test_locks_and_dependencies_serialize(self):
+        tasks_ = {"a": self._task("a"), "b": self._task("b"), "c": self._task("c")}
+        self._run(tasks_, {
+            "a": flow.ConcurrentTask(locks=["package_manager"]),
+            "b": flow.ConcurrentTask(locks=["package_manager"]),
+            "c": flow.ConcurrentTask(after=["b"]),
+        })
+        self.assertEqual(["start a", "end a", "start b", "end b", "start c", "end c"], self.events)
+
+    def test_cumulative_point_waits_running_tasks(self):
+        def point(_):
+            self._event("point")
+
+        tasks_ = {"a": self._task("a"), "b": self._task("b")}
+        self.cluster.schedule_cumulative_point(point)
+        self._run(tasks_, {"a": flow.ConcurrentTask(), "b": flow.ConcurrentTask()}, {point: ["b"]})
+        self.assertEqual(["start a", "end a", "point", "start b", "end b"], self.events)
+
+    def test_failed_task_stops_flow(self):
+        barrier = threading.Barrier(2, timeout=10)
+        tasks_ = {"a": self._task("a", barrier, fail=True), "b": self._task("b", barrier), "c": self._task("c")}
+        with self.assertRaisesRegex(errors.FailException, "TASK FAILED a"):
+            self._run(tasks_, {"a": flow.ConcurrentTask(), "b": flow.ConcurrentTask()})
+
+        self.assertEqual({"start a", "start b", "end b"}, set(self.events))
+        self.assertEqual(["b"], self.cluster.context["proceeded_tasks"])
+
+    def test_max_parallel_tasks(self):
+        tasks_ = {"a": self._task("a"), "b": self._task("b")}
+        with test_utils.backup_globals():
+            static.GLOBALS['flow']['max_parallel_tasks'] = 1
+            self._run(tasks_, {"a": flow.ConcurrentTask(), "b": flow.ConcurrentTask()})
+
+        self.assertEqual(["start a", "end a", "start b", "end b"], self.events)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,93 @@
+# Copyright 2021-2023 NetCracker Technology Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+from unittest import mock
+
+from kubemarine import demo
+from kubemarine.core import flow, tracing
+from kubemarine.core.action import Action
+from kubemarine.core.resources import DynamicResources
+
+
+class TheAction(Action):
+    def __init__(self):
+        super().__init__('test')
+
+    def run(self, res: DynamicResources):
+        res.cluster().nodes['all'].sudo('whoami')
+
+
+class TracingTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.inventory = demo.generate_inventory(**demo.MINIHA)
+        self.hosts = [node["address"] for node in self.inventory["nodes"]]
+        self.fake_shell = demo.FakeShell()
+        self.fake_shell.add(demo.create_hosts_result(self.hosts, stdout='root'), 'sudo', ['whoami'])
+
+    def _run_flow(self, args: list):
+        context = demo.create_silent_context(args)
+        res = demo.FakeResources(context, self.inventory,
+                                 nodes_context=demo.generate_nodes_context(self.inventory),
+                                 fake_shell=self.fake_shell)
+        with mock.patch.object(tracing, tracing.report.__name__) as report:
+            flow.ActionsFlow([TheAction()]).run_flow(res, print_summary=False)
+
+        self.assertIsNone(tracing.TRACER, "Tracing should be stopped after the flow is finished")
+        return report
+
+    def test_trace_disabled(self):
+        report = self._run_flow([])
+        report.assert_not_called()
+
+    def test_trace_commands_and_enrichment(self):
+        report = self._run_flow(['--trace'])
+        report.assert_called_once()
+        tracer: tracing.Tracer = report.call_args[0][1]
+
+        commands = tracer.get_spans(tracing.COMMAND)
+        self.assertEqual(set(self.hosts), {span.args['host'] for span in commands})
+        for span in commands:
+            self.assertEqual('sudo', span.name)
+            self.assertEqual(len('whoami'), span.args['bytes_out'])
+            self.assertGreaterEqual(span.duration, span.args['exec_time'])
+
+        self.assertTrue(tracer.get_spans(tracing.FLUSH))
+        self.assertTrue(tracer.get_spans(tracing.ENRICHMENT))
+
+        summary = tracer.make_summary(10)
+        self.assertIn('Slowest hosts:', summary)
+        self.assertEqual(len(self.hosts), len(summary) - summary.index('Slowest hosts:') - 2)
+
+    def test_trace_tasks(self):
+        cluster = demo.new_cluster(self.inventory)
+        flow.init_tasks_flow(cluster)
+        tasks = {"deploy": {"first": lambda c: None, "second": lambda c: None}}
+
+        tracing.start()
+        try:
+            flow.run_tasks_recursive(tasks, ["deploy.first", "deploy.second"], cluster, {}, [])
+        finally:
+            tracer = tracing.stop()
+
+        self.assertEqual(["deploy.first", "deploy.second"], [span.name for span in tracer.get_spans(tracing.TASK)])
+
+        chrome_trace = tracer.to_chrome_trace()
+        events = [event for event in chrome_trace['traceEvents'] if event['ph'] == 'X']
+        self.assertEqual(["deploy.first", "deploy.second"], [event['name'] for event in events])
+        self.assertTrue(all(event['cat'] == tracing.TASK for event in events))
+
+
+if __name__ == '__main__':
+    unittest.main()
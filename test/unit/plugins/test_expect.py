@@ -0,0 +1,177 @@
+# Copyright 2021-2022 NetCracker Technology Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import json
+import unittest
+from unittest import mock
+
+from kubemarine import demo, plugins
+from kubemarine.kubernetes.daemonset import DaemonSet
+from kubemarine.kubernetes.deployment import Deployment
+
+
+def pod_event(name: str, ready: bool, event_type='MODIFIED', waiting_reason: str = None) -> str:
+    state = {'running': {}} if waiting_reason is None else {'waiting': {'reason': waiting_reason}}
+    return json.dumps({'type': event_type, 'object': {
+        'kind': 'Pod',
+        'metadata': {'name': name, 'namespace': 'kube-system'},
+        'spec': {'nodeName': 'k8s-control-plane-1'},
+        'status': {'containerStatuses': [{'name': 'container', 'ready': ready, 'state': state}]}
+    }}, indent=4) + '\n'
+
+
+class ExpectPods(unittest.TestCase):
+    def setUp(self):
+        self.cluster = demo.new_cluster(demo.generate_inventory(**demo.ALLINONE))
+        self.watcher = plugins._PodsWatcher(self.cluster, ['coredns', 'calico-node'])
+
+    def consume_by_chunks(self, stdout: str, chunk_size=7):
+        for i in range(0, len(stdout), chunk_size):
+            self.watcher.consume(stdout[i:i + chunk_size], False)
+
+    def test_ready_as_soon_as_all_pods_ready(self):
+        self.consume_by_chunks(pod_event('coredns-5d78c9869d-8xzmw', True, 'ADDED')
+                               + pod_event('calico-node-4k8xp', False, 'ADDED'))
+        self.assertFalse(self.watcher.stopped)
+
+        self.consume_by_chunks(pod_event('calico-node-4k8xp', True))
+        self.assertTrue(self.watcher.ready)
+        self.assertTrue(self.watcher.stopped)
+
+    def test_not_requested_pods_ignored(self):
+        self.consume_by_chunks(pod_event('coredns-5d78c9869d-8xzmw', True, 'ADDED')
+                               + pod_event('calico-node-4k8xp', True, 'ADDED')
+                               + pod_event('kube-proxy-x9xbs', False, 'ADDED', 'CrashLoopBackOff'))
+        self.assertTrue(self.watcher.ready)
+        self.assertEqual(0, self.watcher.failures)
+
+    def test_deleted_pod_not_tracked(self):
+        self.consume_by_chunks(pod_event('coredns-5d78c9869d-8xzmw', True, 'ADDED')
+                               + pod_event('calico-node-old', False, 'ADDED')
+                               + pod_event('calico-node-new', True, 'ADDED'))
+        self.assertFalse(self.watcher.ready)
+
+        self.consume_by_chunks(pod_event('calico-node-old', False, 'DELETED'))
+        self.assertTrue(self.watcher.ready)
+
+    def test_allowed_failures_exceeded(self):
+        self.cluster.globals['pods']['allowed_failures'] = 1
+        self.consume_by_chunks(pod_event('coredns-5d78c9869d-8xzmw', False, 'ADDED', 'ErrImagePull'))
+        self.assertFalse(self.watcher.stopped)
+
+        # The same state of the pod is not counted twice
+        self.consume_by_chunks(pod_event('coredns-5d78c9869d-8xzmw', False, 'MODIFIED', 'ErrImagePull'))
+        self.assertFalse(self.watcher.stopped)
+
+        self.consume_by_chunks(pod_event('coredns-5d78c9869d-8xzmw', False, 'MODIFIED', 'ImagePullBackOff'))
+        self.assertTrue(self.watcher.failed)
+        self.assertTrue(self.watcher.stopped)
+
+    def test_expect_pods_not_streamed_output(self):
+        first_control_plane = self.cluster.nodes['control-plane'].get_first_member()
+        stdout = pod_event('coredns-5d78c9869d-8xzmw', True, 'ADDED') + pod_event('calico-node-4k8xp', True, 'ADDED')
+        results = demo.create_nodegroup_result(first_control_plane, stdout=stdout)
+        self.cluster.fake_shell.add(results, 'sudo', [
+            'timeout 10 kubectl get pods -n kube-system --watch --output-watch-events -o json'
+        ])
+
+        plugins.expect_pods(self.cluster, ['coredns', 'calico-node'], namespace='kube-system',
+                            timeout=1, retries=10)
+
+
+class ExpectWorkloads(unittest.TestCase):
+    def setUp(self):
+        self.cluster = demo.new_cluster(demo.generate_inventory(**demo.ALLINONE))
+        self.control_plane = self.cluster.nodes['control-plane'].get_first_member()
+        self.command = ('kubectl get -n kube-system daemonset/calico-node deployment/coredns --ignore-not-found -o json'
+                        ' ; sudo kubectl get -n ingress-nginx daemonset/ingress-nginx-controller'
+                        ' --ignore-not-found -o json')
+        self.workloads = [
+            DaemonSet(self.cluster, name='calico-node', namespace='kube-system'),
+            DaemonSet(self.cluster, name='ingress-nginx-controller', namespace='ingress-nginx'),
+            Deployment(self.cluster, name='coredns', namespace='kube-system'),
+        ]
+
+    def _daemonset(self, name: str, namespace: str, updated: int) -> dict:
+        return {'kind': 'DaemonSet', 'metadata': {'name': name, 'namespace': namespace},
+                'status': {'desiredNumberScheduled': 2, 'updatedNumberScheduled': updated}}
+
+    def _deployment(self, ready: int) -> dict:
+        return {'kind': 'Deployment', 'metadata': {'name': 'coredns', 'namespace': 'kube-system'},
+                'spec': {'replicas': 2}, 'status': {'updatedReplicas': 2, 'readyReplicas': ready}}
+
+    def _add_status(self, kube_system: list, ingress_nginx: list, usage_limit=0):
+        stdout = json.dumps({'kind': 'List', 'items': kube_system}, indent=4) + '\n'
+        stdout += ''.join(json.dumps(obj, indent=4) + '\n' for obj in ingress_nginx)
+        results = demo.create_nodegroup_result(self.control_plane, stdout=stdout)
+        self.cluster.fake_shell.add(results, 'sudo', [self.command], usage_limit=usage_limit)
+
+    def test_all_kinds_ready_single_call(self):
+        self._add_status([self._daemonset('calico-node', 'kube-system', 2), self._deployment(2)],
+                         [self._daemonset('ingress-nginx-controller', 'ingress-nginx', 2)])
+
+        plugins.expect_workloads(self.cluster, self.workloads, timeout=0, retries=1)
+
+        self.assertEqual(1, len(self.cluster.fake_shell.history_find(self.control_plane.get_host(),
+                                                                     'sudo', [self.command])))
+
+    def test_wait_not_ready_workloads(self):
+        self._add_status([self._daemonset('calico-node', 'kube-system', 1)], [], usage_limit=1)
+        self._add_status([self._daemonset('calico-node', 'kube-system', 2), self._deployment(2)],
+                         [self._daemonset('ingress-nginx-controller', 'ingress-nginx', 2)])
+
+        plugins.expect_workloads(self.cluster, self.workloads, timeout=0, retries=2)
+
+    def test_not_ready_in_expected_time(self):
+        self._add_status([self._daemonset('calico-node', 'kube-system', 2), self._deployment(1)],
+                         [self._daemonset('ingress-nginx-controller', 'ingress-nginx', 2)])
+
+        with self.assertRaisesRegex(Exception, 'In the expected time, the workloads did not become ready'):
+            plugins.expect_workloads(self.cluster, self.workloads, timeout=0, retries=3)
+
+    def test_not_json_output_retried(self):
+        results = demo.create_nodegroup_result(self.control_plane, stdout='{"kind": "List", "items": [')
+        self.cluster.fake_shell.add(results, 'sudo', [self.command], usage_limit=1)
+        self._add_status([self._daemonset('calico-node', 'kube-system', 2), self._deployment(2)],
+                         [self._daemonset('ingress-nginx-controller', 'ingress-nginx', 2)])
+
+        plugins.expect_workloads(self.cluster, self.workloads, timeout=0, retries=2)
+
+
+class ApplyExpect(unittest.TestCase):
+    def test_configured_order(self):
+        cluster = demo.new_cluster(demo.generate_inventory(**demo.ALLINONE))
+        config = {
+            'daemonsets': {'list': ['calico-node']},
+            'pods': {'list': ['coredns']},
+            'deployments': {'list': ['coredns']},
+            'statefulsets': {'list': ['local-path-provisioner']},
+            'replicasets': {'list': ['calico-kube-controllers'], 'timeout': 1, 'retries': 1},
+        }
+        expect = mock.Mock()
+        with mock.patch.object(plugins, 'expect_workloads', new=expect.workloads), \
+                mock.patch.object(plugins, 'expect_pods', new=expect.pods):
+            plugins.apply_expect(cluster, config)
+
+        calls = [(name, [w.kind + '/' + w.name for w in args[1]] if name == 'workloads' else args[1])
+                 for name, args, _ in expect.mock_calls]
+        self.assertEqual([
+            ('workloads', ['daemonset/calico-node']),
+            ('pods', ['coredns']),
+            ('workloads', ['deployment/coredns', 'statefulset/local-path-provisioner']),
+            ('workloads', ['replicaset/calico-kube-controllers']),
+        ], calls)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,337 @@
+# Copyright 2021-2023 NetCracker Technology Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import gzip
+import hashlib
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import yaml
+
+from kubemarine import demo
+from kubemarine.core import flow, static
+from kubemarine.core.group import GroupResultException
+from kubemarine.procedures import backup, restore
+
+
+class ExportNodes(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        context = demo.create_silent_context(['fake_path.yaml'], procedure='backup',
+                                             parser=flow.new_procedure_parser("Help text"))
+        self.cluster = demo.new_cluster(demo.generate_inventory(**demo.MINIHA), context=context,
+                                        procedure_inventory={'backup_plan': {'nodes_parallelism': 2}})
+        self.cluster.context['backup_tmpdir'] = self.tmpdir.name
+        self.command = 'sudo tar -czvf - -P $(sudo readlink -e %s)' \
+                       % ' '.join(backup.get_default_backup_files_list(self.cluster))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _add_archive(self, node, archive: str, code=0, stderr='/etc/hosts\n', usage_limit=0):
+        results = demo.create_nodegroup_result(node, stdout=archive, stderr=stderr, code=code)
+        self.cluster.fake_shell.add(results, 'run', [self.command], usage_limit=usage_limit)
+
+    def _read_archive(self, node_name: str):
+        with open(os.path.join(self.tmpdir.name, 'nodes_data', '%s.tar.gz' % node_name)) as archive:
+            return archive.read()
+
+    def test_archives_streamed_from_all_nodes(self):
+        nodes = self.cluster.nodes['all'].get_ordered_members_list()
+        for node in nodes:
+            self._add_archive(node, 'archive of %s' % node.get_node_name())
+
+        backup.export_nodes(self.cluster)
+
+        for node in nodes:
+            self.assertEqual('archive of %s' % node.get_node_name(), self._read_archive(node.get_node_name()))
+
+    def test_failed_archive_removed(self):
+        nodes = self.cluster.nodes['all'].get_ordered_members_list()
+        self._add_archive(nodes[0], 'partial archive', code=2)
+        for node in nodes[1:]:
+            self._add_archive(node, 'archive')
+
+        with self.assertRaises(GroupResultException) as context:
+            backup.export_nodes(self.cluster)
+
+        self.assertEqual([nodes[0].get_host()], context.exception.get_excepted_hosts_list())
+        self.assertEqual(sorted('%s.tar.gz' % node.get_node_name() for node in nodes[1:]),
+                         sorted(os.listdir(os.path.join(self.tmpdir.name, 'nodes_data'))))
+
+    def test_repository_archives_not_compressed(self):
+        context = demo.create_silent_context(['fake_path.yaml'], procedure='backup',
+                                             parser=flow.new_procedure_parser("Help text"))
+        cluster = demo.new_cluster(demo.generate_inventory(**demo.MINIHA), context=context,
+                                   procedure_inventory={'backup_format': 'repository', 'backup_location': '/fake'})
+        cluster.context['backup_tmpdir'] = self.tmpdir.name
+        command = 'sudo tar -cvf - -P $(sudo readlink -e %s)' % ' '.join(backup.get_default_backup_files_list(cluster))
+        nodes = cluster.nodes['all'].get_ordered_members_list()
+        for node in nodes:
+            results = demo.create_nodegroup_result(node, stdout='archive of %s' % node.get_node_name())
+            cluster.fake_shell.add(results, 'run', [command])
+
+        backup.export_nodes(cluster)
+
+        self.assertEqual(sorted('%s.tar' % node.get_node_name() for node in nodes),
+                         sorted(os.listdir(os.path.join(self.tmpdir.name, 'nodes_data'))))
+
+    def test_retried_archive_rewritten(self):
+        nodes = self.cluster.nodes['all'].get_ordered_members_list()
+        self._add_archive(nodes[0], 'partial archive', code=1, stderr='etcdserver: leader changed', usage_limit=1)
+        for node in nodes:
+            self._add_archive(node, 'archive of %s' % node.get_node_name())
+
+        with mock.patch.dict(static.GLOBALS['workaround'], {'delay_period': 0}):
+            backup.export_nodes(self.cluster)
+
+        for node in nodes:
+            self.assertEqual('archive of %s' % node.get_node_name(), self._read_archive(node.get_node_name()))
+
+
+class EtcdSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.snapshot = os.urandom(100000)
+        self.sha1 = hashlib.sha1(self.snapshot).hexdigest()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_decompress_by_chunks(self):
+        compressed = gzip.compress(self.snapshot)
+        local = io.BytesIO()
+        writer = backup._DecompressingWriter(local)
+        for i in range(0, len(compressed), 1000):
+            writer.consume_bytes(compressed[i:i + 1000])
+
+        self.assertEqual(self.sha1, writer.finish())
+        self.assertEqual(self.snapshot, local.getvalue())
+        self.assertEqual(len(compressed), writer.received)
+
+    def test_restart_discards_consumed(self):
+        compressed = gzip.compress(self.snapshot)
+        local = io.BytesIO()
+        writer = backup._DecompressingWriter(local)
+        writer.consume_bytes(compressed[:1000])
+        writer.restart()
+        writer.consume_bytes(compressed)
+
+        self.assertEqual(self.sha1, writer.finish())
+        self.assertEqual(self.snapshot, local.getvalue())
+
+    def test_truncated_stream(self):
+        writer = backup._DecompressingWriter(io.BytesIO())
+        writer.consume_bytes(gzip.compress(self.snapshot)[:-100])
+        with self.assertRaisesRegex(Exception, 'Compressed stream is truncated'):
+            writer.finish()
+
+    def _verify(self, expected_sha1: str):
+        cluster = demo.new_cluster(demo.generate_inventory(**demo.ALLINONE))
+        cluster.context['backup_tmpdir'] = self.tmpdir.name
+        cluster.context['backup_descriptor'] = {'etcd': {'sha1': expected_sha1}}
+        with open(os.path.join(self.tmpdir.name, 'etcd.db'), 'wb') as snapshot:
+            snapshot.write(self.snapshot)
+
+        restore.verify_etcd_snapshot(cluster)
+
+    def test_verify_snapshot(self):
+        self._verify(self.sha1)
+
+    def test_verify_corrupted_snapshot(self):
+        with self.assertRaisesRegex(Exception, 'The backup is corrupted'):
+            self._verify('0' * 40)
+
+
+class ImportEtcd(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        context = demo.create_silent_context(['fake_path.yaml'], procedure='restore',
+                                             parser=flow.new_procedure_parser("Help text"))
+        self.cluster = demo.new_cluster(demo.generate_inventory(**demo.MINIHA), context=context,
+                                        procedure_inventory={'backup_location': 'fake.tar.gz'})
+        self.cluster.context['backup_tmpdir'] = self.tmpdir.name
+        self.cluster.context['backup_descriptor'] = {'etcd': {'image': 'registry.k8s.io/etcd:3.5.9-0'}}
+        with open(os.path.join(self.tmpdir.name, 'etcd.db'), 'w') as snapshot:
+            snapshot.write('snapshot')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_members_restored_on_all_control_planes(self):
+        # The commands contain the generated path of the uploaded snapshot
+        self.cluster.fake_shell.add_handler('sudo', lambda host, command: demo.create_result(stdout='etcd-id'))
+        with mock.patch('kubemarine.etcd.wait_for_health', return_value=[]):
+            restore.import_etcd(self.cluster)
+
+        for control_plane in self.cluster.nodes['control-plane'].get_ordered_members_list():
+            node_commands = self.cluster.fake_shell.handled[control_plane.get_host()]
+            self.assertEqual(2, len(node_commands))
+            self.assertIn('etcdctl snapshot restore', node_commands[0])
+            self.assertIn(f'--name={control_plane.get_node_name()} ', node_commands[1])
+            self.assertTrue(node_commands[1].endswith('logs $ETCD_ID'))
+
+
+class BackupRepository(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.repository = os.path.join(self.tmpdir.name, 'repository')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _new_cluster(self, procedure: str, procedure_inventory: dict, backup_tmpdir: str):
+        context = demo.create_silent_context(['fake_path.yaml'], procedure=procedure,
+                                             parser=flow.new_procedure_parser("Help text"))
+        cluster = demo.new_cluster(demo.generate_inventory(**demo.ALLINONE), context=context,
+                                   procedure_inventory=procedure_inventory)
+        cluster.context['backup_tmpdir'] = backup_tmpdir
+        os.makedirs(backup_tmpdir, exist_ok=True)
+        return cluster
+
+    def test_pack_and_unpack(self):
+        cluster = self._new_cluster('backup', {'backup_location': self.repository, 'backup_format': 'repository'},
+                                    os.path.join(self.tmpdir.name, 'backup'))
+        backup.verify_backup_location(cluster)
+        with open(os.path.join(self.tmpdir.name, 'backup', 'descriptor.yaml'), 'w') as descriptor:
+            descriptor.write('kubernetes: {}\n')
+        backup.pack_data(cluster)
+
+        snapshots = os.listdir(os.path.join(self.repository, 'snapshots'))
+        self.assertEqual(1, len(snapshots))
+
+        snapshot = os.path.join(self.repository, 'snapshots', snapshots[0])
+        cluster = self._new_cluster('restore', {'backup_location': snapshot},
+                                    os.path.join(self.tmpdir.name, 'restore'))
+        restore.unpack_data(cluster)
+        self.assertEqual({'kubernetes': {}}, cluster.context['backup_descriptor'])
+
+    def test_import_not_compressed_nodes_data(self):
+        cluster = self._new_cluster('restore', {'backup_location': self.repository},
+                                    os.path.join(self.tmpdir.name, 'restore'))
+        node = cluster.nodes['all'].get_first_member()
+        os.makedirs(os.path.join(self.tmpdir.name, 'restore', 'nodes_data'))
+        with open(os.path.join(self.tmpdir.name, 'restore', 'nodes_data', '%s.tar' % node.get_node_name()), 'w') as f:
+            f.write('archive')
+
+        unpack_cmd = "sudo tar xvf /tmp/kubemarine-backup.tar -C / --overwrite"
+        cluster.fake_shell.add(demo.create_nodegroup_result(node), 'sudo', [
+            f"readlink /etc/resolv.conf ; "
+            f"if [ $? -ne 0 ]; then sudo chattr -i /etc/resolv.conf; {unpack_cmd} && sudo chattr +i /etc/resolv.conf; "
+            f"else {unpack_cmd}; fi "])
+
+        restore.import_nodes(cluster)
+        self.assertEqual('archive', cluster.fake_fs.read(node.get_host(), '/tmp/kubemarine-backup.tar'))
+
+    def test_repository_location_required(self):
+        cluster = self._new_cluster('backup', {'backup_format': 'repository'}, os.path.join(self.tmpdir.name, 'backup'))
+        with self.assertRaisesRegex(Exception, 'should be specified explicitly'):
+            backup.verify_backup_location(cluster)
+
+
+def resources_list(*items: dict, indent=4) -> str:
+    return json.dumps({'apiVersion': 'v1', 'items': list(items), 'kind': 'List',
+                       'metadata': {'resourceVersion': ''}}, indent=indent) + '\n'
+
+
+def secret(namespace: str, name: str) -> dict:
+    return {'apiVersion': 'v1', 'kind': 'Secret', 'metadata': {'name': name, 'namespace': namespace},
+            'data': {'key': 'x' * 3000}}
+
+
+class ExportKubernetesClusterWide(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _load(self, *path: str):
+        with open(os.path.join(self.tmpdir.name, *path)) as file:
+            return yaml.safe_load(file)
+
+    def test_split_streamed_list(self):
+        splitter = backup._ResourcesSplitter(self.tmpdir.name, 'secrets', ['default', 'kube-system'])
+        stdout = resources_list(secret('default', 'a'), secret('excluded', 'b'),
+                                secret('kube-system', 'c'), secret('default', 'd'))
+        for i in range(0, len(stdout), 100):
+            splitter.consume(stdout[i:i + 100], False)
+        splitter.finish()
+
+        default = self._load('default', 'secrets.yaml')
+        self.assertEqual('List', default['kind'])
+        self.assertEqual([secret('default', 'a'), secret('default', 'd')], default['items'])
+        self.assertEqual([secret('kube-system', 'c')], self._load('kube-system', 'secrets.yaml')['items'])
+        self.assertFalse(os.path.exists(os.path.join(self.tmpdir.name, 'excluded')))
+
+    def test_compact_list(self):
+        splitter = backup._ResourcesSplitter(self.tmpdir.name, 'secrets', None)
+        stdout = resources_list(secret('default', 'a'), indent=None)
+        for i in range(0, len(stdout), 10):
+            splitter.consume(stdout[i:i + 10], False)
+        splitter.finish()
+
+        self.assertEqual([secret('default', 'a')], self._load('secrets.yaml')['items'])
+
+    def test_truncated_list(self):
+        splitter = backup._ResourcesSplitter(self.tmpdir.name, 'secrets', ['default'])
+        stdout = resources_list(secret('default', 'a'))
+        splitter.consume(stdout[:len(stdout) // 2], False)
+        with self.assertRaisesRegex(Exception, 'Unexpected end of the list of resources "secrets"'):
+            splitter.finish()
+
+    def test_export_resource_types(self):
+        cluster = demo.new_cluster(demo.generate_inventory(**demo.ALLINONE))
+        control_plane = cluster.nodes['control-plane'].get_first_member()
+        for command, stdout in (
+                ('kubectl get secrets --all-namespaces --chunk-size=500 -o json',
+                 resources_list(secret('kube-system', 'a'), secret('default', 'b'))),
+                ('kubectl get configmaps --all-namespaces --chunk-size=500 -o json', resources_list()),
+                ('kubectl get clusterroles --chunk-size=500 -o json', resources_list({'metadata': {'name': 'c'}}))):
+            cluster.fake_shell.add(demo.create_nodegroup_result(control_plane, stdout=stdout), 'sudo', [command])
+
+        namespaced, nonnamespaced = backup.export_resources_cluster_wide(
+            cluster, control_plane, self.tmpdir.name, ['default', 'kube-system'],
+            ['configmaps', 'secrets'], ['clusterroles'])
+
+        self.assertEqual({'default': ['secrets'], 'kube-system': ['secrets']}, namespaced)
+        self.assertEqual(['default', 'kube-system'], list(namespaced))
+        self.assertEqual(['clusterroles'], nonnamespaced)
+        self.assertEqual([{'metadata': {'name': 'c'}}], self._load('clusterroles.yaml')['items'])
+
+    def test_retried_export_not_duplicated(self):
+        cluster = demo.new_cluster(demo.generate_inventory(**demo.ALLINONE))
+        control_plane = cluster.nodes['control-plane'].get_first_member()
+        command = 'kubectl get secrets --all-namespaces --chunk-size=500 -o json'
+        stdout = resources_list(secret('default', 'a'), secret('default', 'b'))
+        cluster.fake_shell.add(demo.create_nodegroup_result(control_plane, stdout=stdout[:len(stdout) // 2], code=1,
+                                                            stderr='etcdserver: leader changed'),
+                               'sudo', [command], usage_limit=1)
+        cluster.fake_shell.add(demo.create_nodegroup_result(control_plane, stdout=stdout), 'sudo', [command])
+
+        with mock.patch.dict(static.GLOBALS['workaround'], {'delay_period': 0}):
+            namespaced, _ = backup.export_resources_cluster_wide(
+                cluster, control_plane, self.tmpdir.name, ['default'], ['secrets'], [])
+
+        self.assertEqual({'default': ['secrets']}, namespaced)
+        self.assertEqual([secret('default', 'a'), secret('default', 'b')],
+                         self._load('default', 'secrets.yaml')['items'])
+
+
+if __name__ == '__main__':
+    unittest.main()
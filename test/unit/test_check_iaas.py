@@ -0,0 +1,255 @@
+# Copyright 2021-2023 NetCracker Technology Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import unittest
+from unittest import mock
+
+from kubemarine import demo
+from kubemarine.procedures import check_iaas
+from kubemarine.testsuite import TestSuite
+
+
+class TcpConnectFullMesh(unittest.TestCase):
+    def setUp(self):
+        self.cluster = demo.new_cluster(demo.generate_inventory(**demo.MINIHA))
+        self.nodes = self.cluster.inventory['nodes']
+        self.host_to_ip = {node['connect_to']: node['internal_address'] for node in self.nodes}
+        for node in self.nodes:
+            self.cluster.context['nodes'][node['connect_to']]['python'] = {'executable': 'python3'}
+
+    def _tcp_mesh_client(self, failed_connections: set):
+        def handler(host: str, command: str):
+            if not command.startswith('python3 '):
+                return demo.create_result()
+
+            own_address = command.split()[3]
+            stdout = ''
+            for node in self.nodes:
+                if node['internal_address'] == own_address:
+                    continue
+                for port in ['80', '443']:
+                    if (host, node['internal_address'], port) in failed_connections:
+                        stdout += f"{node['internal_address']} {port} FAIL timed out\n"
+                    else:
+                        stdout += f"{node['internal_address']} {port} OK\n"
+            return demo.create_result(stdout=stdout)
+
+        self.cluster.fake_shell.add_handler('run', handler)
+
+    def _check(self, failed_connections: set):
+        self._tcp_mesh_client(failed_connections)
+        unreachable = check_iaas.check_tcp_connect_full_mesh(self.cluster, self.nodes, ['80', '443'], self.host_to_ip)
+
+        for node in self.nodes:
+            node_commands = self.cluster.fake_shell.handled[node['connect_to']]
+            self.assertEqual(2, len(node_commands))
+            self.assertIn(f" {node['internal_address']} ", node_commands[0])
+            self.assertTrue(node_commands[1].startswith('rm -f /tmp/'))
+
+        return unreachable
+
+    def _check_blamed(self, failed_connections: set):
+        self._tcp_mesh_client(failed_connections)
+        self.cluster.context['execution_arguments']['tcp_connect_mode'] = 'full-mesh'
+        return check_iaas.check_tcp_connect(self.cluster, self.nodes, ['80', '443'], self.host_to_ip, 'tcp_ports')
+
+    def test_all_connected(self):
+        self.assertEqual({}, self._check(set()))
+
+    def test_asymmetric_failures(self):
+        node1, node2, node3 = self.nodes[0], self.nodes[1], self.nodes[2]
+        failed_connections = {
+            (node1['connect_to'], node2['internal_address'], '443'),
+            (node3['connect_to'], node2['internal_address'], '80'),
+            (node3['connect_to'], node2['internal_address'], '443'),
+        }
+        self.assertEqual({
+            node1['name']: {node2['name']: ['443']},
+            node3['name']: {node2['name']: ['80', '443']},
+        }, self._check(failed_connections))
+
+    def test_blame_target_not_reachable_from_all_sources(self):
+        target = self.nodes[1]
+        failed_connections = {
+            (node['connect_to'], target['internal_address'], '443')
+            for node in self.nodes if node is not target
+        }
+        self.assertEqual(([target['name']], []), self._check_blamed(failed_connections))
+
+    def test_blame_source_with_broken_egress(self):
+        source = self.nodes[0]
+        failed_connections = {
+            (source['connect_to'], node['internal_address'], port)
+            for node in self.nodes[1:] for port in ['80', '443']
+        }
+        self.assertEqual(([], [source['name']]), self._check_blamed(failed_connections))
+
+    def test_blame_source_partially_failed(self):
+        source, target = self.nodes[0], self.nodes[1]
+        failed_connections = {
+            (node['connect_to'], target['internal_address'], '443')
+            for node in self.nodes if node is not target
+        }
+        failed_connections.add((source['connect_to'], target['internal_address'], '80'))
+        self.assertEqual(([target['name']], [source['name']]), self._check_blamed(failed_connections))
+
+
+class NetworkBenchmark(unittest.TestCase):
+    def setUp(self):
+        self.cluster = demo.new_cluster(demo.generate_inventory(**demo.FULLHA))
+        self.nodes = [node for node in self.cluster.inventory['nodes'] if node['roles'] != ['balancer']]
+        for node in self.nodes:
+            self.cluster.context['nodes'][node['connect_to']]['python'] = {'executable': 'python3'}
+
+    def _measure(self):
+        def handler(host: str, command: str):
+            stdout = ''
+            if command.startswith('python3 '):
+                stdout = '{"throughput": 940.5, "rtt_p50": 0.2, "rtt_p99": 1.5}\n'
+            return demo.create_result(stdout=stdout)
+
+        self.cluster.fake_shell.add_handler('run', handler)
+        measurements = check_iaas.measure_network_performance(self.cluster, self.nodes, '30050')
+
+        return measurements, self.cluster.fake_shell.handled
+
+    def test_measure_ring_of_nodes(self):
+        measurements, commands = self._measure()
+
+        self.assertEqual(len(self.nodes), len(measurements))
+        for i, node in enumerate(self.nodes):
+            node_to = self.nodes[(i + 1) % len(self.nodes)]
+            self.assertEqual({'throughput': 940.5, 'rtt_p50': 0.2, 'rtt_p99': 1.5},
+                             measurements[f"{node['name']} -> {node_to['name']}"])
+            node_commands = commands[node['connect_to']]
+            self.assertEqual(2, len(node_commands))
+            self.assertIn(f" {node_to['internal_address']} 30050 1400 ", node_commands[0])
+            self.assertTrue(node_commands[1].startswith('rm -f /tmp/'))
+
+    def test_max_pairs(self):
+        with mock.patch.dict(self.cluster.globals['check_iaas']['network_benchmark'], {'max_pairs': 2}):
+            measurements, commands = self._measure()
+        self.assertEqual(2, len(measurements))
+        self.assertEqual(2, len(commands))
+
+    def test_single_node(self):
+        self.nodes = self.nodes[:1]
+        measurements, commands = self._measure()
+        self.assertEqual({}, measurements)
+        self.assertEqual({}, commands)
+
+
+class DiskBenchmark(unittest.TestCase):
+    def setUp(self):
+        self.inventory = demo.generate_inventory(**demo.FULLHA)
+
+    def _new_cluster(self):
+        cluster = demo.new_cluster(self.inventory)
+        cluster.context['testsuite'] = TestSuite()
+        for node in cluster.inventory['nodes']:
+            cluster.context['nodes'][node['connect_to']]['python'] = {'executable': 'python3'}
+        return cluster
+
+    def _run(self, cluster, task, fsync_p99: dict = None):
+        def handler(host: str, command: str):
+            stdout = ''
+            if command.startswith('python3 '):
+                directory = command.split()[2]
+                stdout = json.dumps({'directory': directory, 'fsync_p99': (fsync_p99 or {}).get(host, 2.5),
+                                     'throughput': 400.0})
+            return demo.create_result(stdout=stdout)
+
+        cluster.fake_shell.add_handler('run', handler)
+        cluster.fake_shell.add_handler('sudo', handler)
+        task(cluster)
+
+        return cluster.fake_shell.handled
+
+    def test_etcd_volume_of_control_planes(self):
+        cluster = self._new_cluster()
+        commands = self._run(cluster, lambda c: check_iaas.get_disk_benchmark(c, 'etcd'))
+
+        self.assertEqual(set(cluster.nodes['control-plane'].get_hosts()), set(commands.keys()))
+        for host, node_commands in commands.items():
+            self.assertIn(' /var/lib/etcd 2300 ', node_commands[0])
+        node_name = cluster.nodes['control-plane'].get_any_member().get_node_name()
+        measurements, skipped_nodes = cluster.context['disk_benchmark']['etcd']
+        self.assertEqual({'directory': '/var/lib/etcd', 'fsync_p99': 2.5, 'throughput': 400.0},
+                         measurements[node_name])
+        self.assertEqual([], skipped_nodes)
+
+    def test_cri_root_of_docker(self):
+        self.inventory.setdefault('services', {})['cri'] = {
+            'containerRuntime': 'docker',
+            'dockerConfig': {'data-root': '/data/docker'}
+        }
+        cluster = self._new_cluster()
+        commands = self._run(cluster, lambda c: check_iaas.get_disk_benchmark(c, 'cri'))
+
+        expected_hosts = cluster.make_group_from_roles(['control-plane', 'worker']).get_hosts()
+        self.assertEqual(set(expected_hosts), set(commands.keys()))
+        for host, node_commands in commands.items():
+            self.assertIn(' /data/docker 2300 ', node_commands[0])
+
+    def test_measured_once_for_all_tests(self):
+        cluster = self._new_cluster()
+        commands = self._run(cluster, lambda c: (check_iaas.disk_fsync_latency(c, 'etcd'),
+                                                 check_iaas.disk_throughput(c, 'etcd')))
+        for node_commands in commands.values():
+            self.assertEqual(2, len(node_commands))
+
+        fsync_tc, throughput_tc = cluster.context['testsuite'].tcs
+        self.assertTrue(fsync_tc.is_succeeded())
+        self.assertTrue(throughput_tc.is_succeeded())
+
+    def test_slow_fsync_warned(self):
+        cluster = self._new_cluster()
+        slow_host = cluster.nodes['control-plane'].get_any_member().get_host()
+        self._run(cluster, lambda c: check_iaas.disk_fsync_latency(c, 'etcd'), fsync_p99={slow_host: 15.0})
+
+        tc = cluster.context['testsuite'].tcs[0]
+        self.assertTrue(tc.is_warned())
+        self.assertEqual('High fsync latency: 15.0ms', tc.results.message)
+
+    def _skip_node_without_python(self, cluster):
+        node = cluster.nodes['control-plane'].get_first_member()
+        cluster.context['nodes'][node.get_host()]['python'] = "Not installed"
+        return node
+
+    def test_slow_fsync_failed_with_skipped_nodes(self):
+        cluster = self._new_cluster()
+        skipped_node = self._skip_node_without_python(cluster)
+        slow_host = cluster.nodes['control-plane'].get_ordered_members_list()[-1].get_host()
+        self._run(cluster, lambda c: check_iaas.disk_fsync_latency(c, 'etcd'), fsync_p99={slow_host: 60.0})
+
+        tc = cluster.context['testsuite'].tcs[0]
+        self.assertTrue(tc.is_failed())
+        self.assertEqual('Very high fsync latency: 60.0ms', tc.results.message)
+        self.assertNotIn(skipped_node.get_host(), cluster.fake_shell.handled)
+
+    def test_skipped_nodes_warned_by_all_tests(self):
+        cluster = self._new_cluster()
+        skipped_node = self._skip_node_without_python(cluster)
+        self._run(cluster, lambda c: (check_iaas.disk_fsync_latency(c, 'etcd'),
+                                      check_iaas.disk_throughput(c, 'etcd')))
+
+        expected_message = f"Cannot perform check on {[skipped_node.get_node_name()]}: python doesn't exist."
+        for tc in cluster.context['testsuite'].tcs:
+            self.assertTrue(tc.is_warned())
+            self.assertEqual(expected_message, tc.results.message)
+
+
+if __name__ == '__main__':
+    unittest.main()
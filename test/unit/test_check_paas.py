@@ -12,10 +12,14 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import json
 import unittest
 
 from kubemarine import demo
 from kubemarine.core import errors
+from kubemarine.kubernetes import snapshot
+from kubemarine.procedures import check_paas
+from kubemarine.testsuite import TestSuite
 
 
 class EnrichmentValidation(unittest.TestCase):
@@ -45,5 +49,135 @@ class EnrichmentValidation(unittest.TestCase):
         self._new_cluster()
 
 
+class ClusterSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.cluster = demo.new_cluster(demo.generate_inventory(**demo.MINIHA))
+        self.cluster.context['testsuite'] = TestSuite()
+        self.resources = {
+            'nodes': [self._node(node['name']) for node in self.cluster.inventory['nodes']],
+            'pods': [
+                self._pod('kube-system', 'coredns-1', 'Running'),
+                self._pod('kube-system', 'calico-node-1', 'Pending', waiting_reason='ImagePullBackOff'),
+                self._pod('default', 'job-1', 'Succeeded', terminated_reason='Completed'),
+                self._pod('default', 'app-1', 'Failed', terminated_reason='Error'),
+            ],
+        }
+
+    def _node(self, name: str) -> dict:
+        return {'metadata': {'name': name, 'labels': {'node-role.kubernetes.io/control-plane': '',
+                                                      'node-role.kubernetes.io/worker': 'worker'}},
+                'status': {'nodeInfo': {'kubeletVersion': self.cluster.inventory['services']['kubeadm']['kubernetesVersion']},
+                           'conditions': [{'type': 'Ready', 'status': 'True', 'reason': 'KubeletReady'}]}}
+
+    def _pod(self, namespace: str, name: str, phase: str,
+             waiting_reason: str = None, terminated_reason: str = None) -> dict:
+        state = {}
+        if waiting_reason:
+            state['waiting'] = {'reason': waiting_reason}
+        if terminated_reason:
+            state['terminated'] = {'reason': terminated_reason}
+        return {'metadata': {'namespace': namespace, 'name': name},
+                'status': {'phase': phase, 'containerStatuses': [{'state': state}]}}
+
+    def _add_list(self, command: str, items: list):
+        stdout = json.dumps({'apiVersion': 'v1', 'kind': 'List', 'items': items})
+        results = demo.create_nodegroup_result(self.cluster.nodes['control-plane'], stdout=stdout)
+        self.cluster.fake_shell.add(results, 'sudo', [command])
+
+    def _called_times(self, command: str) -> int:
+        return sum(item['used_times']
+                   for host in self.cluster.nodes['control-plane'].get_hosts()
+                   for item in self.cluster.fake_shell.history_find(host, 'sudo', [command]))
+
+    def _run(self, *tasks):
+        for resource, items in self.resources.items():
+            self._add_list(f'kubectl get {resource} -A -o json', items)
+
+        for task in tasks:
+            task(self.cluster)
+
+    def test_resource_fetched_once_for_all_checks(self):
+        self._run(check_paas.kubelet_version, check_paas.kubernetes_nodes_existence,
+                  check_paas.kubernetes_nodes_roles, lambda cluster: check_paas.kubernetes_nodes_condition(cluster, 'Ready'))
+
+        self.assertEqual(1, self._called_times('kubectl get nodes -A -o json'))
+        self.assertEqual(0, self._called_times('kubectl get pods -A -o json'))
+        for tc in self.cluster.context['testsuite'].tcs:
+            self.assertTrue(tc.is_succeeded(), tc.name)
+
+    def test_namespace_fetched_separately(self):
+        coredns_cm = {'metadata': {'namespace': 'kube-system', 'name': 'coredns'}, 'data': {}}
+        self._add_list('kubectl get configmaps -n kube-system -o json', [coredns_cm])
+
+        def check(cluster):
+            cluster_snapshot = snapshot.get_snapshot(cluster)
+            self.assertEqual(coredns_cm, cluster_snapshot.get_item('configmaps', 'coredns', 'kube-system'))
+            self.assertIsNone(cluster_snapshot.get_item('configmaps', 'kubeadm-config', 'kube-system'))
+            self.assertEqual([coredns_cm], cluster_snapshot.get_items('configmaps', 'kube-system'))
+
+        self._run(check)
+        self.assertEqual(1, self._called_times('kubectl get configmaps -n kube-system -o json'))
+
+    def test_namespace_served_from_all_namespaces(self):
+        def check(cluster):
+            cluster_snapshot = snapshot.get_snapshot(cluster)
+            self.assertEqual(4, len(cluster_snapshot.get_items('pods')))
+            self.assertEqual(2, len(cluster_snapshot.get_items('pods', 'default')))
+            self.assertIsNone(cluster_snapshot.get_item('pods', 'app-1', 'kube-system'))
+            self.assertIsNotNone(cluster_snapshot.get_item('pods', 'coredns-1', 'kube-system'))
+
+        self._run(check)
+        self.assertEqual(1, self._called_times('kubectl get pods -A -o json'))
+
+    def test_invalidate_fetches_only_requested_resource(self):
+        def check(cluster):
+            cluster_snapshot = snapshot.get_snapshot(cluster)
+            nodes = cluster_snapshot.get_list('nodes')
+            pods = cluster_snapshot.get_list('pods')
+            coredns = cluster_snapshot.get_item('pods', 'coredns-1', 'kube-system')
+
+            cluster_snapshot.invalidate('pods')
+            self.assertIs(nodes, cluster_snapshot.get_list('nodes'))
+            self.assertIsNot(pods, cluster_snapshot.get_list('pods'))
+            self.assertIsNot(coredns, cluster_snapshot.get_item('pods', 'coredns-1', 'kube-system'))
+
+        self._run(check)
+        self.assertEqual(1, self._called_times('kubectl get nodes -A -o json'))
+        self.assertEqual(2, self._called_times('kubectl get pods -A -o json'))
+
+    def test_invalidate_namespace(self):
+        self._add_list('kubectl get pods -n kube-system -o json', self.resources['pods'][:2])
+
+        def check(cluster):
+            cluster_snapshot = snapshot.get_snapshot(cluster)
+            cluster_snapshot.get_list('pods')
+            cluster_snapshot.get_list('pods', 'default')
+            cluster_snapshot.get_list('pods', 'kube-system')
+
+            cluster_snapshot.invalidate('pods', 'kube-system')
+            self.assertEqual(2, len(cluster_snapshot.get_items('pods', 'kube-system')))
+            self.assertEqual(2, len(cluster_snapshot.get_items('pods', 'default')))
+
+        self._run(check)
+        self.assertEqual(1, self._called_times('kubectl get pods -A -o json'))
+        self.assertEqual(1, self._called_times('kubectl get pods -n kube-system -o json'))
+
+    def test_not_running_pods(self):
+        # Server side filter of not running pods
+        self._add_list("kubectl get pods -A --field-selector 'status.phase!=Running,status.phase!=Succeeded' -o json",
+                       self.resources['pods'][1:2] + self.resources['pods'][3:])
+        del self.resources['pods']
+        result = []
+        self._run(lambda cluster: result.extend(check_paas.get_not_running_pods(cluster)),
+                  check_paas.kubernetes_pods_condition)
+
+        self.assertEqual([('kube-system', 'calico-node-1', 'ImagePullBackOff'), ('default', 'app-1', 'Error')], result)
+        self.assertEqual(1, self._called_times(
+            "kubectl get pods -A --field-selector 'status.phase!=Running,status.phase!=Succeeded' -o json"))
+        tc = self.cluster.context['testsuite'].tcs[0]
+        self.assertTrue(tc.is_failed())
+        self.assertEqual('2 failed system pods', tc.results.message)
+
+
 if __name__ == '__main__':
     unittest.main()
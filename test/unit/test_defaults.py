@@ -14,9 +14,14 @@
 # limitations under the License.
 
 
+import logging
+import os
+import tempfile
 import unittest
+from copy import deepcopy
+from unittest import mock
 
-from kubemarine.core import defaults
+from kubemarine.core import defaults, utils, log
 from kubemarine import demo
 
 
@@ -172,3 +177,151 @@ class DefaultsEnrichmentAppendControlPlain(unittest.TestCase):
         inventory = defaults.append_controlplain(inventory, None)
         self.assertEqual(inventory['control_plain']['internal'], '192.168.2.1')
         self.assertEqual(inventory['control_plain']['external'], inventory['nodes'][0]['address'])
+
+
+class InventoryCompilerTest(unittest.TestCase):
+    def setUp(self):
+        self.logger = demo.new_cluster(demo.generate_inventory(**demo.ALLINONE)).log
+
+    def _compile(self, inventory: dict) -> dict:
+        compiler = defaults.InventoryCompiler(self.logger, inventory)
+        compiler.compile()
+        return inventory
+
+    def test_chained_references_rendered_once(self):
+        inventory = {
+            'a': '{{ b }}-a',
+            'b': '{{ values.c }}-b',
+            'values': {'c': '{{ values.d }}-c', 'd': 'd'},
+            'list': ['{{ a }}', 'static'],
+        }
+        with mock.patch.object(defaults, defaults.compile_string.__name__,
+                               wraps=defaults.compile_string) as compile_string:
+            self._compile(inventory)
+
+        self.assertEqual('d-c-b-a', inventory['a'])
+        self.assertEqual('d-c-b', inventory['b'])
+        self.assertEqual('d-c', inventory['values']['c'])
+        self.assertEqual(['d-c-b-a', 'static'], inventory['list'])
+        self.assertEqual(4, compile_string.call_count, "Each templated value should be rendered exactly once")
+
+    def test_reference_to_parent_object(self):
+        inventory = {
+            'values': {'x': '{{ values.y }}', 'y': 'y'},
+            'dump': '{{ values | toyaml }}',
+        }
+        self._compile(inventory)
+        self.assertEqual('x: y\ny: y\n', inventory['dump'])
+
+    def test_reference_to_own_collection(self):
+        inventory = {
+            'nodes': [{'name': 'first', 'address': '{{ nodes[1].address }}'},
+                      {'name': 'second', 'address': '10.101.0.2',
+                       'peer': "{{ nodes | map(attribute='name') | join(',') }}"}],
+        }
+        self._compile(inventory)
+        self.assertEqual('10.101.0.2', inventory['nodes'][0]['address'])
+        self.assertEqual('first,second', inventory['nodes'][1]['peer'])
+
+    def test_cyclic_reference(self):
+        inventory = {
+            'values': {'a': '{{ values.b }}', 'b': '{{ values.c[0] }}', 'c': ['{{ values.a }}']},
+        }
+        with self.assertRaisesRegex(Exception, r"Cyclic reference in the inventory: "
+                                               r"values\.a -> values\.b -> values\.c\[0\] -> values\.a"):
+            self._compile(inventory)
+
+    def test_escaped_expressions_preserved(self):
+        inventory = {'a': '{{ b }}', 'b': "{% raw %}{{ .Value }}{% endraw %}"}
+        self._compile(inventory)
+        self.assertEqual("{% raw %}{{ .Value }}{% endraw %}", inventory['a'])
+
+    def test_templates_cached(self):
+        inventory = {'values': [{'name': str(i), 'v': '{{ values[0].name }}'} for i in range(10)]}
+        with mock.patch.object(defaults.TemplatesCache, 'get', autospec=True,
+                               side_effect=defaults.TemplatesCache.get) as get:
+            compiler = defaults.InventoryCompiler(self.logger, inventory)
+            compiler.compile()
+
+        self.assertEqual(10, get.call_count)
+        self.assertEqual(1, len(compiler.templates._templates))
+        self.assertEqual(['0'] * 10, [item['v'] for item in inventory['values']])
+
+
+class EnrichmentCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.inventory = demo.generate_inventory(**demo.MINIHA)
+        self.inventory['values'] = {'variable': '{{ env.ENV_NAME }}'}
+        utils.prepare_dump_directory(self.tmpdir.name)
+
+    def tearDown(self):
+        logger = logging.getLogger("k8s.fake.local")
+        for h in logger.handlers:
+            if isinstance(h, log.FileHandlerWithHeader):
+                h.close()
+        self.tmpdir.cleanup()
+
+    def _new_cluster(self, args: list = None):
+        context = demo.create_silent_context(args)
+        execution_args = context['execution_arguments']
+        execution_args['disable_dump'] = False
+        execution_args['dump_location'] = self.tmpdir.name
+        with mock.patch.object(defaults, defaults._compile_inventory.__name__,
+                               wraps=defaults._compile_inventory) as compile_inventory:
+            cluster = demo.new_cluster(deepcopy(self.inventory), context=context)
+
+        return cluster, compile_inventory.call_count
+
+    def test_compiled_inventory_cached(self):
+        with mock.patch.dict(os.environ, {'ENV_NAME': 'value1'}):
+            cluster1, compilations1 = self._new_cluster()
+            cluster2, compilations2 = self._new_cluster()
+
+        self.assertEqual(1, compilations1)
+        self.assertEqual(0, compilations2, "Compiled inventory should be loaded from cache")
+        self.assertEqual('value1', cluster2.inventory['values']['variable'])
+        self.assertEqual(cluster1.inventory, cluster2.inventory)
+
+    def test_cache_invalidated(self):
+        with mock.patch.dict(os.environ, {'ENV_NAME': 'value1'}):
+            self._new_cluster()
+
+        with mock.patch.dict(os.environ, {'ENV_NAME': 'value2'}):
+            cluster, compilations = self._new_cluster()
+        self.assertEqual(1, compilations, "Change of referenced environment variable should invalidate the cache")
+        self.assertEqual('value2', cluster.inventory['values']['variable'])
+
+        self.inventory['values']['another'] = 'value'
+        with mock.patch.dict(os.environ, {'ENV_NAME': 'value2'}):
+            _, compilations = self._new_cluster()
+        self.assertEqual(1, compilations, "Change of the inventory should invalidate the cache")
+
+    def test_not_referenced_environ_ignored(self):
+        with mock.patch.dict(os.environ, {'ENV_NAME': 'value1', 'OTHER_NAME': 'value1'}):
+            self._new_cluster()
+
+        with mock.patch.dict(os.environ, {'ENV_NAME': 'value1', 'OTHER_NAME': 'value2'}):
+            _, compilations = self._new_cluster()
+        self.assertEqual(0, compilations, "Change of not referenced environment variable should not invalidate the cache")
+
+    def test_dynamic_environ_access(self):
+        self.inventory['values']['variable'] = "{{ env.get('ENV_NAME') }}"
+        with mock.patch.dict(os.environ, {'ENV_NAME': 'value1', 'OTHER_NAME': 'value1'}):
+            self._new_cluster()
+
+        with mock.patch.dict(os.environ, {'ENV_NAME': 'value1', 'OTHER_NAME': 'value2'}):
+            _, compilations = self._new_cluster()
+        self.assertEqual(1, compilations, "All environment variables should be considered if accessed dynamically")
+
+    def test_cache_disabled(self):
+        with mock.patch.dict(os.environ, {'ENV_NAME': 'value1'}):
+            self._new_cluster(['--disable-enrichment-cache'])
+            _, compilations = self._new_cluster(['--disable-enrichment-cache'])
+
+        self.assertEqual(1, compilations)
+        self.assertFalse(os.path.exists(os.path.join(self.tmpdir.name, 'cache')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -12,14 +12,17 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import hashlib
 import io
 import os
+import tarfile
 import tempfile
 import unittest
 import random
+from unittest import mock
 
 from kubemarine import demo
-from kubemarine.core.group import GroupResultException, CollectorCallback
+from kubemarine.core.group import GroupResultException, CollectorCallback, NodeGroup
 from kubemarine.demo import FakeKubernetesCluster
 
 
@@ -185,5 +188,45 @@ class TestGroupCall(unittest.TestCase):
                 self.assertEqual('a' * 100000, self.cluster.fake_fs.read(host, '/fake/path'))
 
 
+    def test_sync_files_only_changed(self):
+        files = {io.StringIO('first'): '/etc/first', io.StringIO('second'): '/etc/second'}
+        first_hash = hashlib.sha1(b'first').hexdigest()
+
+        all_nodes = self.cluster.nodes['all']
+        up_to_date_host, changed_host, new_host = all_nodes.get_hosts()[:3]
+        sha1sum = 'sha1sum /etc/first /etc/second 2>/dev/null || true'
+        for host, stdout in (
+                (up_to_date_host, f"{first_hash}  /etc/first\n{hashlib.sha1(b'second').hexdigest()}  /etc/second\n"),
+                (changed_host, f"{first_hash}  /etc/first\n{'0' * 40}  /etc/second\n"),
+                (new_host, '')):
+            results = demo.create_nodegroup_result(self.cluster.make_group([host]), stdout=stdout)
+            self.cluster.fake_shell.add(results, 'sudo', [sha1sum])
+
+        tmp = '/tmp/fixed'
+        mv_commands = {}
+        for host, changed in ((changed_host, [1]), (new_host, [0, 1])):
+            group = self.cluster.make_group([host])
+            self.cluster.fake_shell.add(demo.create_nodegroup_result(group), 'run', [
+                f"mkdir -p {tmp} && tar -xf {tmp}.tar -C {tmp} && rm -f {tmp}.tar"])
+            mv_commands[host] = [NodeGroup._get_mv_command(f"{tmp}/{i}", list(files.values())[i],
+                                                           False, True, False, False) for i in changed]
+            for command in mv_commands[host] + [f"rm -rf {tmp}"]:
+                self.cluster.fake_shell.add(demo.create_nodegroup_result(group), 'sudo', [command])
+
+        with mock.patch('uuid.uuid4', return_value=mock.Mock(hex='fixed')):
+            self.cluster.make_group([up_to_date_host, changed_host, new_host]).sync_files(files, sudo=True)
+
+        self.assertIsNone(self.cluster.fake_fs.read(up_to_date_host, f'{tmp}.tar'))
+        for host, expected_members in ((changed_host, {'1': 'second'}), (new_host, {'0': 'first', '1': 'second'})):
+            archive = io.BytesIO(self.cluster.fake_fs.read(host, f'{tmp}.tar').encode('utf-8'))
+            with tarfile.open(fileobj=archive) as tar:
+                actual_members = {member.name: tar.extractfile(member).read().decode('utf-8')
+                                  for member in tar.getmembers()}
+            self.assertEqual(expected_members, actual_members, f"Unexpected files are uploaded to {host}")
+            for command in mv_commands[host]:
+                self.assertTrue(self.cluster.fake_shell.is_called(host, 'sudo', [command]),
+                                "Files should be moved using sudo as in put()")
+
+
 if __name__ == '__main__':
     unittest.main()
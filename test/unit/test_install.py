@@ -12,10 +12,11 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import threading
 import unittest
 
 from kubemarine import demo, packages
-from kubemarine.core import static
+from kubemarine.core import static, flow
 from kubemarine.procedures import install
 
 
@@ -100,5 +101,29 @@ class ManageMandatoryPackages(unittest.TestCase):
         self._assert_installed(cluster)
 
 
+class ConcurrentTasks(unittest.TestCase):
+    def test_sysctl_after_modprobe(self):
+        cluster = demo.new_cluster(demo.generate_inventory(**demo.ALLINONE))
+        flow.init_tasks_flow(cluster)
+        events = []
+        sysctl_started = threading.Event()
+
+        def modprobe(_):
+            events.append("start modprobe")
+            # Give the chance to sysctl to start if it does not wait for modprobe.
+            sysctl_started.wait(1)
+            events.append("end modprobe")
+
+        def sysctl(_):
+            sysctl_started.set()
+            events.append("start sysctl")
+
+        tasks = {"prepare": {"system": {"modprobe": modprobe, "sysctl": sysctl}}}
+        flow.run_tasks_recursive(tasks, flow.get_task_list(tasks), cluster, {}, [],
+                                 concurrent_tasks=install.concurrent_tasks)
+
+        self.assertEqual(["start modprobe", "end modprobe", "start sysctl"], events)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -72,5 +72,78 @@ class TestInventoryValidation(unittest.TestCase):
         )
 
 
+class TestWorkerUpgradeBatches(unittest.TestCase):
+    def prepare_workers(self):
+        inventory = demo.generate_inventory(balancer=0, master=1, worker=5)
+        zones = ['a', 'b', 'a', 'b', 'a']
+        for node, zone in zip(inventory['nodes'][1:], zones):
+            node.setdefault('labels', {})['topology.kubernetes.io/zone'] = zone
+        cluster = demo.new_cluster(inventory)
+        return cluster.nodes['worker'].get_ordered_members_list()
+
+    def test_batches_preserve_order(self):
+        workers = self.prepare_workers()
+        batches = kubernetes.get_worker_upgrade_batches(workers, 2)
+        self.assertEqual([[w.get_node_name() for w in workers[0:2]],
+                          [w.get_node_name() for w in workers[2:4]],
+                          [workers[4].get_node_name()]],
+                         [[w.get_node_name() for w in batch] for batch in batches])
+
+    def test_batches_grouped_by_topology(self):
+        workers = self.prepare_workers()
+        batches = kubernetes.get_worker_upgrade_batches(workers, 2, 'topology.kubernetes.io/zone')
+        self.assertEqual([[workers[0].get_node_name(), workers[2].get_node_name()],
+                          [workers[4].get_node_name()],
+                          [workers[1].get_node_name(), workers[3].get_node_name()]],
+                         [[w.get_node_name() for w in batch] for batch in batches])
+
+
+class TestImagesPrepull(unittest.TestCase):
+    def setUp(self):
+        self.inventory = demo.generate_inventory(**demo.FULLHA)
+        self.command = 'kubeadm config images pull --config=/etc/kubernetes/prepull-config.yaml'
+        self.stdout = "[config/images] Pulled registry.k8s.io/kube-apiserver:v1.26.3\n" \
+                      "[config/images] Pulled registry.k8s.io/pause:3.9\n"
+
+    def test_prepull_all_nodes(self):
+        cluster = demo.new_cluster(self.inventory)
+        group = cluster.nodes['control-plane'].include_group(cluster.nodes['worker'])
+        cluster.fake_shell.add(demo.create_nodegroup_result(group, stdout=self.stdout), 'sudo', [self.command])
+
+        result = kubernetes.images_grouped_prepull(group, group_size=2)
+
+        self.assertEqual(set(group.get_hosts()), set(result.keys()))
+        self.assertTrue(cluster.fake_shell.is_called_each(group.get_hosts(), 'sudo', [self.command]))
+
+    def test_failed_prepull_retried(self):
+        cluster = demo.new_cluster(self.inventory)
+        group = cluster.nodes['worker']
+        failed_node = group.get_first_member()
+        cluster.fake_shell.add(demo.create_nodegroup_result(failed_node, code=1, stderr='429 Too Many Requests'),
+                               'sudo', [self.command], usage_limit=1)
+        cluster.fake_shell.add(demo.create_nodegroup_result(group, stdout=self.stdout), 'sudo', [self.command])
+
+        scheduler = kubernetes.PrepullScheduler(cluster, 4)
+        result = scheduler.run(group.get_ordered_members_list())
+
+        self.assertEqual(set(group.get_hosts()), set(result.keys()))
+        self.assertEqual(2, len(cluster.fake_shell.history_find(failed_node.get_host(), 'sudo', [self.command])))
+        self.assertEqual(['registry.k8s.io/kube-apiserver:v1.26.3', 'registry.k8s.io/pause:3.9'],
+                         sorted(scheduler.images_durations))
+
+    def test_window_adapted(self):
+        cluster = demo.new_cluster(self.inventory)
+        scheduler = kubernetes.PrepullScheduler(cluster, 4)
+        scheduler._adapt(10)
+        scheduler._adapt(12)
+        self.assertEqual(6, scheduler.window)
+        scheduler._adapt(100)
+        self.assertEqual(3, scheduler.window)
+        scheduler._shrink()
+        scheduler._shrink()
+        scheduler._shrink()
+        self.assertEqual(1, scheduler.window)
+
+
 if __name__ == '__main__':
     unittest.main()
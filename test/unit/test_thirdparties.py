@@ -14,9 +14,15 @@
 # limitations under the License.
 
 
+import hashlib
+import io
+import os
+import tempfile
 import unittest
+from unittest import mock
+
 from kubemarine import demo, thirdparties
-from kubemarine.core import errors
+from kubemarine.core import errors, cache
 
 
 class EnrichmentValidation(unittest.TestCase):
@@ -93,4 +99,40 @@ class SHACalculationTest(unittest.TestCase):
         self.assertEqual(self.customized_services['thirdparties']['custom/thirdparty/with/sha']['sha1'],
                          cluster.inventory['services']['thirdparties']["custom/thirdparty/with/sha"]['sha1'])
 
-
+class DeployerDeliveryTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache = cache.DiskCache(self.tmpdir.name, 2)
+        self.content = b'thirdparty content'
+        self.sha1 = hashlib.sha1(self.content).hexdigest()
+        inventory = demo.generate_inventory(**demo.ALLINONE)
+        inventory['services'] = {'thirdparties': {'/usr/bin/custom': {
+            'source': 'https://example.com/custom', 'sha1': self.sha1, 'delivery': 'deployer'
+        }}}
+        self.cluster = demo.new_cluster(inventory)
+        self.config = self.cluster.inventory['services']['thirdparties']['/usr/bin/custom']
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _download(self):
+        return thirdparties._download_thirdparty(self.cluster, self.cache, '/usr/bin/custom', self.config)
+
+    def test_download_once(self):
+        with mock.patch('urllib.request.urlopen', side_effect=lambda *args, **kwargs: io.BytesIO(self.content)) \
+                as urlopen:
+            path = self._download()
+            self.assertEqual(os.path.join(self.tmpdir.name, self.sha1), path)
+            self.assertEqual(path, self._download())
+            self.assertEqual(1, urlopen.call_count)
+
+        with open(path, 'rb') as file:
+            self.assertEqual(self.content, file.read())
+
+    def test_sha1_mismatch(self):
+        self.config['sha1'] = 'unexpected'
+        with mock.patch('urllib.request.urlopen', return_value=io.BytesIO(self.content)), \
+                self.assertRaisesRegex(Exception, 'does not match the expected unexpected'):
+            self._download()
+
+        self.assertEqual([], os.listdir(self.tmpdir.name))